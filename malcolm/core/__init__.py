@@ -2,7 +2,7 @@
 from .alarm import Alarm, AlarmSeverity, AlarmStatus
 from .context import Context
 from .controller import Controller, AMri, ADescription, DEFAULT_TIMEOUT
-from .concurrency import Queue, Spawned, RLock, sleep
+from .concurrency import Queue, Spawned, RLock, sleep, WorkerPool, Timer
 from .define import Define
 from .errors import AbortedError, BadValueError, TimeoutError, ResponseError, \
     UnexpectedError, YamlError, FieldError, NotWriteableError
@@ -18,11 +18,13 @@ from .moduleutil import submodule_all
 from .part import Part, PartRegistrar, APartName
 from .process import Process, ProcessPublishHook, ProcessStartHook, \
     ProcessStopHook, APublished, UnpublishedInfo, UUnpublishedInfos
-from .request import Request, PathRequest, Subscribe, Unsubscribe, Get, Put, Post
+from .request import Request, PathRequest, Subscribe, Unsubscribe, Get, Put, \
+    PutMany, Post
 from .response import Response, Delta, Update, Return, Error
 from .serializable import Serializable, deserialize_object, serialize_object, \
     json_decode, json_encode, snake_to_camel, camel_to_title, \
-    CAMEL_RE, serialize_hook, stringify_error
+    CAMEL_RE, serialize_hook, stringify_error, json_encode_message, \
+    set_json_backend, register_json_backend, JSON_BACKENDS
 from .stateset import StateSet
 from .table import Table
 from .tags import Widget, Port, group_tag, config_tag, get_config_tag, \
@@ -8,7 +8,7 @@ from malcolm.compat import get_thread_ident, get_stack_size
 from .errors import TimeoutError
 
 if TYPE_CHECKING:
-    from typing import TypeVar, Callable, Any, Tuple, Dict, Union
+    from typing import TypeVar, Callable, Any, Tuple, Dict, Union, List
     T = TypeVar("T")
 
 
@@ -17,20 +17,61 @@ log = logging.getLogger(__name__)
 
 # Re-export
 sleep = cothread.Sleep
-RLock = cothread.RLock
+Timer = cothread.Timer
+
+# How many workers a WorkerPool starts before checking if they are blocked
+REQUEST_WORKERS = 16
+
+
+class RLock(cothread.RLock):
+    """A reentrant cothread lock that knows if anyone holds or waits for it"""
+
+    __slots__ = ["_users"]
+
+    def __init__(self):
+        super(RLock, self).__init__()
+        # The number of acquires that have not yet been released, including
+        # those still waiting for the lock
+        self._users = 0
+
+    def acquire(self, timeout=None):
+        self._users += 1
+        try:
+            super(RLock, self).acquire(timeout)
+        except Exception:
+            self._users -= 1
+            raise
+
+    def release(self):
+        super(RLock, self).release()
+        self._users -= 1
+
+    __enter__ = acquire
+
+    def in_use(self):
+        # type: () -> bool
+        """Return True if any cothread holds or is waiting for the lock"""
+        return self._users > 0
 
 
 class Spawned(object):
     NO_RESULT = object()
 
-    def __init__(self, func, args, kwargs):
-        # type: (Callable[..., Any], Tuple, Dict) -> None
-        self._result_queue = Queue()
+    def __init__(self, func, args, kwargs, pool=None, inline=False):
+        # type: (Callable[..., Any], Tuple, Dict, WorkerPool, bool) -> None
+        # Only made if someone waits before the function has finished
+        self._result_queue = None  # type: Queue
         self._result = self.NO_RESULT  # type: Union[T, Exception]
         self._function = func
         self._args = args
         self._kwargs = kwargs
-        cothread.Spawn(self.catching_function, stack_size=get_stack_size())
+        if inline:
+            # Run it now in the caller's cothread
+            self.catching_function()
+        elif pool is None:
+            cothread.Spawn(self.catching_function, stack_size=get_stack_size())
+        else:
+            pool.submit(self)
 
     def catching_function(self):
         try:
@@ -45,13 +86,18 @@ class Spawned(object):
         self._function = None
         self._args = None
         self._kwargs = None
-        self._result_queue.put(None)
+        result_queue = self._result_queue
+        if result_queue is not None:
+            result_queue.put(None)
 
     def wait(self, timeout=None):
         # type: (float) -> None
         # Only one person can wait on this at a time
         if self._result == self.NO_RESULT:
-            self._result_queue.get(timeout)
+            self._result_queue = Queue()
+            # The function may have finished before the queue was made
+            if self._result == self.NO_RESULT:
+                self._result_queue.get(timeout)
 
     def ready(self):
         # type: () -> bool
@@ -92,3 +138,138 @@ class Queue(object):
     def put(self, value):
         # In cothread's thread
         self._event_queue.Signal(value)
+
+
+class WorkerPool(object):
+    """Long lived cothreads that run Spawned functions in the order they were
+    submitted, rather than starting a new cothread for each one
+
+    Up to size workers are started to run functions. If they are all still
+    busy when the scheduler next runs, because functions are blocked waiting
+    for something, then extra workers are started so that functions waiting
+    for the result of other functions can't deadlock. Up to size workers are
+    then kept waiting for more work
+    """
+
+    def __init__(self, size=REQUEST_WORKERS):
+        # type: (int) -> None
+        self.size = size
+        self._jobs = cothread.EventQueue()
+        # Number of workers, and how many are waiting for a job
+        self._workers = 0
+        self._idle = 0
+        # Whether there is a cothread checking for blocked workers
+        self._checking = False
+        # Spawned that have been submitted, but not finished
+        self._in_flight = set()
+        # Number of Spawned that have been submitted but not started
+        self._queued = 0
+        self._max_queued = 0
+        # Latency metrics
+        self._processed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    def submit(self, spawned):
+        # type: (Spawned) -> None
+        """Run spawned.catching_function() on a worker"""
+        self._in_flight.add(spawned)
+        self._jobs.Signal((spawned, time.time()))
+        self._queued += 1
+        self._max_queued = max(self._queued, self._max_queued)
+        if self._queued > self._idle:
+            if self._workers < self.size:
+                self._start_worker()
+            elif not self._checking:
+                self._checking = True
+                cothread.Spawn(self._check_blocked)
+
+    def _start_worker(self):
+        self._workers += 1
+        cothread.Spawn(self._worker, stack_size=get_stack_size())
+
+    def _check_blocked(self):
+        # This runs after the submitter has yielded, so the workers have had
+        # a chance to take jobs. If there are still jobs waiting and no idle
+        # workers then they are all blocked, so start another worker
+        while self._queued > self._idle:
+            self._start_worker()
+            cothread.Yield()
+        self._checking = False
+
+    def _worker(self):
+        # Don't wait for work if enough others are already waiting
+        while self._idle < self.size or self._queued > self._idle:
+            self._idle += 1
+            job = self._jobs.Wait()
+            self._idle -= 1
+            if job is None:
+                # Asked to stop
+                break
+            self._queued -= 1
+            spawned, submitted = job
+            started = time.time()
+            spawned.catching_function()
+            self._in_flight.discard(spawned)
+            self._record(started - submitted, time.time() - submitted)
+        self._workers -= 1
+
+    def _record(self, wait, latency):
+        # type: (float, float) -> None
+        self._processed += 1
+        self._total_wait += wait
+        self._max_wait = max(wait, self._max_wait)
+        self._total_latency += latency
+        self._max_latency = max(latency, self._max_latency)
+
+    def in_flight(self):
+        # type: () -> List[Spawned]
+        """The Spawned that have been submitted but have not finished"""
+        return list(self._in_flight)
+
+    def stop(self):
+        # type: () -> None
+        """Ask all the idle workers to finish"""
+        for _ in range(self._idle):
+            self._jobs.Signal(None)
+
+    def metrics(self, reset=False):
+        # type: (bool) -> Dict[str, Union[int, float]]
+        """Return the queue depth and latency metrics of the pool
+
+        Args:
+            reset: If True then reset the maximum and average values after
+                returning them
+
+        Returns:
+            dict: with keys:
+
+            - workers: How many workers there are
+            - busy: How many workers are running a function
+            - queue_depth: How many functions are waiting for a worker
+            - max_queue_depth: The most functions that have been waiting
+            - processed: How many functions have finished
+            - mean_wait, max_wait: Seconds between a function being
+              submitted and starting
+            - mean_latency, max_latency: Seconds between a function being
+              submitted and finishing
+        """
+        processed = max(self._processed, 1)
+        metrics = dict(
+            workers=self._workers,
+            busy=self._workers - self._idle,
+            queue_depth=self._queued,
+            max_queue_depth=self._max_queued,
+            processed=self._processed,
+            mean_wait=self._total_wait / processed,
+            max_wait=self._max_wait,
+            mean_latency=self._total_latency / processed,
+            max_latency=self._max_latency)
+        if reset:
+            self._max_queued = self._queued
+            self._processed = 0
+            self._total_wait = self._max_wait = 0.0
+            self._total_latency = self._max_latency = 0.0
+        return metrics
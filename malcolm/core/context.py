@@ -6,7 +6,7 @@ import logging
 import cothread
 
 from .future import Future
-from .request import Put, Post, Subscribe, Unsubscribe
+from .request import Put, PutMany, Post, Subscribe, Unsubscribe
 from .response import Update, Return, Error
 from .concurrency import Queue
 from .errors import TimeoutError, AbortedError, BadValueError
@@ -70,9 +70,12 @@ class Context(object):
 
     STOP = object()
 
-    def __init__(self, process):
-        # type: (Process) -> None
+    def __init__(self, process, inline_requests=False):
+        # type: (Process, bool) -> None
         self._q = Queue()
+        # If True, Get, Subscribe and Unsubscribe requests to a controller
+        # whose lock is free are handled in our cothread without yielding
+        self.inline_requests = inline_requests
         # Func to call just before requests are dispatched
         self._notify_dispatch_request = None
         self._notify_args = ()
@@ -138,9 +141,10 @@ class Context(object):
         return future
 
     def handle_request(self, controller, request):
-        controller.handle_request(request)
-        # Yield control to allow the request to be handled
-        cothread.Yield()
+        spawned = controller.handle_request(request, self.inline_requests)
+        if not (self.inline_requests and spawned.ready()):
+            # Yield control to allow the request to be handled
+            cothread.Yield()
 
     def ignore_stops_before_now(self):
         """Ignore any stops received before this point"""
@@ -185,6 +189,38 @@ class Context(object):
         future = self._dispatch_request(request)
         return future
 
+    def put_many(self, path, values, timeout=None, event_timeout=None):
+        """"Puts values to a number of Attributes of a Block and returns when
+        they have all completed
+
+        Args:
+            path (list): The path to the Block to put to
+            values (dict): {attribute_name: value} for each value to set
+            timeout (float): time in seconds to wait for responses, wait forever
+                if None
+            event_timeout: maximum time in seconds to wait between each response
+                event, wait forever if None
+        """
+        future = self.put_many_async(path, values)
+        self.wait_all_futures(
+            future, timeout=timeout, event_timeout=event_timeout)
+
+    def put_many_async(self, path, values):
+        """"Puts values to a number of Attributes of a Block in a single
+        request and returns immediately
+
+        Args:
+            path (list): The path to the Block to put to
+            values (dict): {attribute_name: value} for each value to set
+
+        Returns:
+             Future: A single Future which will resolve when they are all set
+        """
+        request = PutMany(self._get_next_id(), path, values)
+        request.set_callback(self._q.put)
+        future = self._dispatch_request(request)
+        return future
+
     def post(self, path, params=None, timeout=None, event_timeout=None):
         """Synchronously calls a method
 
@@ -379,6 +415,10 @@ class Context(object):
             if isinstance(request, Put):
                 path = ".".join(request.path)
                 descriptions.append("%s.put_value(%s)" % (path, request.value))
+            elif isinstance(request, PutMany):
+                path = ".".join(request.path)
+                descriptions.append("%s.put_attribute_values(%s)" % (
+                    path, dict(request.values)))
             elif isinstance(request, Subscribe):
                 path = ".".join(request.path)
                 func, _ = self._subscriptions[request.id]
@@ -11,7 +11,8 @@ from .models import BlockModel, AttributeModel, MethodModel, Model
 from .notifier import Notifier
 from .part import PartRegistrar, Part, FieldRegistry, InfoRegistry
 from .concurrency import Queue, Spawned, RLock
-from .request import Get, Subscribe, Unsubscribe, Put, Post, Request
+from .request import Get, Subscribe, Unsubscribe, Put, PutMany, Post, \
+    Request
 from .response import Response
 from .serializable import serialize_object, camel_to_title
 from .views import make_view, Block
@@ -27,6 +28,11 @@ if TYPE_CHECKING:
 DEFAULT_TIMEOUT = 10.0
 
 
+# These requests are handled entirely with the lock held, so can be handled
+# in the caller's cothread without yielding if no-one else holds the lock
+INLINE_REQUESTS = (Get, Subscribe, Unsubscribe)
+
+
 with Anno("The Malcolm Resource Identifier for the Block produced"):
     AMri = str
 with Anno("Description of the Block produced by the controller"):
@@ -43,12 +49,17 @@ class Controller(Hookable):
         self.mri = mri
         self.parts = OrderedDict()  # type: Dict[str, Part]
         self._lock = RLock()
+        # How many requests are waiting for a worker to handle them
+        self._pending_requests = 0
         self._block = BlockModel()
         self._block.meta.set_description(description)
         self._block.meta.set_label(mri)
         self._notifier = Notifier(mri, self._lock, self._block)
         self._block.set_notifier_path(self._notifier, [mri])
         self._write_functions = {}
+        # View subclasses for the current structure of the Block, made and
+        # cleared by make_view
+        self._view_subclasses = {}  # type: Dict[Tuple, type]
         self.field_registry = FieldRegistry()
         self.info_registry = InfoRegistry()
 
@@ -115,10 +126,26 @@ class Controller(Hookable):
             child_view = make_view(self, context, child)
         return child_view
 
-    def handle_request(self, request):
-        # type: (Request) -> Spawned
-        """Spawn a new thread that handles Request"""
-        return self.process.spawn(self._handle_request, request)
+    def handle_request(self, request, inline=False):
+        # type: (Request, bool) -> Spawned
+        """Handle Request in one of the Process' request workers
+
+        Args:
+            request: The Request to handle
+            inline: If True, and the request only needs the lock, and no-one
+                else is using the lock or has requests queued for it, then
+                handle it now in the caller's cothread rather than spawning
+        """
+        if inline and isinstance(request, INLINE_REQUESTS) and \
+                not self._pending_requests and not self._lock.in_use():
+            return Spawned(self._handle_request, (request,), {}, inline=True)
+        self._pending_requests += 1
+        return self.process.spawn_request(self._handle_queued_request, request)
+
+    def _handle_queued_request(self, request):
+        # type: (Request) -> None
+        self._pending_requests -= 1
+        self._handle_request(request)
 
     def _handle_request(self, request):
         # type: (Request) -> None
@@ -129,6 +156,8 @@ class Controller(Hookable):
                 handler = self._handle_get
             elif isinstance(request, Put):
                 handler = self._handle_put
+            elif isinstance(request, PutMany):
+                handler = self._handle_put_many
             elif isinstance(request, Post):
                 handler = self._handle_post
             elif isinstance(request, Subscribe):
@@ -209,6 +238,66 @@ class Controller(Hookable):
         ret = [request.return_response(result)]
         return ret
 
+    def get_put_many_function(self):
+        return self._put_many
+
+    def _put_many(self, values):
+        # type: (Dict[str, Any]) -> None
+        """Call the put functions for all the values in one go, starting them
+        in order, and raising the first error once they have all finished"""
+        spawned = [
+            self.process.spawn_request(self.get_put_function(name), value)
+            for name, value in values.items()]
+        for s in spawned:
+            s.wait()
+        for s in spawned:
+            s.get()
+
+    def _sets_value(self, put_function, attribute_name):
+        # type: (Callable[..., Any], str) -> bool
+        """Return True if put_function is the set_value of the Attribute, so
+        doesn't block and is safe to call with the lock held"""
+        return getattr(put_function, "__func__", None) is \
+            AttributeModel.set_value and \
+            put_function.__self__ is self._block[attribute_name]
+
+    def _handle_put_many(self, request):
+        # type: (PutMany) -> CallbackResponses
+        """Called with the lock taken"""
+        # Check everything before we start, so either all the values are put
+        # or none of them are
+        values = OrderedDict()
+        for attribute_name, value in request.values.items():
+            attribute = self._block[attribute_name]
+            assert isinstance(attribute, AttributeModel), \
+                "Cannot Put to %s which is a %s" % (
+                    attribute.path, type(attribute))
+            self.check_field_writeable(attribute)
+            values[attribute_name] = attribute.meta.validate(value)
+
+        put_many_function = self.get_put_many_function()
+
+        if put_many_function == self._put_many:
+            # Attributes whose put function just sets the value can be done
+            # now, with the lock held and their changes squashed into one Delta
+            local = [k for k in values if self._sets_value(
+                self.get_put_function(k), k)]
+            if local:
+                with self.changes_squashed:
+                    for attribute_name in local:
+                        self.get_put_function(attribute_name)(
+                            values.pop(attribute_name))
+
+        if values:
+            # Don't hold the lock or squash changes while the other put
+            # functions run, as they may block on I/O, and other changes to
+            # the Block should still be published while they do
+            with self.lock_released:
+                put_many_function(values)
+
+        ret = [request.return_response()]
+        return ret
+
     def get_post_function(self, method_name):
         return self._write_functions[method_name]
 
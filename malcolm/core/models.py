@@ -27,8 +27,68 @@ def check_type(value, typ):
 class Model(Serializable):
     notifier = DummyNotifier()
     path = []
+    # The Model that most recently took us as one of its children
+    _parent = None  # type: Model
+    # Our cached serialized form, None if it needs regenerating
+    _serialized = None  # type: OrderedDict
+    # False if we or one of our descendants has been taken as a child by more
+    # than one Model, as we can't be told about all of their changes
+    _cacheable = True
     __slots__ = []
 
+    def to_dict(self):
+        # type: () -> OrderedDict
+        """Create a dictionary representation of object attributes. This is
+        cached until set_endpoint_data() is called on us or one of our
+        children, so should be treated as read-only
+
+        Returns:
+            OrderedDict serialised version of self
+        """
+        serialized = self._serialized
+        if serialized is None:
+            serialized = self._make_dict()
+            if self._cacheable:
+                self._serialized = serialized
+        return serialized
+
+    def _make_dict(self):
+        # type: () -> OrderedDict
+        """Create the dictionary that to_dict() will cache"""
+        return super(Model, self).to_dict()
+
+    def _invalidate_serialized(self):
+        # type: () -> None
+        """Throw away our cached serialized form and that of our parents"""
+        model = self
+        # If a model has no cached form then its parents don't either, as
+        # serializing them would have serialized it
+        while model is not None and model._serialized is not None:
+            model._serialized = None
+            model = model._parent
+
+    def _adopt_child(self, child):
+        # type: (Model) -> None
+        """Make a child Model tell us when its serialized form changes"""
+        if child._parent is not None and child._parent is not self:
+            # It is shared, and will only tell its first parent when it
+            # changes, so neither parent can cache its serialized form
+            child._parent._stop_caching()
+            self._stop_caching()
+        else:
+            child._parent = self
+            if not child._cacheable:
+                self._stop_caching()
+
+    def _stop_caching(self):
+        # type: () -> None
+        """Stop caching our serialized form and that of our parents"""
+        model = self
+        while model is not None and model._cacheable:
+            model._cacheable = False
+            model._serialized = None
+            model = model._parent
+
     def set_notifier_path(self, notifier, path):
         """Sets the notifier, and the path from the path from block root
 
@@ -96,6 +156,7 @@ class Model(Serializable):
                     for k, v in value.items():
                         v.set_notifier_path(self.notifier,
                                             self.path + [name, k])
+                        self._adopt_child(v)
             else:
                 # If we are setting a Model then sort notification
                 if issubclass(ct.typ, Model):
@@ -104,11 +165,13 @@ class Model(Serializable):
                     if child:
                         child.set_notifier_path(Model.notifier, [])
                     value.set_notifier_path(self.notifier, self.path)
+                    self._adopt_child(value)
                 # Make sure it is the right typ
                 check_type(value, ct.typ)
             with self.notifier.changes_squashed:
                 # Actually set the attribute
                 setattr(self, name, value)
+                self._invalidate_serialized()
                 # Tell the notifier what changed
                 self.notifier.add_squashed_change(self.path + [name], value)
             return value
@@ -321,6 +384,7 @@ class AttributeModel(Model):
         # type: (Any, Alarm, TimeStamp) -> None
         with self.notifier.changes_squashed:
             # Assume they are of the right format
+            self._invalidate_serialized()
             self.value = value
             self.notifier.add_squashed_change(self.path + ["value"], value)
             if alarm is not self.alarm:
@@ -358,7 +422,7 @@ class AttributeModel(Model):
 class NTTable(AttributeModel):
     __slots__ = []
 
-    def to_dict(self):
+    def _make_dict(self):
         # type: () -> OrderedDict
         d = OrderedDict()
         d["typeid"] = self.typeid
@@ -371,7 +435,7 @@ class NTTable(AttributeModel):
             else:
                 labels.append(column_name)
         d["labels"] = Array[str](labels)
-        d.update(super(NTTable, self).to_dict())
+        d.update(super(NTTable, self)._make_dict())
         return d
 
     @classmethod
@@ -914,6 +978,8 @@ class MethodModel(Meta):
 
     def set_defaults(self, defaults):
         # type: (ADefaults) -> ADefaults
+        # Copy so we don't modify the caller's (possibly serialized) dict
+        defaults = OrderedDict(defaults.items())
         for k, v in defaults.items():
             if k != "typeid":
                 defaults[k] = self.takes.elements[k].validate(v)
@@ -1043,7 +1109,9 @@ class BlockModel(Model):
                 anno = Anno("Field", typ=type(value))
                 self.call_types[name] = anno
             value.set_notifier_path(self.notifier, self.path + [name])
+            self._adopt_child(value)
             setattr(self, name, value)
+            self._invalidate_serialized()
             # Tell the notifier what changed
             self.notifier.add_squashed_change(self.path + [name], value)
             self._update_fields()
@@ -1058,5 +1126,6 @@ class BlockModel(Model):
             getattr(self, name).set_notifier_path(Model.notifier, [])
             self.call_types.pop(name)
             delattr(self, name)
+            self._invalidate_serialized()
             self._update_fields()
             self.notifier.add_squashed_delete(self.path + [name])
@@ -1,12 +1,14 @@
 from contextlib import contextmanager
+import logging
+import time
 
 from annotypes import TYPE_CHECKING
 
 from .serializable import serialize_object
 from .loggable import Loggable
 from .request import Subscribe, Unsubscribe
-from .response import Response
-from .concurrency import RLock
+from .response import Response, Update, Delta
+from .concurrency import RLock, Timer
 
 if TYPE_CHECKING:
     from .models import BlockModel
@@ -14,6 +16,112 @@ if TYPE_CHECKING:
     Callback = Callable[[Response], None]
     CallbackResponses = List[Tuple[Callback, Response]]
     SubscriptionKeys = Dict[Tuple[Callback, int], Subscribe]
+    SerializedCache = Dict[int, Tuple[Any, Any]]
+
+# Make a module level logger
+log = logging.getLogger(__name__)
+
+
+def squash_changes(changes):
+    # type: (List[List]) -> List[List]
+    """Remove any changes that are overwritten by a later change
+
+    A change is overwritten if a later change (or deletion) is made to the
+    same path, or to one of its parents. The surviving changes keep their
+    relative order.
+
+    Args:
+        changes (list): [[path, optional data]] in the order they were made
+
+    Returns:
+        list: [[path, optional data]] with the intermediate changes removed
+    """
+    if len(changes) < 2:
+        return changes
+    squashed = []
+    seen = set()
+    for change in reversed(changes):
+        path = tuple(change[0])
+        for i in range(len(path) + 1):
+            if path[:i] in seen:
+                # This path or one of its parents is set later on
+                break
+        else:
+            seen.add(path)
+            squashed.append(change)
+    squashed.reverse()
+    return squashed
+
+
+def serialize_cached(o, cache):
+    # type: (Any, SerializedCache) -> Any
+    """Serialize an object, reusing a previous result if it was already
+    serialized with this cache
+
+    Args:
+        o (object): The object to serialize
+        cache (dict): {id(o): (o, serialized)} shared by everything that is
+            notified as a result of the same set of changes
+
+    Returns:
+        object: The serialized object
+    """
+    try:
+        return cache[id(o)][1]
+    except KeyError:
+        serialized = serialize_object(o)
+        # Keep a reference to o so its id can't be reused while cache exists
+        cache[id(o)] = (o, serialized)
+        return serialized
+
+
+class ConflatingCallback(object):
+    """Wraps the callback of a Subscribe so that Updates and Deltas are passed
+    on at most rate times a second. If more arrive in between then only the
+    latest Update, or all the Deltas squashed together, are passed on at the
+    end of the interval. The caller is never blocked waiting for this"""
+
+    def __init__(self, callback, rate):
+        # type: (Callback, float) -> None
+        self.callback = callback
+        self.period = 1.0 / rate
+        self._last_sent = 0.0
+        self._pending = None  # type: Response
+        self._timer = None  # type: Timer
+
+    def __call__(self, response):
+        # type: (Response) -> None
+        if not isinstance(response, (Update, Delta)):
+            # The subscription has finished, send what we have first
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            self._send_pending()
+            self.callback(response)
+            return
+        if isinstance(response, Delta) and self._pending is not None:
+            response = Delta(id=response.id, changes=squash_changes(
+                self._pending.changes + response.changes))
+        self._pending = response
+        if self._timer is None:
+            delay = self._last_sent + self.period - time.time()
+            if delay > 0:
+                self._timer = Timer(delay, self._send_timer_expired)
+            else:
+                self._send_pending()
+
+    def _send_timer_expired(self):
+        self._timer = None
+        try:
+            self._send_pending()
+        except Exception:
+            log.exception("Exception notifying %s", self.callback)
+
+    def _send_pending(self):
+        if self._pending is not None:
+            response, self._pending = self._pending, None
+            self._last_sent = time.time()
+            self.callback(response)
 
 
 class DummyNotifier(object):
@@ -47,8 +155,13 @@ class Notifier(Loggable):
     def handle_subscribe(self, request):
         # type: (Subscribe) -> CallbackResponses
         """Handle a Subscribe request from outside. Called with lock taken"""
+        # Make the key before the callback is wrapped so Unsubscribe matches
+        key = request.generate_key()
+        if request.rate:
+            request.set_callback(ConflatingCallback(
+                request.callback, request.rate))
         ret = self._tree.handle_subscribe(request, request.path[1:])
-        self._subscription_keys[request.generate_key()] = request
+        self._subscription_keys[key] = request
         return ret
 
     def handle_unsubscribe(self, request):
@@ -102,9 +215,8 @@ class Notifier(Loggable):
         try:
             self._squashed_count -= 1
             if self._squashed_count == 0:
-                changes = self._squashed_changes
+                changes = squash_changes(self._squashed_changes)
                 self._squashed_changes = []
-                # TODO: squash intermediate deltas here?
                 responses += self._tree.notify_changes(changes)
         finally:
             self._lock.release()
@@ -133,18 +245,23 @@ class NotifierNode(object):
         self.parent = parent
         self.data = data
 
-    def notify_changes(self, changes):
-        # type: (List[List]) -> CallbackResponses
+    def notify_changes(self, changes, cache=None):
+        # type: (List[List], SerializedCache) -> CallbackResponses
         """Set our data and notify anyone listening
 
         Args:
             changes (list): [[path, optional data]] where path is the path to
                 what has changed, and data is the unserialized object that has
                 changed
+            cache (dict): Serialized objects shared between all the nodes
+                notified of these changes, so each object is only serialized
+                once
 
         Returns:
             list: [(callback, Response)] that need to be called
         """
+        if cache is None:
+            cache = {}
         ret = []
         child_changes = {}
         for change in changes:
@@ -153,20 +270,25 @@ class NotifierNode(object):
 
         # If we have update subscribers, serialize at this level
         if self.update_requests:
-            serialized = serialize_object(self.data)
+            serialized = serialize_cached(self.data, cache)
             for request in self.update_requests:
                 ret.append(request.update_response(serialized))
 
         # If we have delta subscribers, serialize the changes
         if self.delta_requests:
+            serialized_changes = []
             for change in changes:
-                change[-1] = serialize_object(change[-1])
+                if len(change) == 2:
+                    serialized_changes.append(
+                        [change[0], serialize_cached(change[1], cache)])
+                else:
+                    serialized_changes.append(change)
             for request in self.delta_requests:
-                ret.append(request.delta_response(changes))
+                ret.append(request.delta_response(serialized_changes))
 
         # Now notify our children
         for name, child_changes in child_changes.items():
-            ret += self.children[name].notify_changes(child_changes)
+            ret += self.children[name].notify_changes(child_changes, cache)
         return ret
 
     def _add_child_change(self, change, child_changes):
@@ -112,6 +112,12 @@ class PartRegistrar(object):
         self._info_registry = info_registry
         self._part = part
 
+    @property
+    def field_registry(self):
+        # type: () -> FieldRegistry
+        """The FieldRegistry shared by all the Parts of the Controller"""
+        return self._field_registry
+
     def get_fields(self):
         # type: () -> List[Tuple[str, Field, Callable]]
         """Get the field list that we have added"""
@@ -6,11 +6,11 @@ from .controller import Controller
 from .hook import Hook, start_hooks, AHookable, wait_hooks
 from .info import Info
 from .loggable import Loggable
-from .concurrency import Spawned
+from .concurrency import Spawned, WorkerPool
 from .views import Block
 
 if TYPE_CHECKING:
-    from typing import List, Callable, Any, TypeVar
+    from typing import List, Callable, Any, TypeVar, Dict, Union
 
     T = TypeVar("T")
 
@@ -74,6 +74,8 @@ class Process(Loggable):
         self.state = STOPPED
         self._spawned = []
         self._spawn_count = 0
+        # Long lived workers for spawn_request
+        self._request_pool = WorkerPool()
 
     def start(self, timeout=None):
         """Start the process going
@@ -143,6 +145,9 @@ class Process(Loggable):
                 self.log.debug(
                     "Waiting for %s *%s **%s", s._function, s._args, s._kwargs)
             s.wait(timeout=timeout)
+        for s in self._request_pool.in_flight():
+            s.wait(timeout=timeout)
+        self._request_pool.stop()
         self._spawned = []
         self._controllers = OrderedDict()
         self._unpublished = set()
@@ -171,6 +176,30 @@ class Process(Loggable):
             self._clear_spawn_list()
         return spawned
 
+    def spawn_request(self, function, *args, **kwargs):
+        # type: (Callable[..., Any], *Any, **Any) -> Spawned
+        """Like spawn(), but runs the function in one of a pool of long lived
+        worker threads. Functions are started in the order they were given,
+        so requests to a Controller are handled in the order they arrive
+
+        Args:
+            function: Function to run
+            args: Positional arguments to run the function with
+            kwargs: Keyword arguments to run the function with
+
+        Returns:
+            Spawned: Something you can call wait(timeout) on to see when it's
+                finished executing
+        """
+        assert self.state != STOPPED, "Can't spawn when process stopped"
+        return Spawned(function, args, kwargs, self._request_pool)
+
+    def request_metrics(self, reset=False):
+        # type: (bool) -> Dict[str, Union[int, float]]
+        """Return the queue depth and latency metrics of the workers that
+        spawn_request() uses. See `WorkerPool.metrics`"""
+        return self._request_pool.metrics(reset)
+
     def _clear_spawn_list(self):
         # type: () -> None
         self._spawn_count = 0
@@ -2,6 +2,7 @@ import logging
 
 from annotypes import Anno, Array, Any, TYPE_CHECKING, Mapping, Union, Sequence
 
+from malcolm.compat import OrderedDict
 from .response import Return, Error, Update, Delta, Response
 from .serializable import Serializable, serialize_object
 
@@ -23,8 +24,12 @@ with Anno("If set then return the current value in Return when Put completes"):
     AGet = bool
 with Anno("Parameters to use in a method Post"):
     AParameters = Mapping[str, Any]
+with Anno("Attribute names and the values to put to them, in order"):
+    AValues = Mapping[str, Any]
 with Anno("Notify of differences only"):
     ADifferences = bool
+with Anno("Maximum number of updates per second to send, 0 for no limit"):
+    ARate = float
 UPath = Union[APath, Sequence[str], str]
 
 
@@ -105,6 +110,23 @@ class Put(PathRequest):
         self.get = get
 
 
+@Serializable.register_subclass("malcolm:core/PutMany:1.0")
+class PutMany(PathRequest):
+    """Create a PutMany Request object to put to the values of a number of
+    Attributes of a Block in one go"""
+    __slots__ = ["values"]
+
+    # Allow id to shadow builtin id so id is a key in the serialized dict
+    # noinspection PyShadowingBuiltins
+    def __init__(self, id=0, path=None, values=None):
+        # type: (AId, UPath, AValues) -> None
+        super(PutMany, self).__init__(id, path)
+        self.values = OrderedDict()
+        if values is not None:
+            for k, v in values.items():
+                self.values[k] = serialize_object(v)
+
+
 @Serializable.register_subclass("malcolm:core/Post:1.0")
 class Post(PathRequest):
     """Create a Post Request object"""
@@ -124,14 +146,23 @@ class Post(PathRequest):
 @Serializable.register_subclass("malcolm:core/Subscribe:1.0")
 class Subscribe(PathRequest):
     """Create a Subscribe Request object"""
-    __slots__ = ["delta"]
+    __slots__ = ["delta", "rate"]
 
     # Allow id to shadow builtin id so id is a key in the serialized dict
     # noinspection PyShadowingBuiltins
-    def __init__(self, id=0, path=None, delta=False):
-        # type: (AId, UPath, ADifferences) -> None
+    def __init__(self, id=0, path=None, delta=False, rate=0):
+        # type: (AId, UPath, ADifferences, ARate) -> None
         super(Subscribe, self).__init__(id, path)
         self.delta = delta
+        self.rate = rate
+
+    def to_dict(self):
+        # type: () -> OrderedDict
+        d = super(Subscribe, self).to_dict()
+        if not self.rate:
+            # Leave it out so servers that don't know about rate accept it
+            d.pop("rate")
+        return d
 
     def update_response(self, value):
         # type: (Any) -> Tuple[Callback, Update]
@@ -1,14 +1,16 @@
 import re
+import os
 import logging
 import json
 
 from annotypes import WithCallTypes, TypeVar, Any, TYPE_CHECKING
 from enum import Enum
+import numpy as np
 
 from malcolm.compat import OrderedDict
 from .errors import FieldError
 if TYPE_CHECKING:
-    from typing import Type, Union, Sequence
+    from typing import Type, Union, Sequence, Callable, Dict
 
 # Create a module level logger
 log = logging.getLogger(__name__)
@@ -26,6 +28,122 @@ def json_encode(o, indent=None):
     return s
 
 
+def _stdlib_dumps(o):
+    # type: (Any) -> str
+    return json.dumps(o, default=serialize_hook, separators=(",", ":"))
+
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    _orjson_dumps = None
+else:
+    def _orjson_hook(o):
+        # Cheaper than subclass check...
+        if o.__class__.__name__ == "Array":
+            # orjson will write a numpy array straight from its buffer if it
+            # can, and call us again with it if it can't
+            return o.seq
+        elif isinstance(o, Serializable) and \
+                type(o).to_dict == Serializable.to_dict:
+            # Don't serialize all the way down, orjson will call us again for
+            # any children it can't handle natively. This is for the Requests,
+            # Responses and Tables that wrap other objects. Models and the
+            # like override to_dict() to cache their dicts, so they go through
+            # serialize_hook below. Their cached dicts keep Arrays as they are,
+            # so the numpy arrays in them are still written from their buffers
+            d = OrderedDict()
+            if o.typeid:
+                d["typeid"] = o.typeid
+            for k in o.call_types:
+                d[k] = getattr(o, k)
+            return d
+        else:
+            return serialize_hook(o)
+
+    def _orjson_dumps(o):
+        # type: (Any) -> str
+        try:
+            return orjson.dumps(
+                o, default=_orjson_hook, option=orjson.OPT_SERIALIZE_NUMPY
+            ).decode()
+        except orjson.JSONEncodeError:
+            # Probably an int that doesn't fit in 64-bits, let the standard
+            # library have a go at it
+            return _stdlib_dumps(o)
+
+
+# {name: dumps(o) -> str} of JSON backends available for json_encode_message
+JSON_BACKENDS = OrderedDict()  # type: Dict[str, Callable[[Any], str]]
+JSON_BACKENDS["json"] = _stdlib_dumps
+if _orjson_dumps:
+    JSON_BACKENDS["orjson"] = _orjson_dumps
+
+# The backend currently used by json_encode_message. orjson is faster, but
+# encodes NaN and Infinity as null, so it has to be asked for
+_json_dumps = _stdlib_dumps
+
+
+def set_json_backend(name):
+    # type: (str) -> None
+    """Set the backend that json_encode_message will use
+
+    Args:
+        name (str): The name of the backend in JSON_BACKENDS, e.g. "orjson"
+    """
+    global _json_dumps
+    try:
+        _json_dumps = JSON_BACKENDS[name]
+    except KeyError:
+        raise ValueError("JSON backend %r not in available backends %s" % (
+            name, list(JSON_BACKENDS)))
+
+
+def register_json_backend(name, dumps):
+    # type: (str, Callable[[Any], str]) -> None
+    """Make a JSON backend available to set_json_backend
+
+    Args:
+        name (str): The name of the backend, e.g. "orjson"
+        dumps (callable): Function that takes any object that json_encode can
+            take and returns a compact JSON str
+    """
+    JSON_BACKENDS[name] = dumps
+
+
+def json_encode_message(o):
+    # type: (Any) -> str
+    """Encode a message that will be sent over the wire as compact JSON
+
+    This uses the standard library unless another backend has been selected
+    with set_json_backend() or the PYMALCOLM_JSON_BACKEND environment
+    variable. Other backends may encode NaN and Infinity as null.
+    Serializable, Array, numpy arrays and scalars, Enum and Table instances
+    are all supported.
+
+    Args:
+        o: The object to encode, like a Response or its serialized dict
+
+    Returns:
+        str: The JSON string
+    """
+    return _json_dumps(o)
+
+
+def _set_json_backend_from_environ(environ):
+    # type: (Dict[str, str]) -> None
+    name = environ.get("PYMALCOLM_JSON_BACKEND")
+    if name:
+        try:
+            set_json_backend(name)
+        except ValueError as e:
+            log.warning("%s, using %r instead", e, "json")
+
+
+_set_json_backend_from_environ(os.environ)
+
+
 def json_decode(s):
     try:
         o = json.loads(s, object_pairs_hook=OrderedDict)
@@ -36,6 +154,9 @@ def json_decode(s):
 
 
 def serialize_hook(o):
+    if isinstance(o, np.ndarray):
+        # Fast path for the most likely large object
+        return o.tolist()
     o = serialize_object(o)
     # Cheaper than subclass check...
     if o.__class__.__name__ == "Array":
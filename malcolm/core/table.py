@@ -1,33 +1,137 @@
+from annotypes import TYPE_CHECKING, Anno, Any
+import numpy as np
+
 from .serializable import Serializable
 
+if TYPE_CHECKING:
+    from typing import Sequence, List, Iterable, Optional
+
+
+def _numeric_dtype(typ):
+    # type: (type) -> Optional[np.dtype]
+    """Return the numpy dtype of a column element type if it is numeric"""
+    if issubclass(typ, str):
+        # Includes str based Enums, which numpy would treat as objects anyway
+        return None
+    try:
+        dtype = np.dtype(typ)
+    except TypeError:
+        return None
+    if dtype.kind in "biuf":
+        return dtype
+
+
+def _column(anno, seq):
+    # type: (Anno, Sequence) -> Any
+    """Make a column of the right type, numeric ones as numpy arrays"""
+    dtype = _numeric_dtype(anno.typ)
+    if dtype is not None:
+        seq = np.asarray(seq, dtype=dtype)
+    elif isinstance(seq, np.ndarray):
+        seq = seq.tolist()
+    elif not isinstance(seq, list):
+        seq = list(seq)
+    return anno(seq)
+
+
+def _column_seq(column):
+    # type: (Any) -> Sequence
+    """Get at the underlying list or numpy array of an Array"""
+    return getattr(column, "seq", column)
+
 
 @Serializable.register_subclass("malcolm:core/Table:1.0")
 class Table(Serializable):
     # real data stored as attributes
     # getitem supported for row by row operations
+
+    # Number of rows, set when the column lengths have been validated
+    _nrows = None
+
+    def __setattr__(self, key, value):
+        if key in self.call_types:
+            # Changing a column means the lengths need checking again
+            self.__dict__["_nrows"] = None
+        super(Table, self).__setattr__(key, value)
+
     def validate_column_lengths(self):
         lengths = {a: len(getattr(self, a)) for a in self.call_types}
-        assert len(set(lengths.values())) == 1, \
+        assert len(set(lengths.values())) <= 1, \
             "Column lengths %s don't match" % lengths
+        self.__dict__["_nrows"] = lengths.popitem()[1] if lengths else 0
+
+    def _validated_nrows(self):
+        # type: () -> int
+        if self._nrows is None:
+            self.validate_column_lengths()
+        return self._nrows
 
     def __getitem__(self, item):
         if isinstance(item, int):
-            self.validate_column_lengths()
+            self._validated_nrows()
             return [getattr(self, a)[item] for a in self.call_types]
+        elif isinstance(item, slice):
+            self._validated_nrows()
+            return self.__class__(**{
+                a: _column(anno, _column_seq(getattr(self, a))[item])
+                for a, anno in self.call_types.items()})
         else:
             return super(Table, self).__getitem__(item)
 
     @classmethod
     def from_rows(cls, rows):
-        attrs = {k: [] for k in cls.call_types}
-        for row in rows:
-            for key, data in zip(cls.call_types, row):
-                attrs[key].append(data)
-        attrs = {k: cls.call_types[k](v) for k, v in attrs.items()}
+        # type: (Iterable[Sequence]) -> Table
+        """Create a Table from a sequence of rows, each a sequence of the
+        values for each column in order"""
+        columns = list(zip(*rows))
+        if not columns:
+            columns = [()] * len(cls.call_types)
+        attrs = {k: _column(anno, column) for (k, anno), column in zip(
+            cls.call_types.items(), columns)}
         return cls(**attrs)
 
+    @classmethod
+    def from_array(cls, array):
+        # type: (np.ndarray) -> Table
+        """Create a Table from a 2D array with a row of it per Table row and a
+        column of it per Table column"""
+        array = np.asarray(array)
+        assert array.ndim == 2 and array.shape[1] == len(cls.call_types), \
+            "Expected 2D array with %d columns, got shape %s" % (
+                len(cls.call_types), array.shape)
+        attrs = {k: _column(anno, array[:, i]) for i, (k, anno) in enumerate(
+            cls.call_types.items())}
+        return cls(**attrs)
+
+    def append(self, row):
+        # type: (Sequence) -> None
+        """Add a row to the end of the Table"""
+        self.extend([row])
+
+    def extend(self, rows):
+        # type: (Iterable[Sequence]) -> None
+        """Add rows to the end of the Table. Much faster than calling append()
+        for each row as each column is only copied once"""
+        self._validated_nrows()
+        other = self.from_rows(rows)
+        for a, anno in self.call_types.items():
+            seq = _column_seq(getattr(self, a))
+            extra = _column_seq(getattr(other, a))
+            if isinstance(seq, np.ndarray):
+                seq = np.concatenate((seq, extra))
+            else:
+                seq = list(seq) + list(extra)
+            setattr(self, a, _column(anno, seq))
+
     def rows(self):
-        self.validate_column_lengths()
-        data = [getattr(self, a) for a in self.call_types]
+        # type: () -> Iterable[List]
+        self._validated_nrows()
+        data = []
+        for a in self.call_types:
+            seq = _column_seq(getattr(self, a))
+            if isinstance(seq, np.ndarray):
+                # Much faster than indexing the array an element at a time
+                seq = seq.tolist()
+            data.append(seq)
         for row in zip(*data):
             yield list(row)
@@ -6,7 +6,7 @@ from .models import BlockModel, MethodModel, AttributeModel
 from malcolm.core.models import Model
 
 if TYPE_CHECKING:
-    from typing import Any
+    from typing import Any, Dict, Tuple
     from .controller import Controller
 
 
@@ -51,16 +51,42 @@ def _make_get_property(cls, endpoint):
     setattr(cls, endpoint, make_child_view)
 
 
-def _make_view_subclass(cls, controller, context, data):
-    # Properties can only be set on classes, so make subclass that we can use
-    class ViewSubclass(cls):
-        pass
+def _make_async_method(cls, endpoint):
+    def post_async(self, *args, **kwargs):
+        child = getattr(self, endpoint)  # type: Method
+        return child.post_async(*args, **kwargs)
+
+    setattr(cls, "%s_async" % endpoint, post_async)
 
-    for endpoint in data:
-        # make properties for the endpoints we know about
-        _make_get_property(ViewSubclass, endpoint)
 
-    view = ViewSubclass(controller, context, data)
+def _make_view_subclass(cls, controller, context, data):
+    # The subclass only depends on the endpoints, so if they change we get
+    # a different key and a new subclass, otherwise we can reuse it
+    key = (cls, tuple((endpoint, isinstance(data[endpoint], MethodModel))
+                      for endpoint in data))
+    # {(View class, ((endpoint, is_method), ...)): View subclass}
+    view_subclasses = controller._view_subclasses  # type: Dict[Tuple, type]
+    try:
+        view_subclass = view_subclasses[key]
+    except KeyError:
+        if cls is Block:
+            # The structure of the Block has changed, so throw away the
+            # subclasses we made for the old one rather than keeping them all
+            view_subclasses.clear()
+        # Properties can only be set on classes, so make subclass that we
+        # can use
+        class ViewSubclass(cls):
+            pass
+
+        for endpoint, is_method in key[1]:
+            # make properties for the endpoints we know about
+            _make_get_property(ViewSubclass, endpoint)
+            if is_method and cls is Block:
+                # Add _async versions of method
+                _make_async_method(ViewSubclass, endpoint)
+        view_subclass = view_subclasses.setdefault(key, ViewSubclass)
+
+    view = view_subclass(controller, context, data)
     return view
 
 
@@ -159,12 +185,6 @@ class Method(View):
 
 class Block(View):
     """Object consisting of a number of Attributes and Methods"""
-    def __init__(self, controller, context, data):
-        super(Block, self).__init__(controller, context, data)
-        for endpoint in self._data:
-            if isinstance(data[endpoint], MethodModel):
-                # Add _async versions of method
-                self._make_async_method(endpoint)
 
     def __getattr__(self, item):
         # type: (str) -> View
@@ -177,28 +197,21 @@ class Block(View):
     def mri(self):
         return self._data.path[0]
 
-    def _make_async_method(self, endpoint):
-        def post_async(*args, **kwargs):
-            child = getattr(self, endpoint)  # type: Method
-            return child.post_async(*args, **kwargs)
-
-        object.__setattr__(self, "%s_async" % endpoint, post_async)
-
     def put_attribute_values_async(self, params):
-        futures = []
         if type(params) is dict:
             # If we have a plain dictionary, then sort items
             items = sorted(params.items())
         else:
             # Assume we are already ordered
             items = params.items()
+        values = OrderedDict()
         for attr, value in items:
             assert hasattr(self, attr), \
                 "Block does not have attribute %s" % attr
-            future = self._context.put_async(
-                self._data.path + [attr, "value"], value)
-            futures.append(future)
-        return futures
+            values[attr] = value
+        # Put them all in a single request
+        future = self._context.put_many_async(self._data.path, values)
+        return [future]
 
     def put_attribute_values(self, params, timeout=None, event_timeout=None):
         futures = self.put_attribute_values_async(params)
@@ -252,7 +252,7 @@ def main():
                 super(UserContext, self).handle_request,
                 controller, request)
 
-    self = UserContext(process)
+    self = UserContext(process, inline_requests=True)
 
     header = """Welcome to iMalcolm.
 
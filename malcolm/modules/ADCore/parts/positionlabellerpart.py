@@ -1,22 +1,18 @@
-from xml.etree import cElementTree as ET
-
+import numpy as np
 from annotypes import TYPE_CHECKING, add_call_types, Any
 
-from malcolm.compat import et_to_string
 from malcolm.core import APartName, Hook
 from malcolm.modules import builtin, scanning
+from ..util import generator_indexes
 
 # How big an XML file can the EPICS waveform receive?
 XML_MAX_SIZE = 1000000 - 2
 
-# How many to load each time
-POSITIONS_PER_XML = 1000
-
-# How far to load ahead
-N_LOAD_AHEAD = 4
+# Powers of 10 for counting the digits in an index
+POWERS_OF_10 = 10 ** np.arange(1, 19, dtype=np.int64)
 
 if TYPE_CHECKING:
-    from typing import Tuple
+    from typing import Tuple, Optional
 
 
 class PositionLabellerPart(builtin.parts.ChildPart):
@@ -37,6 +33,11 @@ class PositionLabellerPart(builtin.parts.ChildPart):
         self.loading = False
         # When arrayCounter gets to here we are done
         self.done_when_reaches = 0
+        # The next xml to load and its end_index, made before it is needed
+        self.next_xml = None  # type: Optional[Tuple[str, int]]
+        # How many positions were in the last xml we loaded, we load more
+        # when the plugin has less than this left
+        self.load_ahead = 0
         # Hooks
         self.register_hooked((scanning.hooks.ConfigureHook,
                               scanning.hooks.PostRunArmedHook,
@@ -81,13 +82,17 @@ class PositionLabellerPart(builtin.parts.ChildPart):
             enableCallbacks=True,
             idStart=id_start))
         self.steps_up_to = completed_steps + steps_to_do
+        self.next_xml = None
         xml, self.end_index = self._make_xml(completed_steps)
+        self.load_ahead = self.end_index - completed_steps
         # Wait for the previous puts to finish
         context.wait_all_futures(futures)
         # Put the xml
         child.xml.put_value(xml)
         # Start the plugin
         self.start_future = child.start_async()
+        # Make the next lot of positions while the plugin starts
+        self._make_next_xml()
 
     @add_call_types
     def run(self, context):
@@ -106,46 +111,63 @@ class PositionLabellerPart(builtin.parts.ChildPart):
     def load_more_positions(self, number_left, child):
         # type: (int, Any) -> None
         if not self.loading and self.end_index < self.steps_up_to and \
-                number_left < POSITIONS_PER_XML * N_LOAD_AHEAD:
+                number_left < self.load_ahead:
             self.loading = True
-            xml, self.end_index = self._make_xml(self.end_index)
+            if self.next_xml is None:
+                self._make_next_xml()
+            start_index = self.end_index
+            xml, self.end_index = self.next_xml
+            self.load_ahead = self.end_index - start_index
             child.xml.put_value(xml)
+            # Make the next lot now, so it is ready before we need it
+            self._make_next_xml()
             self.loading = False
 
+    def _make_next_xml(self):
+        if self.end_index < self.steps_up_to:
+            self.next_xml = self._make_xml(self.end_index)
+        else:
+            self.next_xml = None
+
     def _make_xml(self, start_index):
         # type: (int) -> Tuple[str, int]
-
-        # Make xml root
-        root_el = ET.Element("pos_layout")
-        dimensions_el = ET.SubElement(root_el, "dimensions")
-
-        # Make an index for every hdf index
-        for i in range(len(self.generator.dimensions)):
-            ET.SubElement(dimensions_el, "dimension", name="d%d" % i)
-
-        # Add the a file close command for the HDF writer
-        ET.SubElement(dimensions_el, "dimension", name="FilePluginClose")
+        """Make the xml for as many positions from start_index as will fit in
+        XML_MAX_SIZE, writing the text directly rather than building an
+        ElementTree
+
+        Returns:
+            tuple: (xml, end_index) where end_index is one after the last
+                position in the xml
+        """
+        # Make an index for every hdf index, and a file close command for the
+        # HDF writer
+        names = ["FilePluginClose"] + [
+            "d%d" % i for i in range(len(self.generator.dimensions))]
+        header = '<?xml version="1.0" ?><pos_layout><dimensions>%s' \
+                 '</dimensions><positions>' % "".join(
+                     '<dimension name="%s" />' % name
+                     for name in names[1:] + names[:1])
+        footer = '</positions></pos_layout>'
+        template = "<position %s />" % " ".join(
+            '%s="%%d"' % name for name in names)
+
+        # Work out how many positions we could fit if every index had a single
+        # digit, then how many actually fit
+        room = XML_MAX_SIZE - 1 - len(header) - len(footer)
+        fixed_length = len(template % ((0,) * len(names))) - len(names)
+        end_index = min(start_index + room // (fixed_length + len(names)),
+                        self.steps_up_to)
+        indexes = generator_indexes(self.generator, start_index, end_index)
+        lengths = fixed_length + 1 + np.sum(
+            1 + np.searchsorted(POWERS_OF_10, indexes, side="right"), axis=1)
+        num = np.searchsorted(np.cumsum(lengths), room, side="right")
+        assert num > 0 or start_index == end_index, \
+            "XML size %d too big" % (len(header) + lengths[0] + len(footer))
+        end_index = start_index + int(num)
 
         # Add the actual positions
-        positions_el = ET.SubElement(root_el, "positions")
-
-        end_index = start_index + POSITIONS_PER_XML
-        if end_index > self.steps_up_to:
-            end_index = self.steps_up_to
-
-        for i in range(start_index, end_index):
-            point = self.generator.get_point(i)
-            if i == self.generator.size - 1:
-                do_close = True
-            else:
-                do_close = False
-            positions = dict(FilePluginClose="%d" % do_close)
-            for j, value in enumerate(point.indexes):
-                positions["d%d" % j] = str(value)
-            position_el = ET.Element("position", **positions)
-            positions_el.append(position_el)
-
-        xml = et_to_string(root_el)
-        xml_length = len(xml)
-        assert xml_length < XML_MAX_SIZE, "XML size %d too big" % xml_length
+        do_close = np.arange(start_index, end_index) == self.generator.size - 1
+        positions = np.column_stack((do_close, indexes[:num])).tolist()
+        xml = header + "".join(template % tuple(p) for p in positions) + \
+            footer
         return xml, end_index
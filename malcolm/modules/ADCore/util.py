@@ -7,6 +7,7 @@ from malcolm.modules import scanning
 
 if TYPE_CHECKING:
     from typing import List, Any
+    from scanpointgenerator import CompoundGenerator
 
 
 class AttributeDatasetType(Enum):
@@ -151,3 +152,33 @@ class ADBaseActions(object):
         # type: (int, PartRegistrar) -> None
         completed_steps = value + self.uniqueid_offset
         registrar.report(scanning.infos.RunProgressInfo(completed_steps))
+
+
+def generator_indexes(generator, start, end):
+    # type: (CompoundGenerator, int, int) -> np.ndarray
+    """Get the dimension indexes of a range of points from a prepared
+    generator in one go, rather than calling get_point() for each one
+
+    Args:
+        generator: The prepared CompoundGenerator
+        start: The first point number to get
+        end: One after the last point number to get
+
+    Returns:
+        np.ndarray: Array of shape (end - start, len(generator.dimensions)),
+            with each row the same as get_point().indexes for that point
+    """
+    shape = (end - start, len(generator.dimensions))
+    if hasattr(generator, "get_points"):
+        indexes = generator.get_points(start, end).indexes
+        return np.asarray(indexes, np.int64).reshape(shape)
+    dimension_indexes = scanning.util.generator_dimension_indexes(
+        generator, start, end)
+    if dimension_indexes is None:
+        # Doesn't have the private attributes we need, so do it the slow way
+        return np.array([generator.get_point(i).indexes
+                         for i in range(start, end)], np.int64).reshape(shape)
+    indexes = np.empty(shape, np.int64)
+    for d, (i, _, _) in enumerate(dimension_indexes):
+        indexes[:, d] = i
+    return indexes
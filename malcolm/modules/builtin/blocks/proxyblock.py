@@ -1,11 +1,11 @@
 from annotypes import Any
 
 from malcolm.modules.builtin.controllers import ProxyController, AMri, AComms, \
-    APublish
+    APublish, ALazy
 
 
 # This is done in python rather than YAML so that we can re-use Annos
-def proxy_block(mri, comms, publish=False):
-    # type: (AMri, AComms, APublish) -> Any
-    controller = ProxyController(mri, comms, publish)
+def proxy_block(mri, comms, publish=False, lazy=False):
+    # type: (AMri, AComms, APublish, ALazy) -> Any
+    controller = ProxyController(mri, comms, publish, lazy)
     return [controller]
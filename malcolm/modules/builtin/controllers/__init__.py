@@ -3,7 +3,7 @@ from .statefulcontroller import StatefulController
 from .managercontroller import ManagerController, AConfigDir, AInitialDesign, \
     AUseGit
 from .clientcomms import ClientComms
-from .proxycontroller import ProxyController, AComms, APublish
+from .proxycontroller import ProxyController, AComms, APublish, ALazy
 from .servercomms import ServerComms
 
 # Expose a nice namespace
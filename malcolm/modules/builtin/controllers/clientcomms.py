@@ -15,6 +15,17 @@ class ClientComms(StatefulController):
         """
         raise NotImplementedError(self)
 
+    def sync_proxies(self, blocks):
+        """Sync a number of proxy Blocks with their remote counterparts. By
+        default this does a sync_proxy() for each one, subclasses should
+        override it if their protocol can do them all at once
+
+        Args:
+            blocks (dict): {mri: BlockModel} for each local proxy Block
+        """
+        for mri, block in blocks.items():
+            self.sync_proxy(mri, block)
+
     def send_put(self, mri, attribute_name, value):
         """Abstract method to dispatch a Put to the server
 
@@ -25,6 +36,18 @@ class ClientComms(StatefulController):
         """
         raise NotImplementedError(self)
 
+    def send_put_many(self, mri, values):
+        """Dispatch a Put to a number of Attributes to the server. By default
+        this does a send_put() for each one, subclasses should override it if
+        their protocol can do it in one go
+
+        Args:
+            mri (str): The mri of the Block
+            values (dict): {attribute_name: value} for each value to put
+        """
+        for attribute_name, value in values.items():
+            self.send_put(mri, attribute_name, value)
+
     def send_post(self, mri, method_name, **params):
         """Abstract method to dispatch a Post to the server
 
@@ -11,8 +11,8 @@ from malcolm.compat import OrderedDict
 from malcolm.core import json_encode, json_decode, Unsubscribe, Subscribe, \
     deserialize_object, Delta, Context, AttributeModel, Alarm, AlarmSeverity, \
     AlarmStatus, Part, BooleanMeta, get_config_tag, Widget, ChoiceArrayMeta, \
-    TableMeta, serialize_object, ChoiceMeta, config_tag, Put, Request, CAMEL_RE, \
-    camel_to_title, StringMeta
+    TableMeta, serialize_object, ChoiceMeta, config_tag, Put, PutMany, \
+    Request, CAMEL_RE, camel_to_title, StringMeta
 from malcolm.core.tags import without_group_tags, Port
 from malcolm.modules.builtin.infos import PortInfo
 from malcolm.modules.builtin.util import ManagerStates
@@ -305,6 +305,10 @@ class ManagerController(StatefulController):
             # so mark the field as "we_modified" so it doesn't screw up the
             # modified led
             self.context_modified.setdefault(part, set()).add(request.path[-2])
+        elif isinstance(request, PutMany):
+            # Same, but for all the fields it is putting to
+            self.context_modified.setdefault(part, set()).update(
+                request.values)
 
     def add_initial_part_fields(self):
         # Only add our own fields to start with, the rest will be added on load
@@ -1,28 +1,45 @@
 import functools
+import weakref
 
-from annotypes import Anno
+from annotypes import Anno, TYPE_CHECKING
 
+from malcolm.compat import OrderedDict
 from malcolm.core import Alarm, ProcessStartHook, UnpublishedInfo, \
-    UUnpublishedInfos, Context
+    UUnpublishedInfos, Context, RLock, Block, Queue, sleep
 from .basiccontroller import BasicController, AMri
 from .clientcomms import ClientComms
 from ..util import wait_for_stateful_block_init
 
+if TYPE_CHECKING:
+    from typing import List, Tuple
+    from malcolm.core import BlockModel
+
 with Anno("Malcolm resource id of client comms"):
     AComms = str
 with Anno("Whether to re-publish this block via server comms"):
     APublish = bool
+with Anno("Whether to sync with the remote block in the background rather "
+          "than waiting for it at startup"):
+    ALazy = bool
 
 
 class ProxyController(BasicController):
     """Sync a local block with a given remote block"""
 
-    def __init__(self, mri, comms, publish=False):
-        # type: (AMri, AComms, APublish) -> None
+    # {ClientComms: [(mri, BlockModel, Queue)]} of syncs waiting to be sent
+    _pending_syncs = weakref.WeakKeyDictionary()
+
+    def __init__(self, mri, comms, publish=False, lazy=False):
+        # type: (AMri, AComms, APublish, ALazy) -> None
         super(ProxyController, self).__init__(mri)
         self.comms = comms
         self.publish = publish
+        self.lazy = lazy
         self.client_comms = None
+        # Whether the block has been synced with its remote counterpart
+        self._synced = False
+        # Held while syncing so only one cothread does it at a time
+        self._sync_lock = RLock()
         self.health.set_value(
             "Uninitialized", alarm=Alarm.invalid("Uninitialized"))
         # Hooks
@@ -32,14 +49,72 @@ class ProxyController(BasicController):
         # type: () -> UUnpublishedInfos
         self.client_comms = self.process.get_controller(
             self.comms)  # type: ClientComms
-        # Wait until connected
-        context = Context(self.process)
-        wait_for_stateful_block_init(context, self.comms)
-        # Tell the client comms to sync our block for us
-        self.client_comms.sync_proxy(self.mri, self._block)
+        if self.lazy:
+            # Don't hold up the process starting, the first block_view() will
+            # wait for it to finish
+            self.health.set_value(
+                "Connecting", alarm=Alarm.invalid("Connecting"))
+            self.process.spawn(self._background_sync)
+        else:
+            self._sync(batched=True)
         if not self.publish:
             return UnpublishedInfo(self.mri)
 
+    def _sync(self, batched=False):
+        with self._sync_lock:
+            if not self._synced:
+                # Wait until connected
+                context = Context(self.process)
+                wait_for_stateful_block_init(context, self.comms)
+                # Tell the client comms to sync our block for us
+                if batched:
+                    self._batched_sync_proxy()
+                else:
+                    self.client_comms.sync_proxy(self.mri, self._block)
+                self._synced = True
+
+    def _batched_sync_proxy(self):
+        """Sync our block in the same sync_proxies() as any other
+        ProxyControllers of our client comms that are starting at the same
+        time, so they can share a round trip to the server"""
+        queue = Queue()
+        pending = self._pending_syncs.setdefault(
+            self.client_comms, [])  # type: List[Tuple[str, BlockModel, Queue]]
+        pending.append((self.mri, self._block, queue))
+        if len(pending) == 1:
+            # We are first, so let any other hooks that have been spawned
+            # add their blocks, then sync the lot
+            sleep(0)
+            del self._pending_syncs[self.client_comms]
+            blocks = OrderedDict((mri, block) for mri, block, _ in pending)
+            try:
+                self.client_comms.sync_proxies(blocks)
+            except Exception as e:  # pylint:disable=broad-except
+                # Make sure none of the others is left waiting
+                for _, _, q in pending:
+                    q.put(e)
+            else:
+                for _, _, q in pending:
+                    q.put(None)
+        result = queue.get()
+        if isinstance(result, Exception):
+            raise result
+
+    def _background_sync(self):
+        try:
+            self._sync(batched=True)
+        except Exception as e:
+            self.log.warning("Unable to sync %s: %s", self.mri, e)
+            message = "Not connected: %s" % (e,)
+            self.health.set_value(message, alarm=Alarm.disconnected(message))
+
+    def block_view(self, context=None):
+        # type: (Context) -> Block
+        if self.lazy and not self._synced:
+            # Wait for the background sync, or try again if it failed
+            self._sync()
+        return super(ProxyController, self).block_view(context)
+
     def get_post_function(self, method_name):
         return functools.partial(
             self.client_comms.send_post, self.mri, method_name)
@@ -48,6 +123,9 @@ class ProxyController(BasicController):
         return functools.partial(
             self.client_comms.send_put, self.mri, attribute_name)
 
+    def get_put_many_function(self):
+        return functools.partial(self.client_comms.send_put_many, self.mri)
+
     def check_field_writeable(self, field):
         # Let the server do this
         pass
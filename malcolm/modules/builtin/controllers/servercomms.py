@@ -5,6 +5,11 @@ from ..infos import RequestInfo
 
 class ServerComms(StatefulController):
     """Abstract class for dealing with requests from outside"""
+
+    # Whether to handle requests that only need the target controller's lock
+    # in the cothread that received them if that lock is free
+    inline_requests = True
+
     def __init__(self, mri, description=""):
         # type: (AMri, ADescription) -> None
         super(ServerComms, self).__init__(mri, description)
@@ -15,4 +20,4 @@ class ServerComms(StatefulController):
         # type: (Part, RequestInfo) -> None
         controller = self.process.get_controller(info.mri)
         # Don't wait for the server to actually handle the request, just return
-        controller.handle_request(info.request)
+        controller.handle_request(info.request, self.inline_requests)
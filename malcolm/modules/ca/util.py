@@ -1,15 +1,19 @@
 import time
+import weakref
 
 from annotypes import Anno, TYPE_CHECKING
 
 from malcolm.core import sleep, VMeta, Alarm, AlarmStatus, TimeStamp, \
-    Loggable, APartName, AMetaDescription, Hook, PartRegistrar, DEFAULT_TIMEOUT
+    Loggable, APartName, AMetaDescription, Hook, PartRegistrar, \
+    DEFAULT_TIMEOUT, Queue, Spawned, Timer
 from malcolm.modules.builtin.util import set_tags, AWidget, AGroup, AConfig, \
     ASinkPort
 from malcolm.modules.builtin.hooks import InitHook, ResetHook, DisableHook
 
 if TYPE_CHECKING:
-    from typing import Callable, Any, Union, Type, Sequence, Optional, List
+    from typing import Callable, Any, Union, Type, Sequence, Optional, List, \
+        Tuple, Dict
+    from malcolm.core.part import FieldRegistry
 
     Hooks = Union[Type[Hook], Sequence[Type[Hook]]]
     ArgsGen = Callable[(), List[str]]
@@ -78,31 +82,49 @@ class CAAttribute(Loggable):
         self.attr = meta.create_attribute_model()
         # Camonitor subscription
         self.monitor = None
+        # Connects us along with the other attributes of our Controller,
+        # replaced with the shared one in setup()
+        self.connector = CAConnector()
+        # The earliest time the next monitor update can be applied
         self._update_after = 0
+        # The latest monitor update that arrived too soon, and the Timer that
+        # will apply it
+        self._pending = None
+        self._flush_timer = None  # type: Timer
+        # How many monitor updates were replaced by a later one
+        self.conflated = 0
 
     def reconnect(self):
         # release old monitor
         self.disconnect()
-        # make the connection in cothread's thread, use caget for initial value
+        # make the connection in cothread's thread, along with any other
+        # attributes that are reconnecting at the same time
+        self.connector.connect(self)
+
+    def connect_pvs(self):
+        # type: () -> List[str]
+        """The pvs that need to be connected to, rbv first"""
         pvs = [self.rbv]
         if self.pv and self.pv != self.rbv:
             pvs.append(self.pv)
-        ca_values = assert_connected(catools.caget(
-            pvs, format=catools.FORMAT_CTRL, datatype=self.datatype))
+        return pvs
 
+    def connected(self, ca_values):
+        # type: (List[Any]) -> None
+        """Called with the initial caget of connect_pvs()"""
+        assert_connected(ca_values)
         if self.on_connect:
             self.on_connect(ca_values[0])
         self._update_value(ca_values[0])
-        # now setup monitor on rbv
-        self.monitor = catools.camonitor(
-            self.rbv, self._monitor_callback,
-            format=catools.FORMAT_TIME, datatype=self.datatype,
-            notify_disconnect=True)
 
     def disconnect(self):
         if self.monitor is not None:
             self.monitor.close()
             self.monitor = None
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        self._pending = None
 
     def caput(self, value):
         if self.timeout < 0:
@@ -119,19 +141,24 @@ class CAAttribute(Loggable):
 
     def _monitor_callback(self, value):
         now = time.time()
-        delta = now - self._update_after
-        self._update_value(value)
-        # See how long to sleep for to make sure we don't get more than one
-        # update at < min_delta interval
-        if delta > self.min_delta:
-            # If we were more than min_delta late then reset next update time
-            self._update_after = now + self.min_delta
-        elif delta < 0:
-            # If delta is less than zero sleep for a bit
-            sleep(-delta)
+        if self._flush_timer is not None:
+            # Already waiting to apply an update, so just replace it
+            self.conflated += 1
+            self._pending = value
+        elif now < self._update_after:
+            # Too soon after the last update, so apply it when min_delta is up
+            # rather than blocking the callbacks of the other monitors
+            self._pending = value
+            self._flush_timer = Timer(self._update_after - now, self._flush)
         else:
-            # If we were within the delta window just increment next update
-            self._update_after += self.min_delta
+            self._update_after = now + self.min_delta
+            self._update_value(value)
+
+    def _flush(self):
+        value, self._pending = self._pending, None
+        self._flush_timer = None
+        self._update_after = time.time() + self.min_delta
+        self._update_value(value)
 
     def _update_value(self, value):
         if not value.ok:
@@ -157,12 +184,107 @@ class CAAttribute(Loggable):
         else:
             writeable_func = None
         registrar.add_attribute_model(name, self.attr, writeable_func)
+        self.connector = CAConnector.for_registry(registrar.field_registry)
         register_hooked(DisableHook, self.disconnect)
         register_hooked((InitHook, ResetHook), self.reconnect)
 
 
+class CAConnector(object):
+    """Connects the CAAttributes of a Controller that reconnect at the same
+    time, like all its parts at Init or Reset, with a single caget and
+    camonitor of all their pvs for each datatype rather than one round trip
+    each. There is one per Controller, so a pv that fails to connect in one
+    Controller doesn't hold up another"""
+
+    # {FieldRegistry: CAConnector}
+    _connectors = weakref.WeakKeyDictionary()
+
+    def __init__(self):
+        self._pending = []  # type: List[Tuple[CAAttribute, Queue]]
+
+    @classmethod
+    def for_registry(cls, field_registry):
+        # type: (FieldRegistry) -> CAConnector
+        """Get the CAConnector shared by all the parts of a Controller"""
+        try:
+            connector = cls._connectors[field_registry]
+        except KeyError:
+            connector = cls._connectors[field_registry] = cls()
+        return connector
+
+    def connect(self, attribute):
+        # type: (CAAttribute) -> None
+        """Do the initial caget of the attribute's pvs, and setup a
+        camonitor on its rbv"""
+        queue = Queue()
+        self._pending.append((attribute, queue))
+        if len(self._pending) == 1:
+            # We are first, so let any other hooks that have been spawned
+            # add their attributes, then connect the lot
+            sleep(0)
+            pending, self._pending = self._pending, []
+            self._connect_all(pending)
+        result = queue.get()
+        if isinstance(result, Exception):
+            raise result
+
+    def _connect_all(self, pending):
+        # type: (List[Tuple[CAAttribute, Queue]]) -> None
+        groups = {}  # type: Dict[Any, List[Tuple[CAAttribute, Queue]]]
+        for attribute, queue in pending:
+            groups.setdefault(attribute.datatype, []).append((attribute, queue))
+        # Each datatype needs its own caget, so do them all at once
+        spawned = [Spawned(self._connect_group, (datatype, group), {})
+                   for datatype, group in groups.items()]
+        for s, (_, group) in zip(spawned, groups.items()):
+            try:
+                s.get()
+            except Exception as e:  # pylint:disable=broad-except
+                # Make sure none of the callers is left waiting
+                for _, queue in group:
+                    queue.put(e)
+
+    @staticmethod
+    def _connect_group(datatype, group):
+        # type: (Any, List[Tuple[CAAttribute, Queue]]) -> None
+        pvs = []
+        for attribute, _ in group:
+            pvs += attribute.connect_pvs()
+        ca_values = catools.caget(
+            pvs, format=catools.FORMAT_CTRL, datatype=datatype, throw=False)
+        connected = []
+        i = 0
+        for attribute, queue in group:
+            n = len(attribute.connect_pvs())
+            try:
+                attribute.connected(ca_values[i:i + n])
+            except Exception as e:  # pylint:disable=broad-except
+                queue.put(e)
+            else:
+                connected.append((attribute, queue))
+            i += n
+        if not connected:
+            return
+
+        # now setup monitors on all the rbvs
+        def callback(value, index):
+            connected[index][0]._monitor_callback(value)
+
+        monitors = catools.camonitor(
+            [attribute.rbv for attribute, _ in connected], callback,
+            format=catools.FORMAT_TIME, datatype=datatype,
+            notify_disconnect=True)
+        for i, (attribute, queue) in enumerate(connected):
+            attribute.monitor = monitors[i]
+            queue.put(None)
+
+
 def assert_connected(ca_values):
+    from cothread.catools import ca_nothing
     # check connection is ok
     for i, v in enumerate(ca_values):
+        if isinstance(v, ca_nothing):
+            # caget(throw=False) gives us the error rather than raising it
+            raise v
         assert v.ok, "CA connect failed with %s" % v.state_strings[v.state]
     return ca_values
@@ -1,3 +1,5 @@
+import numpy as np
+
 from malcolm.compat import OrderedDict
 from malcolm.core import snake_to_camel, camel_to_title, Widget, \
     BooleanArrayMeta, NumberArrayMeta, ChoiceArrayMeta
@@ -5,6 +7,9 @@ from .pandablocksfieldpart import PandABlocksFieldPart, AClient, AMeta, \
     ABlockName, AFieldName
 from ..pandablocksclient import TableFieldData
 
+# The low 32-bits of a uint64
+_WORD_MASK = np.uint64(2 ** 32 - 1)
+
 
 class PandABlocksTablePart(PandABlocksFieldPart):
     """This will normally be instantiated by the PandABox assembly, not created
@@ -64,44 +69,68 @@ class PandABlocksTablePart(PandABlocksFieldPart):
         return nconsume
 
     def list_from_table(self, table):
-        int_values = []
         nconsume = self._calc_nconsume()
-        for row in table.rows():
-            int_value = 0
-            for name, value in zip(table.call_types, row):
-                field_data = self.field_data[name]
-                max_value = 2 ** (field_data.bits_hi - field_data.bits_lo + 1)
-                if field_data.labels:
-                    field_value = field_data.labels.index(value)
-                else:
-                    field_value = int(value)
-                assert field_value < max_value, \
-                    "Expected %s[%d] < %s, got %s" % (
-                        name, row, max_value, field_value)
-                int_value |= field_value << field_data.bits_lo
-            # Split the big int into 32-bit numbers
-            for i in range(nconsume):
-                int_values.append(int_value & (2 ** 32 - 1))
-                int_value = int_value >> 32
+        nrows = len(getattr(table, list(self.field_data)[0]))
+        # One row per table row, with 32-bits of data in each uint64 word
+        words = np.zeros((nrows, nconsume), dtype=np.uint64)
+        for name, field_data in self.field_data.items():
+            column = getattr(table, name)
+            nbits = field_data.bits_hi - field_data.bits_lo + 1
+            if field_data.labels:
+                lookup = {label: i for i, label in enumerate(field_data.labels)}
+                try:
+                    values = [lookup[value] for value in column]
+                except KeyError:
+                    # Probably Enum values, so use slower equality check
+                    values = [field_data.labels.index(v) for v in column]
+                values = np.array(values, dtype=np.uint64)
+            else:
+                values = np.asarray(getattr(column, "seq", column))
+                assert not (values < 0).any(), \
+                    "Expected %s >= 0, got %s" % (name, values.min())
+                values = values.astype(np.uint64)
+            max_value = 2 ** nbits
+            too_big = np.nonzero(values >= max_value)[0]
+            assert len(too_big) == 0, \
+                "Expected %s[%d] < %s, got %s" % (
+                    name, too_big[0], max_value, values[too_big[0]])
+            word, shift = divmod(field_data.bits_lo, 32)
+            words[:, word] |= (values << np.uint64(shift)) & _WORD_MASK
+            if shift + nbits > 32:
+                # Overflows into the next word
+                words[:, word + 1] |= \
+                    (values >> np.uint64(32 - shift)) & _WORD_MASK
+            if shift + nbits > 64:
+                # And the one after that
+                words[:, word + 2] |= values >> np.uint64(64 - shift)
+        # Flatten row by row into a list of 32-bit numbers
+        int_values = words.ravel().tolist()
         return int_values
 
     def table_from_list(self, int_values):
-        rows = []
         nconsume = self._calc_nconsume()
-        for i in range(int(len(int_values) / nconsume)):
-            int_value = 0
-            for c in range(nconsume):
-                int_value += int(int_values[i*nconsume+c]) << (32 * c)
-            row = []
-            for name, field_data in self.field_data.items():
-                mask = 2 ** (field_data.bits_hi + 1) - 1
-                field_value = (int_value & mask) >> field_data.bits_lo
-                if field_data.labels:
-                    # This is a choice meta, so write the string value
-                    row.append(field_data.labels[field_value])
-                else:
-                    row.append(field_value)
-            rows.append(row)
-        table = self.meta.table_cls.from_rows(rows)
+        nrows = int(len(int_values) / nconsume)
+        words = np.array(int_values[:nrows * nconsume], dtype=np.uint64)
+        words = words.reshape((nrows, nconsume))
+        columns = {}
+        for name, field_data in self.field_data.items():
+            nbits = field_data.bits_hi - field_data.bits_lo + 1
+            word, shift = divmod(field_data.bits_lo, 32)
+            values = words[:, word] >> np.uint64(shift)
+            if shift + nbits > 32:
+                values |= words[:, word + 1] << np.uint64(32 - shift)
+            if shift + nbits > 64:
+                values |= words[:, word + 2] << np.uint64(64 - shift)
+            if nbits < 64:
+                values &= np.uint64(2 ** nbits - 1)
+            column_meta = self.meta.elements[name]
+            if field_data.labels:
+                # This is a choice meta, so write the string values
+                labels = np.array(field_data.labels, dtype=object)
+                columns[name] = labels[values.astype(np.intp)].tolist()
+            elif isinstance(column_meta, NumberArrayMeta):
+                columns[name] = values.astype(column_meta.dtype)
+            else:
+                columns[name] = values.astype(bool)
+        table = self.meta.validate(columns)
         return table
-
@@ -2,20 +2,23 @@
 from __future__ import division
 
 import time
+from collections import deque
 
 import numpy as np
 from scanpointgenerator import CompoundGenerator
 from annotypes import add_call_types, TYPE_CHECKING, Anno
 
 from malcolm.core import config_tag, NumberMeta, PartRegistrar, Widget, \
-    DEFAULT_TIMEOUT
+    DEFAULT_TIMEOUT, TimeoutError
 from malcolm.modules import builtin, scanning
 from malcolm.modules.builtin.parts import ChildPart
 from ..infos import MotorInfo, ControllerInfo, CSInfo
 from malcolm.modules.pmac.infos import cs_axis_names
+from ..util import generator_points, make_velocity_profiles, \
+    velocity_profile_distances
 
 if TYPE_CHECKING:
-    from typing import Dict, List
+    from typing import Dict, List, Deque, Any
 
 # Number of seconds that a trajectory tick is
 TICK_S = 0.000001
@@ -45,16 +48,23 @@ ZERO_PROGRAM = 8  # GPIO123 = 0, 0, 0
 # How many profile points to write each time
 PROFILE_POINTS = 10000
 
+# How often to check if we need to calculate more batches while running
+BATCH_CHECK_INTERVAL = 0.1
+
 
 with Anno("Initial value for min time for any gaps between frames"):
     AMinTurnaround = float
+with Anno("Initial value for number of batches of profile points to calculate "
+          "ahead of those sent to the pmac"):
+    ALookahead = int
 
 
 class PmacTrajectoryPart(ChildPart):
     def __init__(self,
                  name,  # type: builtin.parts.APartName
                  mri,  # type: builtin.parts.AMri
-                 initial_min_turnaround=0.0  # type: AMinTurnaround
+                 initial_min_turnaround=0.0,  # type: AMinTurnaround
+                 initial_lookahead=1,  # type: ALookahead
                  ):
         # type: (...) -> None
         super(PmacTrajectoryPart, self).__init__(
@@ -65,10 +75,16 @@ class PmacTrajectoryPart(ChildPart):
         self.completed_steps_lookup = []  # type: List[int]
         # If we are currently loading then block loading more points
         self.loading = False
+        # How many profile points have been sent to the pmac
+        self.points_written = 0
+        # Attribute values of batches of points calculated ahead of time
+        self.batches = deque()  # type: Deque[Dict[str, Any]]
         # Where we have generated into profile
         self.end_index = 0
         # Where we should stop loading points
         self.steps_up_to = 0
+        # Whether the final tail off point still needs adding to the profile
+        self.tail_off_pending = False
         # Profile points that haven't been sent yet
         # {time_array/velocity_mode/trajectory/user_programs: [elements]}
         self.profile = {}
@@ -79,6 +95,15 @@ class PmacTrajectoryPart(ChildPart):
             "float64", "Min time for any gaps between frames",
             tags=[Widget.TEXTINPUT.tag(), config_tag()]
         ).create_attribute_model(initial_min_turnaround)
+        self.lookahead = NumberMeta(
+            "int32", "Number of batches of profile points to calculate ahead "
+            "of those sent to the pmac",
+            tags=[Widget.TEXTINPUT.tag(), config_tag()]
+        ).create_attribute_model(initial_lookahead)
+        self.buffer_headroom = NumberMeta(
+            "int32", "Number of profile points sent to the pmac that have not "
+            "yet been scanned", tags=[Widget.TEXTUPDATE.tag()]
+        ).create_attribute_model()
         # Hooks
         self.register_hooked(scanning.hooks.ValidateHook, self.validate)
         self.register_hooked((scanning.hooks.ConfigureHook,
@@ -94,6 +119,9 @@ class PmacTrajectoryPart(ChildPart):
         super(PmacTrajectoryPart, self).setup(registrar)
         registrar.add_attribute_model("minTurnaround", self.min_turnaround,
                                       self.min_turnaround.set_value)
+        registrar.add_attribute_model("lookahead", self.lookahead,
+                                      self.lookahead.set_value)
+        registrar.add_attribute_model("bufferHeadroom", self.buffer_headroom)
 
     @add_call_types
     def reset(self, context):
@@ -217,10 +245,13 @@ class PmacTrajectoryPart(ChildPart):
         use = [info.cs_axis for info in self.axis_mapping.values()]
         attr_dict = {"use%s" % ax: ax in use for ax in cs_axis_names}
         child.put_attribute_values(attr_dict)
-        self.profile = dict(time_array=[], velocity_mode=[], user_programs=[],
-                            trajectory={name: [] for name in self.axis_mapping})
+        self.profile = self.empty_profile()
+        self.batches.clear()
         self.calculate_generator_profile(completed_steps, do_run_up=True)
         self.profile = self.write_profile_points(child, **self.profile)
+        self.points_written = \
+            len(self.completed_steps_lookup) - len(self.profile["time_array"])
+        self.buffer_headroom.set_value(self.points_written)
         child.buildProfile()
         # Wait for the motors to have got to the start
         context.wait_all_futures(fs, timeout=deadline - time.time())
@@ -231,7 +262,22 @@ class PmacTrajectoryPart(ChildPart):
         self.loading = False
         child = context.block_view(self.mri)
         child.pointsScanned.subscribe_value(self.update_step, child)
-        child.executeProfile()
+        future = child.executeProfile_async()
+        # While the profile executes, calculate the next batches so they are
+        # ready to send when update_step needs them
+        while not future.done():
+            if len(self.batches) < self.lookahead.value and \
+                    self.more_to_calculate():
+                self.batches.append(self.calculate_batch())
+                # Service any updates that came in while we were calculating
+                context.sleep(0)
+            else:
+                try:
+                    context.wait_all_futures(
+                        future, timeout=BATCH_CHECK_INTERVAL)
+                except TimeoutError:
+                    pass
+        context.wait_all_futures(future)
         # TODO: when should we transition to postRun?
         # Now wait for up to 2*min_delta time to make sure any
         # update_completed_steps come in
@@ -252,26 +298,55 @@ class PmacTrajectoryPart(ChildPart):
             completed_steps = self.completed_steps_lookup[scanned - 1]
             self.registrar.report(scanning.infos.RunProgressInfo(
                 completed_steps))
-            # Keep PROFILE_POINTS trajectory points in front
-            if not self.loading and self.end_index < self.steps_up_to and \
-                    len(self.completed_steps_lookup) - scanned < PROFILE_POINTS:
-                self.loading = True
-                self.calculate_generator_profile(self.end_index)
-                self.profile = self.write_profile_points(child, **self.profile)
-                child.appendProfile()
+            headroom = self.points_written - scanned
+            self.buffer_headroom.set_value(headroom)
+            if self.loading:
+                return
+            self.loading = True
+            try:
+                if headroom <= 0 and self.more_batches():
+                    self.log.warning(
+                        "Pmac ran out of points at %d, with more to write",
+                        scanned)
+                # Keep PROFILE_POINTS trajectory points in front. If we got to
+                # the end, there might be some leftover points that need to be
+                # appended to finish
+                while self.more_batches() and (
+                        self.points_written - scanned < PROFILE_POINTS or
+                        self.end_index == self.steps_up_to):
+                    if self.batches:
+                        attr_dict = self.batches.popleft()
+                    else:
+                        attr_dict = self.calculate_batch()
+                    child.put_attribute_values(attr_dict)
+                    child.appendProfile()
+                    self.points_written += attr_dict["pointsToBuild"]
+                    self.buffer_headroom.set_value(
+                        self.points_written - scanned)
+            finally:
                 self.loading = False
 
-            # If we got to the end, there might be some leftover points that
-            # need to be appended to finish
-            if not self.loading and self.end_index == self.steps_up_to and \
-                    self.profile["time_array"]:
-                self.loading = True
-                self.calculate_generator_profile(self.end_index)
-                self.profile = self.write_profile_points(child, **self.profile)
-                assert not self.profile["time_array"], \
-                    "Why do we still have points? %s" % self.profile
-                child.appendProfile()
-                self.loading = False
+    def more_to_calculate(self):
+        # type: () -> bool
+        """Whether there are more profile points to calculate and batch up"""
+        return self.end_index < self.steps_up_to or \
+            self.tail_off_pending or \
+            len(self.profile.get("time_array", ())) > 0
+
+    def more_batches(self):
+        # type: () -> bool
+        """Whether there are more batches to send to the pmac"""
+        return len(self.batches) > 0 or self.more_to_calculate()
+
+    def calculate_batch(self):
+        # type: () -> Dict[str, Any]
+        """Calculate the next PROFILE_POINTS of the profile, returning the
+        attribute values that should be written to the child"""
+        if self.tail_off_pending:
+            self.calculate_generator_profile(self.end_index)
+        attr_dict, self.profile = self.profile_attribute_values(
+            **self.profile)
+        return attr_dict
 
     def point_velocities(self, point):
         """Find the velocities of each axis over the current point"""
@@ -287,28 +362,58 @@ class PmacTrajectoryPart(ChildPart):
 
     def make_consistent_velocity_profiles(self, v1s, v2s, distances,
                                           min_time=MIN_TIME):
-        """Make consistent time and velocity arrays for each axis"""
-        time_arrays = {}
-        velocity_arrays = {}
+        """Make consistent time and velocity arrays for each axis for a batch
+        of moves, so that all axes take the same time for each move
+
+        Args:
+            v1s (dict): {axis_name: array of starting velocities}
+            v2s (dict): {axis_name: array of ending velocities}
+            distances (dict): {axis_name: array of relative distances}
+            min_time (float): The minimum time any move should take
+
+        Returns:
+            tuple: (time_arrays, velocity_arrays) where each is a dict of
+                {axis_name: array of shape (nmoves, 5)}
+        """
+        axes = list(self.axis_mapping)
+        motor_infos = [self.axis_mapping[axis_name] for axis_name in axes]
+        v1 = np.stack([v1s[axis_name] for axis_name in axes], axis=-1)
+        v2 = np.stack([v2s[axis_name] for axis_name in axes], axis=-1)
+        distance = np.stack(
+            [distances[axis_name] for axis_name in axes], axis=-1)
+        min_times = np.full(len(v1), min_time, np.float64)
+        time_array = np.empty(v1.shape + (5,))
+        velocity_array = np.empty(v1.shape + (5,))
+        # The moves that are not yet consistent
+        todo = np.arange(len(v1))
         iterations = 5
         while iterations > 0:
-            for axis_name, motor_info in self.axis_mapping.items():
-                time_arrays[axis_name], velocity_arrays[axis_name] = \
-                    motor_info.make_velocity_profile(
-                        v1s[axis_name], v2s[axis_name], distances[axis_name],
-                        min_time)
-                assert time_arrays[axis_name][-1] >= min_time or np.isclose(
-                    time_arrays[axis_name][-1], min_time), \
-                    "Time %s velocity %s for %s takes less time than %s" % (
-                        time_arrays[axis_name], velocity_arrays[axis_name],
-                        axis_name, min_time)
-            new_min_time = max(t[-1] for t in time_arrays.values())
-            if np.isclose(new_min_time, min_time):
+            times, velocities = make_velocity_profiles(
+                motor_infos, v1[todo], v2[todo], distance[todo],
+                min_times[todo, None])
+            move_times = times[..., -1]
+            short = (move_times < min_times[todo, None]) & ~np.isclose(
+                move_times, min_times[todo, None])
+            assert not short.any(), \
+                "Time %s velocity %s for %s takes less time than %s" % (
+                    times[short][0], velocities[short][0],
+                    axes[np.nonzero(short)[1][0]],
+                    min_times[todo][np.nonzero(short)[0][0]])
+            time_array[todo] = times
+            velocity_array[todo] = velocities
+            new_min_times = move_times.max(axis=-1)
+            consistent = np.isclose(new_min_times, min_times[todo])
+            min_times[todo] = new_min_times
+            todo = todo[~consistent]
+            if len(todo) == 0:
                 # We've got our consistent set
+                time_arrays = {}
+                velocity_arrays = {}
+                for i, axis_name in enumerate(axes):
+                    time_arrays[axis_name] = time_array[:, i]
+                    velocity_arrays[axis_name] = velocity_array[:, i]
                 return time_arrays, velocity_arrays
-            else:
-                min_time = new_min_time
-                iterations -= 1
+            iterations -= 1
         raise ValueError("Can't get a consistent time in 5 iterations")
 
     def write_profile_points(self, child, time_array, velocity_mode,
@@ -321,6 +426,23 @@ class PmacTrajectoryPart(ChildPart):
             velocity_mode (list): List of velocity modes like PREV_TO_NEXT
             trajectory (dict): {axis_name: [positions in EGUs]}
             user_programs (list): List of user programs like TRIG_LIVE_FRAME
+
+        Returns:
+            dict: The profile points that didn't fit in PROFILE_POINTS
+        """
+        attr_dict, profile = self.profile_attribute_values(
+            time_array, velocity_mode, user_programs, trajectory)
+        child.put_attribute_values(attr_dict)
+        return profile
+
+    def profile_attribute_values(self, time_array, velocity_mode,
+                                 user_programs, trajectory):
+        """Make the attribute values to write for the first PROFILE_POINTS
+        of the given data, taking the same arguments as write_profile_points
+
+        Returns:
+            tuple: (attr_dict, profile) where profile is the points that
+                didn't fit in PROFILE_POINTS
         """
         # Overflow profiles go here
         profile = dict(
@@ -329,22 +451,17 @@ class PmacTrajectoryPart(ChildPart):
             user_programs=user_programs[PROFILE_POINTS:],
             trajectory={k: v[PROFILE_POINTS:] for k, v in trajectory.items()})
 
-        # Process the time in ticks
-        overflow = 0.0
-        time_array_ticks = []
-        for t in time_array[:PROFILE_POINTS]:
-            ticks = t / TICK_S
-            overflow += (ticks % 1)
-            ticks = int(ticks)
-            if overflow > 0.5:
-                overflow -= 1
-                ticks += 1
-            time_array_ticks.append(ticks)
+        # Process the time in ticks, carrying the rounding error forward so
+        # that the running total is always within half a tick of the real
+        # total. This is round half down of the cumulative sum.
+        times = np.asarray(time_array[:PROFILE_POINTS], np.float64)
+        cumulative_ticks = np.ceil(np.cumsum(times / TICK_S) - 0.5)
+        time_array_ticks = np.diff(np.concatenate(([0], cumulative_ticks)))
 
         # Set the trajectories
         # Cast to np arrays as it saves on the serialization
         attr_dict = dict(
-            timeArray=np.array(time_array_ticks, np.int32),
+            timeArray=time_array_ticks.astype(np.int32),
             velocityMode=np.array(velocity_mode[:PROFILE_POINTS], np.int32),
             userPrograms=np.array(user_programs[:PROFILE_POINTS], np.int32),
             pointsToBuild=len(time_array_ticks)
@@ -354,85 +471,106 @@ class PmacTrajectoryPart(ChildPart):
             cs_axis = motor_info.cs_axis
             attr_dict["positions%s" % cs_axis] = np.array(
                 axis_points[:PROFILE_POINTS], np.float64)
-        child.put_attribute_values(attr_dict)
-        return profile
+        return attr_dict, profile
+
+    def empty_profile(self):
+        """Make a profile with no points in it"""
+        return dict(
+            time_array=np.zeros(0, np.float64),
+            velocity_mode=np.zeros(0, np.int32),
+            user_programs=np.zeros(0, np.int32),
+            trajectory={name: np.zeros(0, np.float64)
+                        for name in self.axis_mapping})
+
+    def extend_profile(self, time_array, velocity_mode, user_programs,
+                       completed_steps, trajectory):
+        """Add arrays of points to the end of the profile"""
+        self.profile["time_array"] = np.concatenate(
+            (self.profile["time_array"], time_array))
+        self.profile["velocity_mode"] = np.concatenate(
+            (self.profile["velocity_mode"], velocity_mode))
+        self.profile["user_programs"] = np.concatenate(
+            (self.profile["user_programs"], user_programs))
+        for k, v in trajectory.items():
+            self.profile["trajectory"][k] = np.concatenate(
+                (self.profile["trajectory"][k], v))
+        self.completed_steps_lookup += np.asarray(completed_steps).tolist()
 
     def calculate_profile_from_velocities(self, time_arrays, velocity_arrays,
-                                          current_positions, completed_steps):
+                                          current_positions):
+        """Interpolate a batch of velocity profiles into profile points
+
+        Args:
+            time_arrays (dict): {axis_name: array of shape (nmoves, npoints)}
+            velocity_arrays (dict): {axis_name: array of (nmoves, npoints)}
+            current_positions (dict): {axis_name: array of start positions}
+
+        Returns:
+            tuple: (counts, time_array, velocity_mode, user_programs,
+                trajectory) of numpy arrays, with trajectory a dict of
+                {axis_name: positions}. The profile points of all the moves
+                are concatenated, counts says how many are in each move
+        """
         trajectory = {}
 
         # Interpolate the velocity arrays at about INTERPOLATE_INTERVAL
-        move_time = max(t[-1] for t in time_arrays.values())
+        move_times = np.max(
+            [t[:, -1] for t in time_arrays.values()], axis=0)
         # Make sure there are at least 2 of them
-        num_intervals = max(int(np.floor(move_time / INTERPOLATE_INTERVAL)), 2)
-        interval = move_time / num_intervals
-        self.profile["time_array"] += [interval] * num_intervals
-        self.profile["velocity_mode"] += \
-            [PREV_TO_NEXT] * (num_intervals - 1) + [CURRENT_TO_NEXT]
-        self.profile["user_programs"] += [ZERO_PROGRAM] * num_intervals
-        self.completed_steps_lookup += [completed_steps] * num_intervals
+        counts = np.maximum(
+            np.floor(move_times / INTERPOLATE_INTERVAL).astype(np.int64), 2)
+        intervals = move_times / counts
+        # Which move each profile point is in, and how far through it is
+        moves = np.repeat(np.arange(len(counts)), counts)
+        ends = np.cumsum(counts)
+        indexes = np.arange(len(moves)) - np.repeat(ends - counts, counts)
+        time_array = intervals[moves]
+        times = time_array * (indexes + 1)
+        velocity_mode = np.full(len(moves), PREV_TO_NEXT, np.int32)
+        velocity_mode[ends - 1] = CURRENT_TO_NEXT
+        user_programs = np.full(len(moves), ZERO_PROGRAM, np.int32)
 
         # Do this for each velocity array
-        for axis_name, motor_info in self.axis_mapping.items():
-            trajectory[axis_name] = []
-            ts = time_arrays[axis_name]
-            vs = velocity_arrays[axis_name]
-            position = current_positions[axis_name]
-            for i in range(num_intervals):
-                time = interval * (i + 1)
-                # If we have exceeded the current segment, pop it and add it's
-                # position in
-                if time > ts[1] and not np.isclose(time, ts[1]):
-                    position += motor_info.ramp_distance(
-                        vs[0], vs[1], ts[1] - ts[0])
-                    vs = vs[1:]
-                    ts = ts[1:]
-                assert len(ts) > 1, \
-                    "Bad %s time %s velocity %s" % (time, ts, vs)
-                fraction = (time - ts[0]) / (ts[1] - ts[0])
-                velocity = fraction * (vs[1] - vs[0]) + vs[0]
-                part_position = motor_info.ramp_distance(
-                    vs[0], velocity, time - ts[0])
-                self.profile["trajectory"][axis_name].append(
-                    position + part_position)
+        for axis_name in self.axis_mapping:
+            distances = velocity_profile_distances(
+                time_arrays[axis_name][moves],
+                velocity_arrays[axis_name][moves], times)
+            trajectory[axis_name] = \
+                np.asarray(current_positions[axis_name])[moves] + distances
+        return counts, time_array, velocity_mode, user_programs, trajectory
 
     def add_profile_point(self, time_point, velocity_point, user_point,
                           completed_step, axis_points):
-
         # Add padding if the move time exceeds the max pmac move time
-        if time_point > MAX_MOVE_TIME:
-            assert self.profile["time_array"], \
+        nsplit = split_count(time_point)
+        time_array = np.full(nsplit, time_point / nsplit)
+        velocity_mode = np.full(nsplit, PREV_TO_NEXT, np.int32)
+        user_programs = np.full(nsplit, NO_PROGRAM, np.int32)
+        completed_steps = np.full(nsplit, completed_step, np.int64)
+        trajectory = {}
+        if nsplit > 1:
+            assert len(self.profile["time_array"]), \
                 "Can't stretch the first point of a profile"
-            nsplit = int(time_point / MAX_MOVE_TIME + 1)
-            for _ in range(nsplit):
-                self.profile["time_array"].append(time_point / nsplit)
-            for _ in range(nsplit - 1):
-                self.profile["velocity_mode"].append(PREV_TO_NEXT)
-                self.profile["user_programs"].append(NO_PROGRAM)
+            completed_steps[:-1] = self.completed_steps_lookup[-1]
             for k, v in axis_points.items():
                 last_point = self.profile["trajectory"][k][-1]
-                per_section = float(v - last_point) / nsplit
-                for i in range(1, nsplit):
-                    self.profile["trajectory"][k].append(
-                        last_point + i * per_section)
-            last_completed_step = self.completed_steps_lookup[-1]
-            for _ in range(nsplit - 1):
-                self.completed_steps_lookup.append(last_completed_step)
+                trajectory[k] = np.append(
+                    split_positions(last_point, v, nsplit), v)
         else:
-            # Add point
-            self.profile["time_array"].append(time_point)
+            for k, v in axis_points.items():
+                trajectory[k] = np.array([v], np.float64)
 
         # Set the requested point
-        self.profile["velocity_mode"].append(velocity_point)
-        self.profile["user_programs"].append(user_point)
-        self.completed_steps_lookup.append(completed_step)
-        for k, v in axis_points.items():
-            self.profile["trajectory"][k].append(v)
+        velocity_mode[-1] = velocity_point
+        user_programs[-1] = user_point
+        self.extend_profile(time_array, velocity_mode, user_programs,
+                            completed_steps, trajectory)
 
     def calculate_generator_profile(self, start_index, do_run_up=False):
         # If we are doing the first build, do_run_up will be passed to flag
         # that we need a run up, else just continue from the previous point
         if do_run_up:
+            self.tail_off_pending = True
             point = self.generator.get_point(start_index)
 
             # Calculate how long to leave for the run-up (at least MIN_TIME)
@@ -449,45 +587,12 @@ class PmacTrajectoryPart(ChildPart):
                 run_up_time, CURRENT_TO_NEXT, LIVE_PROGRAM, start_index,
                 axis_points)
 
-        for i in range(start_index, self.steps_up_to):
-            point = self.generator.get_point(i)
-
-            # Add position
-            self.add_profile_point(
-                point.duration / 2.0, PREV_TO_NEXT, MID_PROGRAM, i,
-                {name: point.positions[name] for name in self.axis_mapping})
-
-            # If there will be more frames, insert next live frame
-            if i + 1 < self.steps_up_to:
-                # Check if we need to insert the lower bound of next_point
-                next_point = self.generator.get_point(i + 1)
-                points_joined = self.points_joined(point, next_point)
-
-                if points_joined:
-                    user_program = LIVE_PROGRAM
-                    velocity_point = PREV_TO_NEXT
-                else:
-                    user_program = DEAD_PROGRAM
-                    velocity_point = PREV_TO_CURRENT
-
-                self.add_profile_point(
-                    point.duration / 2.0, velocity_point, user_program, i + 1,
-                    {name: point.upper[name] for name in self.axis_mapping})
-
-                if not points_joined:
-                    self.insert_gap(point, next_point, i + 1)
-            else:
-                # No more frames, dead frame to finish
-                self.add_profile_point(
-                    point.duration / 2.0, PREV_TO_CURRENT, DEAD_PROGRAM, i + 1,
-                    {name: point.upper[name] for name in self.axis_mapping})
-
-            # Check if we have exceeded the points number and need to write
-            # Strictly less than so we always add one more point to the time
-            # array so we can always stretch points in a subsequent add with
-            # the values already in the profiles
-            if len(self.profile["time_array"]) > PROFILE_POINTS:
-                self.end_index = i + 1
+        index = start_index
+        while index < self.steps_up_to:
+            index, overflowed = self.add_generator_points(index)
+            if overflowed:
+                # We have exceeded the points number and need to write
+                self.end_index = index
                 return
 
         # Add the last tail off point
@@ -507,24 +612,176 @@ class PmacTrajectoryPart(ChildPart):
         self.add_profile_point(tail_off_time, ZERO_VELOCITY, ZERO_PROGRAM,
                                self.steps_up_to, axis_points)
         self.end_index = self.steps_up_to
-
-    def points_joined(self, point, next_point):
-        # Check for axes that need to move within the space between points
+        self.tail_off_pending = False
+
+    def add_generator_points(self, start_index):
+        """Add the mid point, upper bound and any gap of a batch of generator
+        points to the profile, stopping when it has more than PROFILE_POINTS
+        in it. Positions are taken from the generator in bulk and the profile
+        arrays for the batch are made in one go.
+
+        Returns:
+            tuple: (end_index, overflowed) where end_index is one after the
+                last generator point added, and overflowed is True if we
+                stopped because the profile was full
+        """
+        axes = list(self.axis_mapping)
+        half_duration = self.generator.duration / 2.0
+        nsplit = split_count(half_duration)
+        # Each generator point makes at least 2 * nsplit profile points, so
+        # that is the most we could need to take us over PROFILE_POINTS.
+        # Strictly more than so we always have one more point in the profile
+        # so we can always stretch points in a subsequent add with the values
+        # already in the profile
+        npoints_per_step = 2 * nsplit
+        nprofile = len(self.profile["time_array"])
+        needed = PROFILE_POINTS + 1 - nprofile
+        num = max(int(np.ceil(needed / npoints_per_step)), 1)
+        num = min(num, self.steps_up_to - start_index)
+        # Get one more point if there is one so we can tell if the last is
+        # joined to it
+        num_fetched = min(num + 1, self.steps_up_to - start_index)
+        lower, positions, upper = generator_points(
+            self.generator, start_index, start_index + num_fetched, axes)
+
+        # Find the velocities of each axis over every point
+        velocities = {}
         for axis_name, motor_info in self.axis_mapping.items():
-            if point.upper[axis_name] != next_point.lower[axis_name]:
-                return False
-        return True
-
-    def insert_gap(self, point, next_point, completed_steps):
-        # Work out the start and end velocities for each axis
-        start_velocities = self.point_velocities(point)
-        end_velocities = self.point_velocities(next_point)
-        start_positions = {}
+            velocities[axis_name] = (
+                upper[axis_name] - lower[axis_name]) / self.generator.duration
+            bad = np.nonzero(
+                np.abs(velocities[axis_name]) >= motor_info.max_velocity)[0]
+            assert len(bad) == 0, \
+                "Velocity %s invalid for %r with max_velocity %s" % (
+                    velocities[axis_name][bad[0]], axis_name,
+                    motor_info.max_velocity)
+
+        # Points are joined if all axes are in the same place at the upper
+        # bound of one and the lower bound of the next
+        joined = np.ones(num, dtype=bool)
+        joined[num_fetched - 1:] = False
+        for axis_name in axes:
+            joined[:num_fetched - 1] &= \
+                upper[axis_name][:-1] == lower[axis_name][1:]
+        # The last point of the scan has no gap after it, it just stops
+        needs_gap = ~joined
+        if start_index + num == self.steps_up_to:
+            needs_gap[-1] = False
+
+        # Work out all the gaps in one go
+        gap_points = np.nonzero(needs_gap)[0]
+        gap_counts = np.zeros(num, np.int64)
+        gap_counts[gap_points], gap_time, gap_velocity, gap_user, \
+            gap_trajectory = self.make_gaps(
+                {k: upper[k][gap_points] for k in axes},
+                {k: velocities[k][gap_points] for k in axes},
+                {k: lower[k][gap_points + 1] for k in axes},
+                {k: velocities[k][gap_points + 1] for k in axes})
+
+        # Stop at the first point that takes us over PROFILE_POINTS
+        counts = npoints_per_step + gap_counts
+        sizes = nprofile + np.cumsum(counts)
+        over = np.nonzero(sizes > PROFILE_POINTS)[0]
+        overflowed = len(over) > 0
+        if overflowed:
+            num = over[0] + 1
+            counts = counts[:num]
+            gap_points = gap_points[gap_points < num]
+
+        # Now we know how many profile points each generator point makes we
+        # can preallocate the arrays
+        offsets = np.zeros(num, np.int64)
+        offsets[1:] = np.cumsum(counts)[:-1]
+        total = int(offsets[-1] + counts[-1])
+        time_array = np.empty(total, np.float64)
+        velocity_mode = np.empty(total, np.int32)
+        user_programs = np.empty(total, np.int32)
+        completed_steps = np.empty(total, np.int64)
+        trajectory = {k: np.empty(total, np.float64) for k in axes}
+        steps = np.arange(start_index, start_index + num)
+
+        # Indexes of the mid point and upper bound sections, each of which
+        # are split into nsplit if they are longer than MAX_MOVE_TIME
+        mid = offsets[:, None] + np.arange(nsplit)
+        up = mid + nsplit
+        time_array[mid] = half_duration / nsplit
+        time_array[up] = half_duration / nsplit
+        velocity_mode[mid] = PREV_TO_NEXT
+        velocity_mode[up] = PREV_TO_NEXT
+        user_programs[mid] = NO_PROGRAM
+        user_programs[up] = NO_PROGRAM
+        # Intermediate points of a split take the completed step of the last
+        # point in the profile
+        completed_steps[mid] = steps[:, None]
+        if nsplit > 1:
+            assert nprofile, "Can't stretch the first point of a profile"
+            completed_steps[mid[0]] = self.completed_steps_lookup[-1]
+        completed_steps[up] = steps[:, None]
+        # The requested mid point
+        user_programs[mid[:, -1]] = MID_PROGRAM
+        completed_steps[mid[:, -1]] = steps
+        # The requested upper bound, either live if joined to the next point
+        # or dead if there is a gap or the scan ends
+        velocity_mode[up[:, -1]] = np.where(
+            joined[:num], PREV_TO_NEXT, PREV_TO_CURRENT)
+        user_programs[up[:, -1]] = np.where(
+            joined[:num], LIVE_PROGRAM, DEAD_PROGRAM)
+        completed_steps[up[:, -1]] = steps + 1
+
+        # Where the gap points go, they follow the upper bound of the point
+        # before them
+        ngap = int(gap_counts[gap_points].sum())
+        gap_ends = np.cumsum(gap_counts[gap_points])
+        gap_index = np.arange(ngap) + np.repeat(
+            offsets[gap_points] + npoints_per_step - gap_ends +
+            gap_counts[gap_points], gap_counts[gap_points])
+        time_array[gap_index] = gap_time[:ngap]
+        velocity_mode[gap_index] = gap_velocity[:ngap]
+        user_programs[gap_index] = gap_user[:ngap]
+        completed_steps[gap_index] = np.repeat(
+            steps[gap_points] + 1, gap_counts[gap_points])
+
+        for k in axes:
+            trajectory[k][mid[:, -1]] = positions[k][:num]
+            trajectory[k][up[:, -1]] = upper[k][:num]
+            trajectory[k][gap_index] = gap_trajectory[k][:ngap]
+            if nsplit > 1:
+                # The last position in the profile before each mid point
+                last_points = np.empty(num)
+                last_points[1:] = upper[k][:num - 1]
+                # Which is the end of the gap if there was one
+                after_gap = gap_points[gap_points < num - 1]
+                last_points[after_gap + 1] = \
+                    gap_trajectory[k][gap_ends[:len(after_gap)] - 1]
+                last_points[0] = self.profile["trajectory"][k][-1]
+                trajectory[k][mid[:, :-1]] = split_positions(
+                    last_points[:, None], positions[k][:num, None], nsplit)
+                trajectory[k][up[:, :-1]] = split_positions(
+                    positions[k][:num, None], upper[k][:num, None], nsplit)
+
+        self.extend_profile(time_array, velocity_mode, user_programs,
+                            completed_steps, trajectory)
+        return start_index + num, overflowed
+
+    def make_gaps(self, start_positions, start_velocities, end_positions,
+                  end_velocities):
+        """Make the profile points to move between a batch of pairs of
+        points that are not joined
+
+        Args:
+            start_positions (dict): {axis_name: array of positions}
+            start_velocities (dict): {axis_name: array of velocities}
+            end_positions (dict): {axis_name: array of positions}
+            end_velocities (dict): {axis_name: array of velocities}
+
+        Returns:
+            tuple: (counts, time_array, velocity_mode, user_programs,
+                trajectory) as returned by calculate_profile_from_velocities
+        """
         distances = {}
-        for axis_name, motor_info in self.axis_mapping.items():
-            start_positions[axis_name] = point.upper[axis_name]
-            distances[axis_name] = \
-                next_point.lower[axis_name] - point.upper[axis_name]
+        for axis_name in self.axis_mapping:
+            distances[axis_name] = np.asarray(end_positions[axis_name]) - \
+                np.asarray(start_positions[axis_name])
 
         # Work out the velocity profiles of how to move to the start
         time_arrays, velocity_arrays = \
@@ -533,9 +790,29 @@ class PmacTrajectoryPart(ChildPart):
                 self.min_turnaround.value)
 
         # Work out the Position trajectories from these profiles
-        self.calculate_profile_from_velocities(
-            time_arrays, velocity_arrays, start_positions, completed_steps)
-
-        # Change the last point to be a live frame
-        self.profile["velocity_mode"][-1] = CURRENT_TO_NEXT
-        self.profile["user_programs"][-1] = LIVE_PROGRAM
+        counts, time_array, velocity_mode, user_programs, trajectory = \
+            self.calculate_profile_from_velocities(
+                time_arrays, velocity_arrays, start_positions)
+
+        # Change the last point of each gap to be a live frame
+        ends = np.cumsum(counts) - 1
+        velocity_mode[ends] = CURRENT_TO_NEXT
+        user_programs[ends] = LIVE_PROGRAM
+        return counts, time_array, velocity_mode, user_programs, trajectory
+
+
+def split_count(time_point):
+    # type: (float) -> int
+    """How many points a move needs to be split into so that none exceed the
+    max pmac move time"""
+    if time_point > MAX_MOVE_TIME:
+        return int(time_point / MAX_MOVE_TIME + 1)
+    else:
+        return 1
+
+
+def split_positions(last_point, point, nsplit):
+    """The nsplit - 1 positions evenly spaced between last_point and point
+    that split the move into nsplit sections. Works on (n, 1) arrays too"""
+    per_section = (point - last_point) / nsplit
+    return last_point + np.arange(1, nsplit) * per_section
@@ -0,0 +1,247 @@
+import numpy as np
+from annotypes import TYPE_CHECKING
+from scanpointgenerator import CompoundGenerator
+
+from malcolm.modules import scanning
+
+if TYPE_CHECKING:
+    from typing import Dict, Sequence, Tuple, Any
+    from .infos import MotorInfo
+
+    AxisArrays = Dict[str, np.ndarray]
+    PointsArrays = Tuple[AxisArrays, AxisArrays, AxisArrays]
+    ProfileArrays = Tuple[np.ndarray, np.ndarray]
+
+
+def generator_points(generator, start, end, axes):
+    # type: (CompoundGenerator, int, int, Sequence[str]) -> PointsArrays
+    """Get the positions and bounds of a range of points from a prepared
+    generator in one go, rather than a Point object at a time
+
+    This uses get_points() if scanpointgenerator has it, otherwise it does
+    the same index arithmetic as CompoundGenerator.get_point(), but with
+    numpy arrays of point numbers
+
+    Args:
+        generator: The prepared CompoundGenerator
+        start: The first point number to get
+        end: One after the last point number to get
+        axes: The axes to return data for
+
+    Returns:
+        tuple: (lower, positions, upper) where each is a dict of
+            {axis_name: np.ndarray of float64}
+    """
+    if hasattr(generator, "get_points") and end - start > 1:
+        # get_points() gets the bounds of a single point in a reversed row
+        # the wrong way round, so those fall through to get_point() below
+        points = generator.get_points(start, end)
+        return tuple({axis: np.asarray(d[axis]) for axis in axes} for d in (
+            points.lower, points.positions, points.upper))
+    scaling = getattr(generator, "_generator_dim_scaling", None)
+    if generator.mutators or scaling is None:
+        # Mutators work on Point objects, and without the private scaling
+        # attribute we can't do the arithmetic, so we have to make them
+        return _generator_points_slow(generator, start, end, axes)
+    dimension_indexes = scanning.util.generator_dimension_indexes(
+        generator, start, end)
+    if dimension_indexes is None:
+        return _generator_points_slow(generator, start, end, axes)
+    lower, positions, upper = {}, {}, {}
+    for dim, (_, k, dim_reverse) in zip(
+            generator.dimensions, dimension_indexes):
+        for g in dim.generators:
+            j = (k // scaling[g]["repeat"]).astype(np.int64)
+            r = j // g.size
+            j %= g.size
+            if g is dim.generators[0]:
+                # Top level generator's direction is handled by the reverse
+                # direction being appended, but bounds are swapped
+                swap = dim_reverse
+            elif dim.alternate:
+                swap = r % 2 == 1
+                j = np.where(swap, g.size - j - 1, j)
+            else:
+                swap = np.zeros(len(k), dtype=bool)
+            j_lower = np.where(swap, j + 1, j)
+            j_upper = np.where(swap, j, j + 1)
+            for axis in g.axes:
+                if axis not in axes:
+                    continue
+                positions[axis] = g.positions[axis][j]
+                # apply "real" bounds to the "innermost" generator only
+                if generator.continuous and dim is generator.dimensions[-1] \
+                        and g is dim.generators[-1]:
+                    lower[axis] = g.bounds[axis][j_lower]
+                    upper[axis] = g.bounds[axis][j_upper]
+                else:
+                    lower[axis] = positions[axis]
+                    upper[axis] = positions[axis]
+    return lower, positions, upper
+
+
+def _generator_points_slow(generator, start, end, axes):
+    # type: (CompoundGenerator, int, int, Sequence[str]) -> PointsArrays
+    lower = {axis: np.empty(end - start) for axis in axes}
+    positions = {axis: np.empty(end - start) for axis in axes}
+    upper = {axis: np.empty(end - start) for axis in axes}
+    for i in range(start, end):
+        point = generator.get_point(i)
+        for axis in axes:
+            lower[axis][i - start] = point.lower[axis]
+            positions[axis][i - start] = point.positions[axis]
+            upper[axis][i - start] = point.upper[axis]
+    return lower, positions, upper
+
+
+def make_velocity_profiles(motor_infos, v1s, v2s, distances, min_times):
+    # type: (Sequence[MotorInfo], Any, Any, Any, Any) -> ProfileArrays
+    """Calculate the velocity profiles for a batch of moves at once
+
+    This does the same calculation as MotorInfo.make_velocity_profile(), but
+    with numpy arrays of moves. Each profile is made of 4 segments, a ramp to
+    the hat or pad velocity, time spent at that velocity, a ramp to v2, then
+    the velocity settle time. Segments that are not needed take no time, and
+    no explicit zero velocity points are inserted
+
+    Args:
+        motor_infos: The MotorInfo for each axis, the last dimension of the
+            other arguments
+        v1s: Starting velocities in EGUs/s
+        v2s: Ending velocities in EGUs/s
+        distances: Relative distances to travel in EGUs
+        min_times: The minimum time each move should take, broadcastable to
+            the shape of the other arguments
+
+    Returns:
+        tuple: (time_array, velocity_array) where each is an array with an
+            extra last dimension of 5, giving the 5 time points relative to
+            the start of the move and the velocities at those points
+    """
+    v1, v2, distance, min_time, acc, max_v, settle = np.broadcast_arrays(
+        *[np.asarray(x, np.float64) for x in (
+            v1s, v2s, distances, min_times,
+            [m.acceleration for m in motor_infos],
+            [m.max_velocity for m in motor_infos],
+            [m.velocity_settle for m in motor_infos])])
+    # Take off the settle time and distance
+    min_time = np.where(min_time > 0, min_time - settle, min_time)
+    distance = distance - settle * v2
+    # The ramp time and distance of a continuous ramp from v1 to v2
+    ramp_time = np.abs(v2 - v1) / acc
+    remaining_distance = distance - (v1 + v2) * ramp_time / 2
+    # Check if we need to stretch in time, and if so how fast we would need to
+    # be going so that the total move completes in min_time
+    stretch = min_time > ramp_time
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pad_velocity = remaining_distance / (min_time - ramp_time)
+    hat_up = np.where(
+        stretch, pad_velocity > np.maximum(v1, v2), remaining_distance >= 0)
+    hat_down = np.where(
+        stretch, pad_velocity < np.minimum(v1, v2), remaining_distance < 0)
+    padded = ~hat_up & ~hat_down
+    # Make the hats
+    acceleration = np.where(hat_down, -acc, acc)
+    t1, tm, t2, vm = _make_hats(
+        v1, v2, acceleration, distance, min_time, acc, max_v)
+    # Make the padded ramps, which spend the rest of min_time at pad_velocity
+    pt1 = np.abs(pad_velocity - v1) / acc
+    pt2 = np.abs(v2 - pad_velocity) / acc
+    with np.errstate(invalid="ignore"):
+        t1 = np.where(padded, pt1, t1)
+        tm = np.where(padded, min_time - pt1 - pt2, tm)
+        t2 = np.where(padded, pt2, t2)
+        vm = np.where(padded, pad_velocity, vm)
+        negative = ~((t1 >= 0) & (tm >= 0) & (t2 >= 0))
+    assert not negative.any(), "Got negative t %s" % np.stack(
+        (t1, tm, t2), axis=-1)[negative][0]
+    # Create the time and velocity arrays, with settle time on the end
+    time_array = np.cumsum(np.stack(
+        (np.zeros_like(t1), t1, tm, t2, settle),
+        axis=-1), axis=-1)
+    velocity_array = np.stack((v1, vm, vm, v2, v2), axis=-1)
+    return time_array, velocity_array
+
+
+def _make_hats(v1, v2, acceleration, distance, min_time, acc, max_v):
+    """Vectorized MotorInfo._make_hat(), returning (t1, tm, t2, vm)"""
+    # Where we are trying to meet time constraints, solve quadratic to give vm
+    b = v1 + v2 + min_time * acceleration
+    c = distance * acceleration + (v1 * v1 + v2 * v2) / 2
+    op = b * b - 4 * c
+    # Might have a negative number as rounding error, if not then we can't do
+    # it, so set something massive to fail vm check
+    op = np.where(np.isclose(op, 0), 0, np.where(op < 0, 10000000000, op))
+    t1 = np.empty_like(v1)
+    tm = np.empty_like(v1)
+    t2 = np.empty_like(v1)
+    vm = np.empty_like(v1)
+    solved = np.zeros(v1.shape, bool)
+    # Try negative root, then positive root
+    for root in (b - np.sqrt(op)) / 2, (b + np.sqrt(op)) / 2:
+        rt1 = (root - v1) / acceleration
+        rt2 = (root - v2) / acceleration
+        rtm = min_time - rt1 - rt2
+        ok = (min_time > 0) & ~solved & (-max_v <= root) & (root <= max_v) & \
+            (rt1 >= 0) & (rt2 >= 0) & (rtm >= 0)
+        t1[ok], tm[ok], t2[ok], vm[ok] = rt1[ok], rtm[ok], rt2[ok], root[ok]
+        solved |= ok
+    # If vm is out of range or any segment takes negative time, we can't do it
+    # in min_time, so act as if unconstrained and go at max velocity
+    hat_vm = np.where(acceleration > 0, max_v, -max_v)
+    ht1 = np.abs(hat_vm - v1) / acc
+    # This is the distance of the first ramp for both ramps, as it is in
+    # MotorInfo._calculate_hat_params()
+    hd1 = (v1 + hat_vm) * ht1 / 2
+    t1 = np.where(solved, t1, ht1)
+    tm = np.where(solved, tm, (distance - 2 * hd1) / hat_vm)
+    t2 = np.where(solved, t2, np.abs(v2 - hat_vm) / acc)
+    vm = np.where(solved, vm, hat_vm)
+    # If middle segment needs to be negative time then we need to cap vm and
+    # spend no time at vm
+    capped = tm < 0
+    with np.errstate(invalid="ignore"):
+        cap_vm = np.sqrt(
+            (2 * acceleration * distance + v1 * v1 + v2 * v2) / 2)
+    cap_vm = np.where(acceleration < 0, -cap_vm, cap_vm)
+    t1 = np.where(capped, np.abs(cap_vm - v1) / acc, t1)
+    tm = np.where(capped, 0, tm)
+    t2 = np.where(capped, np.abs(v2 - cap_vm) / acc, t2)
+    vm = np.where(capped, cap_vm, vm)
+    return t1, tm, t2, vm
+
+
+def velocity_profile_distances(time_array, velocity_array, times):
+    # type: (np.ndarray, np.ndarray, np.ndarray) -> np.ndarray
+    """Find how far along a batch of velocity profiles we are at given times
+
+    Args:
+        time_array: Array of shape (n, npoints) of time points for each profile
+        velocity_array: Array of shape (n, npoints) of velocities at those
+            time points, with velocity varying linearly between them
+        times: Array of shape (n,) of the time to find the distance at along
+            each profile
+
+    Returns:
+        np.ndarray: Array of shape (n,) of distance travelled in EGUs
+    """
+    # The distance travelled at the start of each segment
+    durations = np.diff(time_array, axis=-1)
+    segment_distances = (
+        velocity_array[:, :-1] + velocity_array[:, 1:]) * durations / 2
+    start_distances = np.zeros(time_array.shape)
+    start_distances[:, 1:] = np.cumsum(segment_distances, axis=-1)
+    # Which segment each time is in. Times that are close to the end of a
+    # segment are treated as being in it
+    boundaries = time_array[:, 1:-1]
+    past = (times[:, None] > boundaries) & ~np.isclose(
+        times[:, None], boundaries)
+    segment = np.sum(past, axis=-1)
+    rows = np.arange(len(times))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = np.where(durations > 0, np.diff(
+            velocity_array, axis=-1) / durations, 0)
+    dt = times - time_array[rows, segment]
+    v = velocity_array[rows, segment]
+    return start_distances[rows, segment] + v * dt + \
+        slopes[rows, segment] * dt * dt / 2
@@ -7,7 +7,8 @@ from annotypes import TYPE_CHECKING
 from malcolm.modules.builtin.controllers import ClientComms
 from malcolm.core import Queue, Model, DEFAULT_TIMEOUT, BlockMeta, \
     serialize_object, BlockModel, Alarm
-from .pvaconvert import convert_value_to_dict, convert_to_type_tuple_value, Type
+from .pvaconvert import convert_value_to_dict, convert_to_type_tuple_value, \
+    make_type
 
 
 if TYPE_CHECKING:
@@ -124,16 +125,28 @@ class PvaClientComms(ClientComms):
             attribute_name (str): The name of the Attribute within the Block
             value: The value to put
         """
-        path = attribute_name + ".value"
-        typ, value = convert_to_type_tuple_value(serialize_object(value))
-        if isinstance(typ, tuple):
-            # Structure, make into a Value
-            _, typeid, fields = typ
-            value = Value(Type(fields, typeid), value)
+        self.send_put_many(mri, {attribute_name: value})
+
+    def send_put_many(self, mri, values):
+        """Dispatch a Put to a number of Attributes to the server as a single
+        pvAccess Put to the fields of the Block
+
+        Args:
+            mri (str): The mri of the Block
+            values (dict): {attribute_name: value} for each value to put
+        """
+        put_values = {}
+        for attribute_name, value in values.items():
+            typ, value = convert_to_type_tuple_value(serialize_object(value))
+            if isinstance(typ, tuple):
+                # Structure, make into a Value
+                _, typeid, fields = typ
+                value = Value(make_type(fields, typeid), value)
+            put_values[attribute_name + ".value"] = value
         try:
-            self._ctxt.put(mri, {path: value}, path)
+            self._ctxt.put(mri, put_values, ",".join(put_values))
         except RemoteError:
-            if attribute_name == "exports":
+            if "exports" in values:
                 # TODO: use a tag instead of a name
                 # This will change the structure of the block
                 # Wait for reconnect
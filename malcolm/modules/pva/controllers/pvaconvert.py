@@ -4,12 +4,19 @@ from p4p import Type, Value
 import numpy as np
 
 from malcolm.compat import str_, long_, OrderedDict
+from malcolm.core import NumberArrayMeta, TableMeta
 
 if TYPE_CHECKING:
     from typing import Dict, Tuple, List, Any
 
 EMPTY = Value(Type([]))
 
+# How many structure Types to cache before starting again
+TYPE_CACHE_SIZE = 1000
+
+# {(typeid, hashable fields): Type}
+_type_cache = {}  # type: Dict[Tuple, Type]
+
 # https://mdavidsaver.github.io/p4p/values.html
 type_specifiers = {
     np.bool_: '?',
@@ -47,12 +54,54 @@ except NameError:
     pass
 
 
+# {dtype string: (numpy dtype, spec)} for NumberArrayMeta dtypes
+_dtype_specs = {}  # type: Dict[str, Tuple[np.dtype, str]]
+
+
+def _dtype_spec(dtype):
+    # type: (str) -> Tuple[np.dtype, str]
+    try:
+        return _dtype_specs[dtype]
+    except KeyError:
+        np_dtype = np.dtype(dtype)
+        ret = _dtype_specs[dtype] = (np_dtype, 'a' + type_specifiers[
+            np_dtype.type])
+        return ret
+
+
+def _convert_with_meta(value, meta):
+    # type: (Any, Any) -> Tuple[Any, Any]
+    """Convert the value of an Attribute using its serialized meta to give
+    the type of any numeric arrays, rather than looking at every element"""
+    typeid = meta.get("typeid", None) if isinstance(meta, dict) else None
+    if typeid == NumberArrayMeta.typeid:
+        np_dtype, spec = _dtype_spec(meta["dtype"])
+        # This doesn't copy if the Array is already a numpy array of dtype
+        return spec, np.asarray(getattr(value, "seq", value), np_dtype)
+    elif typeid == TableMeta.typeid and isinstance(value, dict):
+        elements = meta["elements"]
+        fields = []
+        value_for_set = {}
+        for k, v in value.items():
+            if k != "typeid":
+                t, v_set = _convert_with_meta(v, elements.get(k, None))
+                fields.append((k, t))
+                value_for_set[k] = v_set
+        return ('S', value.get("typeid", "structure"), fields), value_for_set
+    else:
+        return convert_to_type_tuple_value(value)
+
+
 def convert_to_type_tuple_value(value):
     # type: (Any) -> Tuple[Any, Any]
     if isinstance(value, Array):
         if issubclass(value.typ, Enum):
             typ = str
             value_for_set = [x.value for x in value.seq]
+        elif value.typ in specifier_types.values() and value.typ is not str:
+            # Numeric numpy type, convert any list in one go
+            typ = value.typ
+            value_for_set = np.asarray(value.seq, typ)
         else:
             typ = value.typ
             value_for_set = value.seq
@@ -92,10 +141,15 @@ def convert_to_type_tuple_value(value):
         fields = []
         value_for_set = {}
         for k, v in value.items():
-            if k != "typeid":
+            if k == "value" and "meta" in value:
+                # An Attribute, so use its meta to convert the value
+                t, v_set = _convert_with_meta(v, value["meta"])
+            elif k != "typeid":
                 t, v_set = convert_to_type_tuple_value(v)
-                fields.append((k, t))
-                value_for_set[k] = v_set
+            else:
+                continue
+            fields.append((k, t))
+            value_for_set[k] = v_set
         spec = ('S', typeid, fields)
     elif isinstance(value, Enum):
         spec = 's'
@@ -123,18 +177,42 @@ def convert_from_type_spec(spec, val):
         return val
 
 
+def _hashable_spec(spec):
+    # type: (Any) -> Any
+    """Turn the lists in a type spec into tuples so it can be a dict key"""
+    if isinstance(spec, (list, tuple)):
+        return tuple(_hashable_spec(x) for x in spec)
+    else:
+        return spec
+
+
+def make_type(fields, typeid):
+    # type: (List[Tuple[str, Any]], str) -> Type
+    """Make a structure Type, reusing one we made earlier for the same spec
+    as creating a p4p Type is much slower than looking it up"""
+    key = (typeid, _hashable_spec(fields))
+    try:
+        return _type_cache[key]
+    except KeyError:
+        pass
+    try:
+        typ = Type(fields, typeid)
+    except RuntimeError as e:
+        raise RuntimeError(
+            "%s when doing Type(%s, %s)" % (e, fields, typeid))
+    if len(_type_cache) >= TYPE_CACHE_SIZE:
+        _type_cache.clear()
+    _type_cache[key] = typ
+    return typ
+
+
 def convert_dict_to_value(d):
     # type: (Dict) -> Value
     if d is None:
         val = EMPTY
     else:
         (_, typeid, fields), value_for_set = convert_to_type_tuple_value(d)
-        try:
-            typ = Type(fields, typeid)
-        except RuntimeError as e:
-            raise RuntimeError(
-                "%s when doing Type(%s, %s)" % (e, fields, typeid))
-        val = Value(typ, value_for_set)
+        val = Value(make_type(fields, typeid), value_for_set)
     return val
 
 
@@ -151,9 +229,17 @@ def convert_value_to_dict(v):
     return d
 
 
+def get_path(value, path):
+    # type: (Value, List[str]) -> Value
+    """Get the sub-structure of value at path. It shares storage with value,
+    so it can be kept and set to update value"""
+    for p in path:
+        value = value[p]
+    return value
+
+
 def update_path(value, path, update):
     # type: (Value, List[str], Any) -> None
-    for p in path[:-1]:
-        value = value[p]
+    value = get_path(value, path[:-1])
     _, update = convert_to_type_tuple_value(update)
     value[path[-1]] = update
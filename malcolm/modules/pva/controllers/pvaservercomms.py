@@ -4,28 +4,156 @@ from p4p import Value
 from p4p.server import Server, DynamicProvider, ServerOperation
 from p4p.server.cothread import Handler, SharedPV
 
+from malcolm.compat import OrderedDict
 from malcolm.core import Subscribe, Error, APublished, Controller, Delta, \
-    Return, stringify_error, Response, Put, Post, Unsubscribe, \
+    Return, stringify_error, Response, Put, PutMany, Post, Unsubscribe, \
     ProcessPublishHook, method_return_unpacked, Method, serialize_object, \
     BlockMeta, MethodModel, RLock
 from malcolm.modules import builtin
-from .pvaconvert import convert_dict_to_value, update_path, \
-    convert_value_to_dict
+from .pvaconvert import convert_dict_to_value, get_path, \
+    convert_value_to_dict, convert_to_type_tuple_value
 
 if TYPE_CHECKING:
-    from typing import Optional, Dict, List, Set
+    from typing import Optional, Dict, List, Set, Tuple, Any
+
+
+def _apply_change(structure, path, *args):
+    # type: (Any, List[str], *Any) -> Any
+    """Return a copy of the serialized structure with the change made to it.
+    Only the dicts along path are copied, as the rest may be shared with the
+    notifier and must not be modified"""
+    if not path:
+        return args[0] if args else None
+    structure = OrderedDict(structure.items())
+    if len(path) == 1:
+        if args:
+            structure[path[0]] = args[0]
+        else:
+            structure.pop(path[0], None)
+    else:
+        structure[path[0]] = _apply_change(structure[path[0]], path[1:], *args)
+    return structure
+
+
+class BlockSubscription(object):
+    """A single Subscribe to a Block, shared between the BlockHandlers of the
+    Block and all its fields. Each Delta is split up by field and passed to
+    the handlers for that field"""
+
+    def __init__(self, controller):
+        # type: (Controller) -> None
+        self.controller = controller
+        # Lock to control access to the handlers and structure
+        self._lock = RLock()
+        # {field (None for the whole Block): set of handlers}
+        self._handlers = {}  # type: Dict[Optional[str], Set[BlockHandler]]
+        # The serialized Block, or None if we haven't had it yet
+        self.structure = None  # type: Optional[Dict[str, Any]]
+
+    def _initial_delta(self, field):
+        # type: (Optional[str]) -> Response
+        if field is None:
+            return Delta(changes=[[[], self.structure]])
+        elif field in self.structure:
+            return Delta(changes=[[[], self.structure[field]]])
+        else:
+            return Error(message=ValueError(
+                "Block %s has no field %r" % (self.controller.mri, field)))
+
+    def add(self, handler):
+        # type: (BlockHandler) -> None
+        """Start passing Deltas to handler, subscribing if it is the first"""
+        with self._lock:
+            subscribe = not self._handlers
+            self._handlers.setdefault(handler.field, set()).add(handler)
+            if self.structure is not None:
+                # Already subscribed, so give it the current value
+                handler.handle(self._initial_delta(handler.field))
+        if subscribe:
+            request = Subscribe(path=[self.controller.mri], delta=True)
+            request.set_callback(self.handle)
+            # No need to wait for first update here, but if the block is idle
+            # we can send it now
+            self.controller.handle_request(request, inline=True)
+
+    def remove(self, handler):
+        # type: (BlockHandler) -> None
+        """Stop passing Deltas to handler, unsubscribing if it is the last"""
+        with self._lock:
+            handlers = self._handlers.get(handler.field, set())
+            handlers.discard(handler)
+            if not handlers:
+                self._handlers.pop(handler.field, None)
+            unsubscribe = not self._handlers
+            if unsubscribe:
+                self.structure = None
+        if unsubscribe:
+            request = Unsubscribe()
+            request.set_callback(self.handle)
+            self.controller.handle_request(request, inline=True).get(
+                timeout=1)
+
+    def handle(self, response):
+        # type: (Response) -> None
+        # Called from whatever thread the child block could be in, so
+        # must already be a good thread to take the lock
+        with self._lock:
+            if isinstance(response, Delta):
+                self._handle_delta(response)
+            elif isinstance(response, Error):
+                # The subscription has failed, tell everyone
+                self.structure = None
+                for handlers in list(self._handlers.values()):
+                    for handler in list(handlers):
+                        handler.handle(response)
+            # A Return means we unsubscribed, so there is no-one to tell
+
+    def _handle_delta(self, delta):
+        # type: (Delta) -> None
+        # Called with the lock taken
+        # {field: [change relative to that field]}
+        field_changes = {}  # type: Dict[str, List[List]]
+        root_changed = False
+        for change in delta.changes:
+            path = change[0]
+            self.structure = _apply_change(self.structure, *change)
+            if path:
+                field_changes.setdefault(path[0], []).append(
+                    [path[1:]] + change[1:])
+            else:
+                root_changed = True
+        for field, handlers in list(self._handlers.items()):
+            if field is None:
+                response = delta
+            elif root_changed:
+                response = self._initial_delta(field)
+            elif field in field_changes:
+                response = Delta(changes=field_changes[field])
+            else:
+                continue
+            for handler in list(handlers):
+                handler.handle(response)
 
 
 class BlockHandler(Handler):
-    def __init__(self, controller, field=None):
-        # type: (Controller, str) -> None
+    def __init__(self, controller, subscription, field=None):
+        # type: (Controller, BlockSubscription, str) -> None
         self.controller = controller
+        self.subscription = subscription
         # Lock to control access to self.pv
         self._lock = RLock()
         self.field = field
         self.pv = None  # type: Optional[SharedPV]
         self.value = None  # type: Value
         self.put_paths = None  # type: Set[str]
+        # The sub-structures of self.value that Deltas have updated, so we
+        # don't have to walk down to them again next time
+        # {tuple(path): Value}
+        self._parents = {}  # type: Dict[Tuple[str, ...], Value]
+        # Whether each Method we have called returns a bare value that needs
+        # wrapping in a structure. Cleared when the Block structure changes
+        # {method_name: add_wrapper}
+        self._add_wrappers = {}  # type: Dict[str, bool]
 
     def rpc(self, pv, op):
         # type: (SharedPV, ServerOperation) -> None
@@ -51,11 +179,7 @@ class BlockHandler(Handler):
                 assert method, "No 'method' in pvRequest:\n%s" % op.pvRequest()
             parameters = convert_value_to_dict(value)
         path = [self.controller.mri, method]
-        view = self.controller.block_view()[method]
-        assert isinstance(view, Method), \
-            "%s.%s is not a Method so cannot do RPC" % tuple(path)
-        add_wrapper = method_return_unpacked() in view.tags
-
+        add_wrapper = self._get_add_wrapper(method)
         post = Post(path=path, parameters=parameters)
 
         def handle_post_response(response):
@@ -67,18 +191,41 @@ class BlockHandler(Handler):
                     ret = {"return": response.value}
                 else:
                     ret = response.value
-                serialized = serialize_object(ret)
-                v = convert_dict_to_value(serialized)
-                op.done(v)
+                try:
+                    serialized = serialize_object(ret)
+                    v = convert_dict_to_value(serialized)
+                except Exception as e:
+                    # Nothing is waiting on the request, so tell the client
+                    # rather than leaving it hanging
+                    op.done(error=stringify_error(e))
+                else:
+                    op.done(v)
             else:
                 if isinstance(response, Error):
                     message = stringify_error(response.message)
                 else:
                     message = "BadResponse: %s" % response.to_dict()
+                # The Method may have changed, so look it up again next time
+                self._add_wrappers.pop(method, None)
                 op.done(error=message)
 
         post.set_callback(handle_post_response)
-        self.controller.handle_request(post).get()
+        # Don't wait for it, handle_post_response will tell the client when it
+        # is done
+        self.controller.handle_request(post)
+
+    def _get_add_wrapper(self, method):
+        # type: (str) -> bool
+        try:
+            return self._add_wrappers[method]
+        except KeyError:
+            view = self.controller.block_view()[method]
+            assert isinstance(view, Method), \
+                "%s.%s is not a Method so cannot do RPC" % (
+                    self.controller.mri, method)
+            add_wrapper = method_return_unpacked() in view.tags
+            self._add_wrappers[method] = add_wrapper
+            return add_wrapper
 
     def put(self, pv, op):
         # type: (SharedPV, ServerOperation) -> None
@@ -97,26 +244,35 @@ class BlockHandler(Handler):
         # thing we want to change, so value_changed would be:
         #  {"attr.value"} or {"table.value"} or {"value"}
         value_changed = changed_fields_inc_parents.intersection(self.put_paths)
-        assert len(value_changed) == 1, \
-            "Can only do a Put to a single field, got %s" % list(value_changed)
-        changed = list(value_changed)[0]
         if self.field is not None:
             # Only accept a Put to "value"
+            assert len(value_changed) == 1, \
+                "Can only do a Put to a single field, got %s" % list(
+                    value_changed)
+            changed = list(value_changed)[0]
             assert changed == "value", \
                 "Can only put to value of %s.%s, not %s" % (
                     self.controller.mri, self.field, changed)
             path += [self.field, "value"]
-            op_value = op.value()
+            value = convert_value_to_dict(op.value())["value"]
+            put = Put(path=path, value=value)
         else:
-            # Get the path and string "value" from the put value
-            split = changed.split(".")
-            assert len(split) == 2 and split[1] == "value", \
-                "Can only put to value of %s.%s, not %s" % (
-                    self.controller.mri, split[0], split[1])
-            path += list(split)
-            op_value = op.value()[split[0]]
-        value = convert_value_to_dict(op_value)["value"]
-        put = Put(path=path, value=value)
+            # Get the attribute names and string "value" from the put value
+            assert value_changed, "No fields changed in Put"
+            values = {}
+            for changed in sorted(value_changed):
+                split = changed.split(".")
+                assert len(split) == 2 and split[1] == "value", \
+                    "Can only put to value of %s.%s, not %s" % (
+                        self.controller.mri, split[0], split[1])
+                values[split[0]] = convert_value_to_dict(
+                    op.value()[split[0]])["value"]
+            if len(values) == 1:
+                attribute_name, value = values.popitem()
+                put = Put(path=path + [attribute_name, "value"], value=value)
+            else:
+                # Put to all the Attributes in one go
+                put = PutMany(path=path, values=values)
 
         def handle_put_response(response):
             # type: (Response) -> None
@@ -130,7 +286,9 @@ class BlockHandler(Handler):
                 op.done(error=message)
 
         put.set_callback(handle_put_response)
-        self.controller.handle_request(put).get()
+        # Don't wait for it, handle_put_response will tell the client when it
+        # is done
+        self.controller.handle_request(put)
 
     def handle(self, response):
         # type: (Response) -> None
@@ -163,6 +321,8 @@ class BlockHandler(Handler):
                response.changes[0][0] == [], \
                "Expected root update, got %s" % (response.changes,)
         self.value = convert_dict_to_value(response.changes[0][1])
+        self._parents = {}
+        self._add_wrappers = {}
         unputtable_ids = (MethodModel.typeid, BlockMeta.typeid)
         if not self.field:
             self.put_paths = set(
@@ -186,7 +346,14 @@ class BlockHandler(Handler):
                 "Can't handle root update %s after initial" % (change,)
             # Path will have at least one element
             path, update = change
-            update_path(self.value, path, update)
+            parent_path = tuple(path[:-1])
+            try:
+                parent = self._parents[parent_path]
+            except KeyError:
+                parent = get_path(self.value, parent_path)
+                self._parents[parent_path] = parent
+            _, update = convert_to_type_tuple_value(update)
+            parent[path[-1]] = update
         # No type change, post the updated value
         self.pv.post(self.value)
 
@@ -197,13 +364,7 @@ class BlockHandler(Handler):
         # Store the PV, but don't open it now, let the first Delta do this
         with self._lock:
             self.pv = pv
-        path = [self.controller.mri]
-        if self.field is not None:
-            path.append(self.field)
-        request = Subscribe(path=path, delta=True)
-        request.set_callback(self.handle)
-        # No need to wait for first update here
-        self.controller.handle_request(request)
+        self.subscription.add(self)
 
     # Need camelCase as called by p4p Server
     # noinspection PyPep8Naming
@@ -215,9 +376,8 @@ class BlockHandler(Handler):
             self.pv.close()
             self.pv = None
             self.value = None
-        request = Unsubscribe()
-        request.set_callback(self.handle)
-        self.controller.handle_request(request).get(timeout=1)
+            self._parents = {}
+        self.subscription.remove(self)
 
 
 class PvaServerComms(builtin.controllers.ServerComms):
@@ -230,6 +390,8 @@ class PvaServerComms(builtin.controllers.ServerComms):
         self._provider = None
         self._published = set()
         self._pvs = {}  # type: Dict[str, Dict[str, SharedPV]]
+        # One Subscribe per Block, shared by the PVs of the Block and its fields
+        self._subscriptions = {}  # type: Dict[str, BlockSubscription]
         # Hooks
         self.register_hooked(ProcessPublishHook, self.publish)
 
@@ -273,8 +435,14 @@ class PvaServerComms(builtin.controllers.ServerComms):
             try:
                 pv = pvs[field]
             except KeyError:
-                controller = self.process.get_controller(mri)
-                handler = BlockHandler(controller, field)
+                try:
+                    subscription = self._subscriptions[mri]
+                except KeyError:
+                    subscription = BlockSubscription(
+                        self.process.get_controller(mri))
+                    self._subscriptions[mri] = subscription
+                handler = BlockHandler(
+                    subscription.controller, subscription, field)
                 # We want any client passing a pvRequest field() to ONLY receive
                 # that field. The default behaviour of p4p is to send a masked
                 # version of the full structure. The mapperMode option allows us
@@ -318,6 +486,7 @@ class PvaServerComms(builtin.controllers.ServerComms):
         # type: (List[str]) -> None
         """Disconnect anyone listening to any of the given mris"""
         for mri in mris:
+            self._subscriptions.pop(mri, None)
             for pv in self._pvs.pop(mri, {}).values():
                 # Close pv with force destroy on, this will call
                 # onLastDisconnect
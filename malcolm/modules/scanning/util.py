@@ -1,10 +1,15 @@
-from annotypes import Anno, Array, Union, Sequence, Any
+from annotypes import Anno, Array, Union, Sequence, Any, TYPE_CHECKING
 from scanpointgenerator import CompoundGenerator
 import numpy as np
 
 from malcolm.core import Serializable, VMeta, NTUnion, Widget
 from malcolm.modules.builtin.util import ManagerStates
 
+if TYPE_CHECKING:
+    from typing import List, Optional, Tuple
+
+    DimensionIndexes = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
 with Anno("Generator instance providing specification for scan"):
     AGenerator = CompoundGenerator
 with Anno("List of axes in inner dimension of generator that should be moved"):
@@ -100,3 +105,46 @@ class PointGeneratorMeta(VMeta):
         else:
             raise TypeError(
                 "Value %s must be a Generator object or dictionary" % value)
+
+
+def generator_dimension_indexes(generator, start, end):
+    # type: (CompoundGenerator, int, int) -> Optional[List[DimensionIndexes]]
+    """Do the per dimension index arithmetic of CompoundGenerator.get_point()
+    for a range of points from a prepared generator in one go
+
+    This relies on private attributes of the generator, so returns None if
+    this version of scanpointgenerator doesn't have them, and the caller
+    should fall back to get_point() or get_points()
+
+    Args:
+        generator: The prepared CompoundGenerator
+        start: The first point number to get
+        end: One after the last point number to get
+
+    Returns:
+        list: A (i, k, reverse) tuple of np.ndarray for each dimension, where
+            i is the index within the dimension as in get_point().indexes, k
+            is the index of the generator points to use, and reverse is True
+            where the dimension is running backwards. None if not supported
+    """
+    dim_meta = getattr(generator, "_dim_meta", None)
+    if dim_meta is None:
+        return None
+    n = np.arange(start, end)
+    dimension_indexes = []
+    # The "cumulative" k for each dimension, we need to know how many times
+    # we have run through the outer dimensions to know if alternating ones
+    # should be reversed
+    kc = np.zeros(len(n), dtype=np.int64)
+    for dim in generator.dimensions:
+        indices = np.asarray(dim.indices)
+        i = (n // dim_meta[dim]["repeat"]).astype(np.int64) % dim.size
+        k = indices[i]
+        if dim.alternate:
+            reverse = kc % 2 == 1
+            i = np.where(reverse, dim.size - i - 1, i)
+        else:
+            reverse = np.zeros(len(n), dtype=bool)
+        kc = kc * dim.size + k
+        dimension_indexes.append((i, indices[i], reverse))
+    return dimension_indexes
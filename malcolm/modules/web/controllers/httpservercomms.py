@@ -84,4 +84,5 @@ class HTTPServerComms(builtin.controllers.ServerComms):
             controller = self
         else:
             controller = self.process.get_controller(info.mri)
-        cothread.Callback(controller.handle_request, info.request)
+        cothread.Callback(
+            controller.handle_request, info.request, self.inline_requests)
@@ -1,17 +1,22 @@
+from threading import Lock
+import time
+
 from annotypes import Anno, TYPE_CHECKING
 from cothread import cothread
 from tornado import gen
+from tornado.httpclient import HTTPRequest
 from tornado.websocket import websocket_connect, WebSocketClientConnection
 
 from malcolm.core import Subscribe, deserialize_object, json_decode, \
-    json_encode, Response, Error, Update, Return, Queue, Request, \
+    json_encode_message, Response, Error, Update, Return, Queue, Request, \
     StringArrayMeta, Widget, ResponseError, DEFAULT_TIMEOUT, Delta, \
-    BlockModel, NTScalar, BlockMeta, Put, Post
+    BlockModel, NTScalar, BlockMeta, Put, PutMany, Post
 from malcolm.modules import builtin
-from ..util import IOLoopHelper
+from ..util import IOLoopHelper, BINARY_SUBPROTOCOL, json_encode_binary, \
+    json_decode_binary
 
 if TYPE_CHECKING:
-    from typing import Dict, Tuple, Callable
+    from typing import Dict, Tuple, Callable, List
     Key = Tuple[Callable[[Response], None], int]
 
 with Anno("Hostname of malcolm websocket server"):
@@ -20,6 +25,8 @@ with Anno("Port number to run up under"):
     APort = int
 with Anno("Time to wait for connection"):
     AConnectTimeout = float
+with Anno("Whether to ask the server to send numeric arrays as binary frames"):
+    ABinary = bool
 
 
 class WebsocketClientComms(builtin.controllers.ClientComms):
@@ -29,17 +36,31 @@ class WebsocketClientComms(builtin.controllers.ClientComms):
                  mri,  # type: builtin.controllers.AMri
                  hostname="localhost",  # type: AHostname
                  port=8008,  # type: APort
-                 connect_timeout=DEFAULT_TIMEOUT  # type: AConnectTimeout
+                 connect_timeout=DEFAULT_TIMEOUT,  # type: AConnectTimeout
+                 binary=False,  # type: ABinary
                  ):
         # type: (...) -> None
         super(WebsocketClientComms, self).__init__(mri)
         self.hostname = hostname
         self.port = port
         self.connect_timeout = connect_timeout
+        self.binary = binary
+        # Whether the server agreed to binary frames on this connection
+        self._binary_accepted = False
+        # Binary frames received since the last text frame
+        self._buffers = []  # type: List[bytes]
         self._connected_queue = Queue()
         # {new_id: request}
         self._request_lookup = {}  # type: Dict[int, Request]
         self._next_id = 1
+        # Requests from cothread waiting to be sent by tornado, and responses
+        # from tornado waiting for their callbacks to be run in cothread. Each
+        # is handed over as a batch so a burst of messages only needs a
+        # single call into the other thread
+        self._send_lock = Lock()
+        self._send_queue = []  # type: List[Request]
+        self._recv_lock = Lock()
+        self._recv_queue = []  # type: List[Tuple[Callable, Response]]
         self._conn = None  # type: WebSocketClientConnection
         # Create read-only attribute for the remotely reachable blocks
         self.remote_blocks = StringArrayMeta(
@@ -56,17 +77,31 @@ class WebsocketClientComms(builtin.controllers.ClientComms):
         # Called from cothread
         if self._conn is None:
             IOLoopHelper.call(self.recv_loop)
-            self._connected_queue.get(timeout=self.connect_timeout)
+            error = self._connected_queue.get(timeout=self.connect_timeout)
+            if error is not None:
+                raise error
             root_subscribe = Subscribe(path=[".", "blocks", "value"])
             root_subscribe.set_callback(self._update_remote_blocks)
-            IOLoopHelper.call(self._send_request, root_subscribe)
+            self._queue_request(root_subscribe)
 
     @gen.coroutine
     def recv_loop(self):
         # Called from tornado
         url = "ws://%s:%d/ws" % (self.hostname, self.port)
-        self._conn = yield websocket_connect(
-            url, connect_timeout=self.connect_timeout - 0.5)
+        headers = {}
+        if self.binary:
+            headers["Sec-WebSocket-Protocol"] = BINARY_SUBPROTOCOL
+        request = HTTPRequest(
+            url, connect_timeout=self.connect_timeout - 0.5, headers=headers)
+        try:
+            self._conn = yield websocket_connect(request)
+        except Exception as e:
+            # Tell cothread now rather than letting it wait for the timeout
+            cothread.Callback(self._connected_queue.put, e)
+            return
+        self._binary_accepted = self._conn.headers.get(
+            "Sec-WebSocket-Protocol") == BINARY_SUBPROTOCOL
+        self._buffers = []
         cothread.Callback(self._connected_queue.put, None)
         while True:
             message = yield self._conn.read_message()
@@ -83,9 +118,17 @@ class WebsocketClientComms(builtin.controllers.ClientComms):
             message(str): Received message
         """
         # Called in tornado loop
+        if isinstance(message, bytes):
+            # Binary frame, store it for the text frame that refers to it
+            self._buffers.append(message)
+            return
         try:
             self.log.debug("Got message %s", message)
-            d = json_decode(message)
+            if self._buffers:
+                buffers, self._buffers = self._buffers, []
+                d = json_decode_binary(message, buffers)
+            else:
+                d = json_decode(message)
             response = deserialize_object(d, Response)
             if isinstance(response, (Return, Error)):
                 request = self._request_lookup.pop(response.id)
@@ -95,12 +138,32 @@ class WebsocketClientComms(builtin.controllers.ClientComms):
             else:
                 request = self._request_lookup[response.id]
             # Transfer the work of the callback to cothread
-            cothread.Callback(request.callback, response)
+            self._queue_response(request.callback, response)
         except Exception:
             # If we don't catch the exception here, tornado will spew odd
             # error messages about 'HTTPRequest' object has no attribute 'path'
             self.log.exception("on_message(%r) failed", message)
 
+    def _queue_response(self, callback, response):
+        # type: (Callable[[Response], None], Response) -> None
+        # Called in tornado thread
+        with self._recv_lock:
+            self._recv_queue.append((callback, response))
+            if len(self._recv_queue) > 1:
+                # Already asked cothread to dispatch the batch
+                return
+        cothread.Callback(self._dispatch_responses)
+
+    def _dispatch_responses(self):
+        # Called in cothread thread
+        with self._recv_lock:
+            responses, self._recv_queue = self._recv_queue, []
+        for callback, response in responses:
+            try:
+                callback(response)
+            except Exception:
+                self.log.exception("Callback %s(%s) raised", callback, response)
+
     def _report_fault(self):
         # Called in cothread thread
         with self._lock:
@@ -125,8 +188,9 @@ class WebsocketClientComms(builtin.controllers.ClientComms):
             self._conn = None
 
     def _update_remote_blocks(self, response):
+        # Called in cothread thread
         response = deserialize_object(response, Update)
-        cothread.Callback(self.remote_blocks.set_value, response.value)
+        self.remote_blocks.set_value(response.value)
 
     def do_disable(self):
         super(WebsocketClientComms, self).do_disable()
@@ -144,26 +208,48 @@ class WebsocketClientComms(builtin.controllers.ClientComms):
             mri (str): The mri for the remote block
             block (BlockModel): The local proxy Block to keep in sync
         """
-        # Send a root Subscribe to the server
-        subscribe = Subscribe(path=[mri], delta=True)
+        self.sync_proxies({mri: block})
+
+    def sync_proxies(self, blocks):
+        """Sync a number of proxy Blocks with their remote counterparts. All
+        the Subscribes are sent before waiting for any of them, so this takes
+        a single round trip however many blocks there are
+
+        Args:
+            blocks (dict): {mri: BlockModel} for each local proxy Block
+        """
         done_queue = Queue()
+        # The mris that have not had their first response yet
+        waiting = set(blocks)
 
-        def handle_response(response):
-            # Called from tornado
-            if not isinstance(response, Delta):
-                # Return or Error is the end of our subscription, log and ignore
-                self.log.debug("Proxy got response %r", response)
-                done_queue.put(None)
-            else:
-                cothread.Callback(
-                    self._handle_response, response, block, done_queue)
+        def make_handler(mri, block):
+            def handle_response(response):
+                # Called from cothread
+                try:
+                    if isinstance(response, Delta):
+                        self._handle_response(response, block)
+                    else:
+                        # Return or Error is the end of our subscription, log
+                        # and ignore
+                        self.log.debug("Proxy got response %r", response)
+                finally:
+                    if mri in waiting:
+                        waiting.remove(mri)
+                        done_queue.put(mri)
+
+            return handle_response
 
-        subscribe.set_callback(handle_response)
-        IOLoopHelper.call(self._send_request, subscribe)
-        done_queue.get(timeout=DEFAULT_TIMEOUT)
+        for mri, block in blocks.items():
+            # Send a root Subscribe to the server
+            subscribe = Subscribe(path=[mri], delta=True)
+            subscribe.set_callback(make_handler(mri, block))
+            self._queue_request(subscribe)
+        end = time.time() + DEFAULT_TIMEOUT
+        for _ in blocks:
+            done_queue.get(timeout=end - time.time())
 
-    def _handle_response(self, response, block, done_queue):
-        # type: (Response, BlockModel, Queue) -> None
+    def _handle_response(self, response, block):
+        # type: (Response, BlockModel) -> None
         try:
             with self.changes_squashed:
                 for change in response.changes:
@@ -171,8 +257,6 @@ class WebsocketClientComms(builtin.controllers.ClientComms):
         except Exception:
             self.log.exception("Error handling %s", response)
             raise
-        finally:
-            done_queue.put(None)
 
     def _handle_change(self, block, change):
         path = change[0]
@@ -224,13 +308,29 @@ class WebsocketClientComms(builtin.controllers.ClientComms):
             path=[mri, attribute_name, "value"],
             value=value)
         request.set_callback(q.put)
-        IOLoopHelper.call(self._send_request, request)
+        self._queue_request(request)
         response = q.get()
         if isinstance(response, Error):
             raise response.message
         else:
             return response.value
 
+    def send_put_many(self, mri, values):
+        """Dispatch a Put to a number of Attributes to the server in a single
+        PutMany request
+
+        Args:
+            mri (str): The mri of the Block
+            values (dict): {attribute_name: value} for each value to put
+        """
+        q = Queue()
+        request = PutMany(path=[mri], values=values)
+        request.set_callback(q.put)
+        self._queue_request(request)
+        response = q.get()
+        if isinstance(response, Error):
+            raise response.message
+
     def send_post(self, mri, method_name, **params):
         """Abstract method to dispatch a Post to the server
 
@@ -247,18 +347,45 @@ class WebsocketClientComms(builtin.controllers.ClientComms):
             path=[mri, method_name],
             parameters=params)
         request.set_callback(q.put)
-        IOLoopHelper.call(self._send_request, request)
+        self._queue_request(request)
         response = q.get()
         if isinstance(response, Error):
             raise response.message
         else:
             return response.value
 
+    def _queue_request(self, request):
+        # type: (Request) -> None
+        # Called in cothread thread
+        with self._send_lock:
+            self._send_queue.append(request)
+            if len(self._send_queue) > 1:
+                # Already asked tornado to send the batch
+                return
+        IOLoopHelper.call(self._send_requests)
+
+    def _send_requests(self):
+        # Called in tornado thread
+        with self._send_lock:
+            requests, self._send_queue = self._send_queue, []
+        for request in requests:
+            if self._conn is None:
+                self._queue_response(request.callback, Error(
+                    id=request.id,
+                    message=ResponseError("Server disconnected")))
+            else:
+                self._send_request(request)
+
     def _send_request(self, request):
         # Called in tornado thread
         request.id = self._next_id
         self._next_id += 1
         self._request_lookup[request.id] = request
-        message = json_encode(request)
+        if self._binary_accepted:
+            message, buffers = json_encode_binary(request)
+            for buffer in buffers:
+                self._conn.write_message(buffer, binary=True)
+        else:
+            message = json_encode_message(request)
         self.log.debug("Sending message %s", message)
         self._conn.write_message(message)
@@ -1,8 +1,8 @@
 from annotypes import Anno, add_call_types
 from tornado.web import RequestHandler, asynchronous
 
-from malcolm.core import Part, json_decode, json_encode, Get, Post, Return, \
-    Error, PartRegistrar
+from malcolm.core import Part, json_decode, json_encode_message, Get, Post, \
+    Return, Error, PartRegistrar
 from malcolm.modules import builtin
 from ..hooks import ReportHandlersHook, UHandlerInfos
 from ..infos import HandlerInfo
@@ -43,7 +43,7 @@ class RestfulHandler(RequestHandler):
     def on_response(self, response):
         # called from cothread
         if isinstance(response, Return):
-            message = json_encode(response.value)
+            message = json_encode_message(response.value)
             IOLoopHelper.call(self.finish, message + "\n")
         else:
             if isinstance(response, Error):
@@ -3,21 +3,27 @@ import socket
 import fcntl
 import struct
 import os
+import time
 
 from annotypes import Anno, add_call_types, TYPE_CHECKING
+from tornado.concurrent import Future
 from tornado.websocket import WebSocketHandler, WebSocketError
 
+from malcolm.compat import OrderedDict
 from malcolm.core import Part, json_decode, deserialize_object, Request, \
-    json_encode, Subscribe, Unsubscribe, Delta, Update, Error, \
-    Response, FieldError, PartRegistrar, Put, Post
+    json_encode_message, Subscribe, Unsubscribe, Delta, Update, Error, \
+    Response, FieldError, PartRegistrar, Put, PutMany, Post, TableMeta, \
+    Widget, Timer
+from malcolm.core.notifier import squash_changes
 from malcolm.modules import builtin
 from ..infos import HandlerInfo
 from ..hooks import ReportHandlersHook, UHandlerInfos
-from ..util import IOLoopHelper
+from ..util import IOLoopHelper, BINARY_SUBPROTOCOL, json_encode_binary, \
+    json_decode_binary, OverflowPolicy, ClientTable
 
 
 if TYPE_CHECKING:
-    from typing import Dict
+    from typing import Dict, List, Set, Tuple, Any
 
 # Create a module level logger
 log = logging.getLogger(__name__)
@@ -29,6 +35,9 @@ SIOCGIFNETMASK = 0x891b
 # Where we get info about interfaces on Linux
 SYSNET = '/sys/class/net'
 
+# How often to update the clients table in seconds
+CLIENTS_UPDATE_PERIOD = 1.0
+
 
 def get_if_info(s, sig, ifname):
     # Use an ioctl to get interface address or netmask
@@ -55,15 +64,81 @@ class MalcWebSocketHandler(WebSocketHandler):
     _id_to_mri = None
     _validators = None
     _writeable = None
+    _binary = False
+    _buffers = None
+    _clients = None
+    _high_water_mark = None
+    _overflow = None
+    _outbox = None
+    _ended = None
+    _writing = False
+    _conflated = 0
+    _dropped = 0
+    name = ""
 
-    def initialize(self, registrar=None, validators=()):
+    def initialize(self, registrar=None, validators=(), clients=None,
+                   high_water_mark=1000, overflow=OverflowPolicy.DISCONNECT):
         self._registrar = registrar  # type: PartRegistrar
         # {id: mri}
         self._id_to_mri = {}  # type: Dict[int, str]
         self._validators = validators
+        # Binary frames received since the last text frame
+        self._buffers = []  # type: List[bytes]
+        # The set of connected handlers we should add ourself to
+        self._clients = clients  # type: Set[MalcWebSocketHandler]
+        self._high_water_mark = high_water_mark
+        self._overflow = overflow
+        # Responses waiting for the client to take the previous ones
+        # {id or unique key: (time queued, Response)}
+        self._outbox = OrderedDict()  # type: Dict[Any, Tuple[float, Response]]
+        # Ids of subscriptions we have ended because the client was too slow,
+        # waiting for the Return of the Unsubscribe
+        self._ended = set()  # type: Set[int]
+
+    def open(self):
+        # called in tornado's thread when the client connects
+        address = getattr(self.request.connection.context, "address", None)
+        if isinstance(address, tuple):
+            self.name = "%s:%s" % address[:2]
+        else:
+            self.name = self.request.remote_ip
+        if self._clients is not None:
+            self._clients.add(self)
+
+    def on_close(self):
+        # called in tornado's thread when the client disconnects
+        if self._clients is not None:
+            self._clients.discard(self)
+        self._outbox.clear()
+
+    def metrics(self, now):
+        # type: (float) -> Tuple[str, int, int, int, float]
+        """Return (name, queued, conflated, dropped, lag) for the clients
+        table. Safe to call from any thread"""
+        try:
+            queued_time = next(iter(self._outbox.values()))[0]
+        except (StopIteration, RuntimeError):
+            # Empty, or changed while we looked
+            lag = 0.0
+        else:
+            lag = max(now - queued_time, 0.0)
+        return (self.name, len(self._outbox), self._conflated, self._dropped,
+                lag)
+
+    def select_subprotocol(self, subprotocols):
+        # called in tornado's thread when the client connects
+        if BINARY_SUBPROTOCOL in subprotocols:
+            # Client can take numeric arrays as binary frames
+            self._binary = True
+            return BINARY_SUBPROTOCOL
 
     def on_message(self, message):
         # called in tornado's thread
+        if isinstance(message, bytes):
+            # Binary frame, store it for the text frame that refers to it
+            self._buffers.append(message)
+            return
+
         if self._writeable is None:
             # Work out if the remote ip is within the netmask of any of our
             # interfaces. If not, Put and Post are forbidden
@@ -79,7 +154,11 @@ class MalcWebSocketHandler(WebSocketHandler):
 
         msg_id = -1
         try:
-            d = json_decode(message)
+            if self._buffers:
+                buffers, self._buffers = self._buffers, []
+                d = json_decode_binary(message, buffers)
+            else:
+                d = json_decode(message)
             try:
                 msg_id = d['id']
             except KeyError:
@@ -94,16 +173,15 @@ class MalcWebSocketHandler(WebSocketHandler):
                 mri = self._id_to_mri[msg_id]
             else:
                 mri = request.path[0]
-            if isinstance(request, (Put, Post)) and not self._writeable:
+            if isinstance(request, (Put, PutMany, Post)) and \
+                    not self._writeable:
                 raise ValueError(
                     "Put/Post is forbidden from %s" % self.request.remote_ip)
             log.info("Request: %s", request)
             self._registrar.report(builtin.infos.RequestInfo(request, mri))
         except Exception as e:
             log.exception("Error handling message:\n%s", message)
-            error = Error(msg_id, e)
-            error_message = error.to_dict()
-            self.write_message(json_encode(error_message))
+            self._on_response(Error(msg_id, e))
 
     def on_response(self, response):
         # called from cothread
@@ -112,25 +190,113 @@ class MalcWebSocketHandler(WebSocketHandler):
     def _on_response(self, response):
         # type: (Response) -> None
         # called from tornado thread
-        message = json_encode(response)
+        if response.id in self._ended:
+            # The client has already had an Error for this subscription, so
+            # ignore anything else until the Unsubscribe has returned
+            if not isinstance(response, (Delta, Update)):
+                self._ended.discard(response.id)
+            return
+        if self._writing:
+            # The client hasn't taken the last message yet, so queue it
+            self._queue_response(response)
+        else:
+            self._write_response(response)
+
+    def _queue_response(self, response):
+        # type: (Response) -> None
+        if isinstance(response, (Delta, Update)):
+            key = response.id
+            queued = self._outbox.get(key, None)
+            if queued is not None:
+                # There is already one waiting for this subscription, so merge
+                # this into it
+                queued_time, queued_response = queued
+                if isinstance(response, Delta):
+                    response = Delta(id=response.id, changes=squash_changes(
+                        queued_response.changes + response.changes))
+                self._outbox[key] = (queued_time, response)
+                self._conflated += 1
+                return
+        else:
+            # Returns and Errors are never merged
+            key = object()
+        if len(self._outbox) < self._high_water_mark:
+            self._outbox[key] = (time.time(), response)
+        elif self._overflow == OverflowPolicy.DISCONNECT:
+            log.warning(
+                "Client %s has %d messages waiting, disconnecting",
+                self.name, len(self._outbox))
+            self._outbox.clear()
+            self.close()
+        elif isinstance(response, (Delta, Update)):
+            # Skipping part of a subscription would leave the client with the
+            # wrong state, so end the subscription with an Error instead
+            self._dropped += 1
+            self._end_subscription(response.id)
+        else:
+            # Returns and Errors are never dropped, or the client would wait
+            # for them forever
+            self._outbox[key] = (time.time(), response)
+
+    def _end_subscription(self, msg_id):
+        # type: (int) -> None
+        if self._unsubscribe(msg_id):
+            log.warning(
+                "Client %s has %d messages waiting, ending subscription %d",
+                self.name, len(self._outbox), msg_id)
+            self._ended.add(msg_id)
+            self._outbox[object()] = (time.time(), Error(
+                msg_id, "Subscription ended as client was too slow"))
+
+    def _unsubscribe(self, msg_id):
+        # type: (int) -> bool
+        # Subsequent updates may come in before the unsubscribe, but ignore
+        # them as we can't do anything about it
+        mri = self._id_to_mri.pop(msg_id, None)
+        if mri:
+            unsubscribe = Unsubscribe(msg_id)
+            unsubscribe.set_callback(self.on_response)
+            self._registrar.report(builtin.infos.RequestInfo(unsubscribe, mri))
+            return True
+        return False
+
+    def _write_response(self, response):
+        # type: (Response) -> None
         try:
-            self.write_message(message)
+            if self._binary:
+                message, buffers = json_encode_binary(response)
+                for buffer in buffers:
+                    self.write_message(buffer, binary=True)
+            else:
+                message = json_encode_message(response)
+            future = self.write_message(message)
+            if isinstance(future, Future) and not future.done():
+                # Tornado is buffering it, so queue anything else until it
+                # has been sent
+                self._writing = True
+                future.add_done_callback(self._write_done)
         except WebSocketError:
             # The websocket is dead. If the response was a Delta or Update, then
             # unsubscribe so the local controller doesn't keep on trying to
             # respond
             if isinstance(response, (Delta, Update)):
-                # Websocket is dead so we can clear the subscription key.
-                # Subsequent updates may come in before the unsubscribe, but
-                # ignore them as we can't do anything about it
-                mri = self._id_to_mri.pop(response.id, None)
-                if mri:
+                # Websocket is dead so we can clear the subscription key
+                if self._unsubscribe(response.id):
                     log.info(
                         'WebSocket Error: unsubscribing from stale handle')
-                    unsubscribe = Unsubscribe(response.id)
-                    unsubscribe.set_callback(self.on_response)
-                    self._registrar.report(
-                        builtin.infos.RequestInfo(unsubscribe, mri))
+
+    def _write_done(self, future):
+        # type: (Future) -> None
+        # called from tornado thread when a write has gone to the socket
+        self._writing = False
+        if future.exception() is not None:
+            # The websocket is closed, so nothing else will get sent
+            self._outbox.clear()
+            return
+        while self._outbox and not self._writing:
+            key = next(iter(self._outbox))
+            _, response = self._outbox.pop(key)
+            self._write_response(response)
 
     # http://stackoverflow.com/q/24851207
     # TODO: remove this when the web gui is hosted from the box
@@ -140,14 +306,60 @@ class MalcWebSocketHandler(WebSocketHandler):
 
 with Anno("Part name and subdomain name to host websocket on"):
     AName = str
+with Anno("Maximum number of messages waiting to be sent to each client"):
+    AHighWaterMark = int
+with Anno("What to do when a client has too many messages waiting"):
+    AOverflow = OverflowPolicy
 
 
 class WebsocketServerPart(Part):
-    def __init__(self, name="ws"):
-        # type: (AName) -> None
+    def __init__(self,
+                 name="ws",  # type: AName
+                 high_water_mark=1000,  # type: AHighWaterMark
+                 overflow=OverflowPolicy.DISCONNECT,  # type: AOverflow
+                 ):
+        # type: (...) -> None
         super(WebsocketServerPart, self).__init__(name)
+        self.high_water_mark = high_water_mark
+        self.overflow = OverflowPolicy(overflow)
+        # The connected clients, added and removed in tornado's thread
+        self._clients = set()  # type: Set[MalcWebSocketHandler]
+        self._timer = None  # type: Timer
+        self.clients = TableMeta.from_table(
+            ClientTable, "Websocket clients and how far behind they are",
+            widget=Widget.TABLE
+        ).create_attribute_model()
         # Hooks
         self.register_hooked(ReportHandlersHook, self.report_handlers)
+        self.register_hooked((builtin.hooks.InitHook,
+                              builtin.hooks.ResetHook), self.start_updates)
+        self.register_hooked((builtin.hooks.HaltHook,
+                              builtin.hooks.DisableHook), self.stop_updates)
+
+    def setup(self, registrar):
+        # type: (PartRegistrar) -> None
+        super(WebsocketServerPart, self).setup(registrar)
+        registrar.add_attribute_model("%sClients" % self.name, self.clients)
+
+    def start_updates(self):
+        # type: () -> None
+        if self._timer is None:
+            self._timer = Timer(
+                CLIENTS_UPDATE_PERIOD, self.update_clients, retrigger=True)
+
+    def stop_updates(self):
+        # type: () -> None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def update_clients(self):
+        # type: () -> None
+        now = time.time()
+        rows = sorted(
+            list(client.metrics(now)) for client in list(self._clients))
+        if rows != list(self.clients.value.rows()) or any(r[4] for r in rows):
+            self.clients.set_value(ClientTable.from_rows(rows))
 
     @add_call_types
     def report_handlers(self):
@@ -163,5 +375,7 @@ class WebsocketServerPart(Part):
                 validators.append(get_ip_validator(ifname))
         info = HandlerInfo(
             regexp, MalcWebSocketHandler,
-            registrar=self.registrar, validators=validators)
+            registrar=self.registrar, validators=validators,
+            clients=self._clients, high_water_mark=self.high_water_mark,
+            overflow=self.overflow)
         return info
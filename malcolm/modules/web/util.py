@@ -1,8 +1,67 @@
 from threading import Thread
 import atexit
+import json
 
+from annotypes import TYPE_CHECKING, Any, Anno, Array, Union, Sequence
+from enum import Enum
+import numpy as np
 from tornado.ioloop import IOLoop
 
+from malcolm.compat import OrderedDict
+from malcolm.core import serialize_hook, Table
+
+if TYPE_CHECKING:
+    from typing import List, Tuple
+
+# Websocket subprotocol a client asks for if it can receive numeric arrays as
+# binary frames
+BINARY_SUBPROTOCOL = "malcolm-binary"
+# Typeid of the placeholder that refers to a binary frame within a JSON message
+BINARY_ARRAY_TYPEID = "malcolm:web/BinaryArray:1.0"
+# Numeric arrays smaller than this many bytes are left inline in the JSON
+BINARY_MIN_NBYTES = 1024
+
+
+class OverflowPolicy(Enum):
+    """What to do when a client's queue of messages waiting to be sent is full
+    """
+    # End subscriptions with an Error rather than queueing more changes
+    DROP = "drop"
+    DISCONNECT = "disconnect"  # Close the connection so the client resyncs
+
+
+with Anno("Address and port of the client"):
+    AClientArray = Array[str]
+with Anno("Number of messages waiting to be sent"):
+    AQueuedArray = Array[np.int32]
+with Anno("Number of Updates and Deltas merged into one already waiting"):
+    AConflatedArray = Array[np.int32]
+with Anno("Number of subscriptions ended because the queue was full"):
+    ADroppedArray = Array[np.int32]
+with Anno("How long the oldest waiting message has been waiting in seconds"):
+    ALagArray = Array[float]
+UClientArray = Union[AClientArray, Sequence[str]]
+UQueuedArray = Union[AQueuedArray, Sequence[np.int32]]
+UConflatedArray = Union[AConflatedArray, Sequence[np.int32]]
+UDroppedArray = Union[ADroppedArray, Sequence[np.int32]]
+ULagArray = Union[ALagArray, Sequence[float]]
+
+
+class ClientTable(Table):
+    def __init__(self,
+                 client,  # type: UClientArray
+                 queued,  # type: UQueuedArray
+                 conflated,  # type: UConflatedArray
+                 dropped,  # type: UDroppedArray
+                 lag,  # type: ULagArray
+                 ):
+        # type: (...) -> None
+        self.client = AClientArray(client)
+        self.queued = AQueuedArray(queued)
+        self.conflated = AConflatedArray(conflated)
+        self.dropped = ADroppedArray(dropped)
+        self.lag = ALagArray(lag)
+
 
 class IOLoopHelper(object):
     _loop = None  # type: IOLoop
@@ -39,3 +98,65 @@ class IOLoopHelper(object):
             # Wait until done
             cls._thread.join()
             cls._thread = None
+
+
+def json_encode_binary(o, min_nbytes=BINARY_MIN_NBYTES):
+    # type: (Any, int) -> Tuple[str, List[bytes]]
+    """Encode an object as JSON, with numeric arrays taken out into buffers
+
+    Each numpy array (or Array of one) of bool, int, uint or float type at
+    least min_nbytes long is replaced by a placeholder dict that refers to the
+    index of its buffer. These buffers should be sent as binary frames before
+    the JSON text frame.
+
+    Args:
+        o: The object to encode, like a Response or its serialized dict
+        min_nbytes (int): Arrays smaller than this stay inline
+
+    Returns:
+        tuple: (JSON str, [buffer bytes])
+    """
+    buffers = []
+
+    def hook(ob):
+        # Cheaper than subclass check...
+        if ob.__class__.__name__ == "Array":
+            ob = ob.seq
+        if isinstance(ob, np.ndarray) and ob.dtype.kind in "biuf" and \
+                ob.nbytes >= min_nbytes:
+            d = OrderedDict()
+            d["typeid"] = BINARY_ARRAY_TYPEID
+            d["dtype"] = ob.dtype.str
+            d["index"] = len(buffers)
+            buffers.append(np.ascontiguousarray(ob).tobytes())
+            return d
+        return serialize_hook(ob)
+
+    s = json.dumps(o, default=hook)
+    return s, buffers
+
+
+def json_decode_binary(s, buffers):
+    # type: (str, List[bytes]) -> OrderedDict
+    """Decode a JSON message, replacing binary array placeholders with numpy
+    arrays that share memory with the buffers they came in
+
+    Args:
+        s (str): The JSON text frame
+        buffers (list): The binary frames received before it
+
+    Returns:
+        OrderedDict: The decoded message
+    """
+    def hook(pairs):
+        if pairs and pairs[0] == ("typeid", BINARY_ARRAY_TYPEID):
+            d = dict(pairs)
+            return np.frombuffer(buffers[d["index"]], dtype=d["dtype"])
+        return OrderedDict(pairs)
+
+    try:
+        o = json.loads(s, object_pairs_hook=hook)
+        assert isinstance(o, OrderedDict), "didn't return OrderedDict"
+        return o
+    except Exception as e:
+        raise ValueError("Error decoding JSON object (%s)" % str(e))
@@ -72,6 +72,7 @@ setup(
     install_requires=install_requires,
     extras_require={
         'websocket':  ['tornado'],
+        'json': ['orjson'],
         'ca': ['cothread'],
         'hdf5': ['h5py', 'vds-gen'],
     },
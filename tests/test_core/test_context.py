@@ -5,7 +5,7 @@ import time
 from malcolm.core.context import Context
 from malcolm.core.errors import ResponseError, TimeoutError, BadValueError, \
     AbortedError
-from malcolm.core.request import Put, Post, Subscribe, Unsubscribe
+from malcolm.core.request import Put, PutMany, Post, Subscribe, Unsubscribe
 from malcolm.core.response import Error, Return, Update
 from malcolm.core import Process
 from malcolm.core.future import Future
@@ -55,6 +55,19 @@ class TestContext(unittest.TestCase):
             self.o.put(["block", "attr", "value"], 32)
         assert str(cm.exception) == "Test Exception"
 
+    def test_put_many(self):
+        self.o._q.put(Return(1, None))
+        self.o.put_many(["block"], dict(attr=32))
+        self.assert_handle_request_called_with(
+            PutMany(1, ["block"], dict(attr=32)))
+
+    def test_put_many_timeout(self):
+        f = self.o.put_many_async(["block"], dict(attr=32))
+        with self.assertRaises(TimeoutError) as cm:
+            self.o.wait_all_futures(f, 0.01)
+        assert str(cm.exception) == \
+            "Timeout waiting for [block.put_attribute_values({'attr': 32})]"
+
     def test_post(self):
         self.o._q.put(Return(1, dict(a=2)))
         result = self.o.post(["block", "method"], dict(b=32))
@@ -105,6 +118,12 @@ class TestContext(unittest.TestCase):
         self.o.wait_all_futures(f, 0.01)
         assert f.done()
 
+    def test_inline_requests(self):
+        self.o.inline_requests = True
+        self.controller.handle_request.return_value.ready.return_value = True
+        self.o.subscribe(["block", "attr", "value"], MagicMock())
+        self.controller.handle_request.assert_called_once_with(ANY, True)
+
     def test_many_puts(self):
         fs = [self.o.put_async(["block", "attr", "value"], 32),
               self.o.put_async(["block", "attr2", "value"], 32)]
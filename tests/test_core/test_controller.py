@@ -4,7 +4,7 @@ from annotypes import add_call_types, Anno
 
 from malcolm.core import Controller, Part, PartRegistrar, StringMeta, \
     Process, Queue, Get, Return, Put, Error, Post, Subscribe, Update, \
-    Unsubscribe
+    Unsubscribe, PutMany, Delta
 
 with Anno("The return value"):
     AWorld = str
@@ -12,6 +12,7 @@ with Anno("The return value"):
 
 class MyPart(Part):
     my_attribute = None
+    other_attribute = None
     exception = None
     context = None
 
@@ -27,6 +28,11 @@ class MyPart(Part):
         ).create_attribute_model('hello_block')
         registrar.add_attribute_model(
             "myAttribute", self.my_attribute, self.my_attribute.set_value)
+        self.other_attribute = StringMeta(
+            description="MyString"
+        ).create_attribute_model()
+        registrar.add_attribute_model(
+            "other", self.other_attribute, self.other_attribute.set_value)
         registrar.add_method_model(self.method)
 
 
@@ -48,6 +54,99 @@ class TestController(unittest.TestCase):
         assert self.o.mri == "mri"
         assert self.o.process == self.process
 
+    def test_handle_request_inline(self):
+        q = Queue()
+        request = Get(id=41, path=["mri", "myAttribute", "value"])
+        request.set_callback(q.put)
+        spawned = self.o.handle_request(request, inline=True)
+        # Handled before we yield
+        assert spawned.ready()
+        response = q.get(timeout=0)
+        self.assertIsInstance(response, Return)
+        assert response.value == "hello_block"
+
+    def test_handle_request_inline_spawns_when_locked(self):
+        q = Queue()
+        request = Get(id=41, path=["mri", "myAttribute", "value"])
+        request.set_callback(q.put)
+        with self.o._lock:
+            spawned = self.o.handle_request(request, inline=True)
+            assert not spawned.ready()
+        spawned.wait(timeout=1)
+        assert q.get(timeout=0).value == "hello_block"
+
+    def test_handle_request_inline_waits_for_queued(self):
+        q = Queue()
+        put = Put(id=42, path=["mri", "myAttribute", "value"], value="bye")
+        put.set_callback(q.put)
+        get = Get(id=43, path=["mri", "myAttribute", "value"])
+        get.set_callback(q.put)
+        self.o.handle_request(put)
+        # The Put hasn't been started, so the Get must queue behind it
+        spawned = self.o.handle_request(get, inline=True)
+        assert not spawned.ready()
+        assert q.get(timeout=1).id == 42
+        response = q.get(timeout=1)
+        assert response.id == 43
+        assert response.value == "bye"
+
+    def test_handle_put_many(self):
+        self.part.my_attribute.meta.writeable = True
+        self.part.other_attribute.meta.writeable = True
+        q = Queue()
+        sub = Subscribe(id=40, path=["mri"], delta=True)
+        sub.set_callback(q.put)
+        self.o.handle_request(sub)
+        assert q.get(timeout=.1).id == 40
+        request = PutMany(
+            id=41, path=["mri"], values=dict(myAttribute="a", other="b"))
+        request.set_callback(q.put)
+        self.o.handle_request(request)
+        # One Delta with both changes in it, then the Return
+        delta = q.get(timeout=.1)
+        self.assertIsInstance(delta, Delta)
+        assert [c[0] for c in delta.changes] == [
+            ["myAttribute", "value"], ["myAttribute", "timeStamp"],
+            ["other", "value"], ["other", "timeStamp"]]
+        response = q.get(timeout=.1)
+        self.assertIsInstance(response, Return)
+        assert response.id == 41
+        assert self.part.my_attribute.value == "a"
+        assert self.part.other_attribute.value == "b"
+
+    def test_handle_put_many_publishes_while_blocked(self):
+        self.part.my_attribute.meta.writeable = True
+        q = Queue()
+        sub = Subscribe(id=40, path=["mri"], delta=True)
+        sub.set_callback(q.put)
+        self.o.handle_request(sub)
+        assert q.get(timeout=.1).id == 40
+        done = Queue()
+        self.o._write_functions["myAttribute"] = lambda value: done.get(1)
+        request = PutMany(id=41, path=["mri"], values=dict(myAttribute="a"))
+        request.set_callback(q.put)
+        self.o.handle_request(request)
+        # A change made while the put is blocked is published straight away
+        self.part.other_attribute.set_value("c")
+        delta = q.get(timeout=.1)
+        self.assertIsInstance(delta, Delta)
+        assert delta.changes[0] == [["other", "value"], "c"]
+        done.put(None)
+        assert q.get(timeout=.1).id == 41
+
+    def test_handle_put_many_not_writeable(self):
+        self.part.my_attribute.meta.writeable = True
+        self.part.other_attribute.meta.writeable = False
+        q = Queue()
+        request = PutMany(
+            id=42, path=["mri"], values=dict(myAttribute="a", other="b"))
+        request.set_callback(q.put)
+        self.o.handle_request(request)
+        response = q.get(timeout=.1)
+        self.assertIsInstance(response, Error)
+        # Nothing was put
+        assert self.part.my_attribute.value == "hello_block"
+
     def test_make_view(self):
         b = self.process.block_view("mri")
         method_view = b.method
@@ -112,6 +112,39 @@ class TestBlockModel(unittest.TestCase):
         assert self.o.meta.fields == ["method", "attr"]
         assert self.o.attr == self.attr
 
+    def test_to_dict_cached(self):
+        d = self.o.to_dict()
+        assert self.o.to_dict() is d
+        method_d = d["method"]
+        # Changing an attribute invalidates it and the block, but not siblings
+        self.attr.set_value("changed")
+        d2 = self.o.to_dict()
+        assert d2 is not d
+        assert d2["attr"]["value"] == "changed"
+        assert d2["method"] is method_d
+        # Changing a meta invalidates all the way up
+        self.attr.meta.set_description("new desc")
+        assert self.o.to_dict()["attr"]["meta"]["description"] == "new desc"
+        # Removing an endpoint invalidates
+        self.o.remove_endpoint("method")
+        assert list(self.o.to_dict()) == ["typeid", "meta", "attr"]
+
+    def test_to_dict_shared_meta(self):
+        attr2 = self.attr.meta.create_attribute_model()
+        self.o.set_endpoint_data("attr2", attr2)
+        assert attr2.meta is self.attr.meta
+        d = self.o.to_dict()
+        assert d["attr"]["meta"]["description"] == ""
+        # Both Attributes that share the meta see the change
+        self.attr.meta.set_description("new desc")
+        d = self.o.to_dict()
+        assert self.attr.to_dict()["meta"]["description"] == "new desc"
+        assert attr2.to_dict()["meta"]["description"] == "new desc"
+        assert d["attr"]["meta"]["description"] == "new desc"
+        assert d["attr2"]["meta"]["description"] == "new desc"
+        # Unshared siblings are still cached
+        assert d["method"] is self.method.to_dict()
+
 
 class TestBooleanArrayMeta(unittest.TestCase):
 
@@ -306,6 +339,13 @@ class TestMethodMeta(unittest.TestCase):
         assert m.label == ""
         assert m.returns.to_dict() == MapMeta().to_dict()
 
+    def test_from_dict_does_not_modify_serialized(self):
+        m = MethodModel.from_dict(self.serialized)
+        d = m.to_dict()
+        m2 = MethodModel.from_dict(d)
+        assert m2.defaults is not d["defaults"]
+        assert m.to_dict() is d
+
 
 class TestMapMeta(unittest.TestCase):
 
@@ -435,6 +475,12 @@ class TestNTTable(unittest.TestCase):
         assert o.meta.elements["foo"].to_dict() == self.serialized["meta"]["elements"]["foo"]
         assert o.to_dict() == self.serialized
 
+    def test_to_dict_label_change(self):
+        o = NTTable.from_dict(self.serialized)
+        assert o.to_dict()["labels"] == ["Foo", "bar"]
+        o.meta.elements["bar"].set_label("Bar")
+        assert o.to_dict()["labels"] == ["Foo", "Bar"]
+
     def test_from_dict(self):
         o = NTTable.from_dict(self.serialized)
         assert list(o.meta.elements) == ["foo", "bar"]
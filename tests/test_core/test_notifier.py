@@ -4,10 +4,11 @@ from threading import RLock
 
 # module imports
 from malcolm.compat import OrderedDict
-from malcolm.core.notifier import Notifier
+from malcolm.core.notifier import Notifier, squash_changes
 from malcolm.core.request import Return, Subscribe, Unsubscribe
 from malcolm.core.response import Update, Delta
 from malcolm.core.serializable import serialize_object
+from malcolm.core import sleep
 
 
 class Dummy(object):
@@ -157,3 +158,141 @@ class TestNotifier(unittest.TestCase):
         expected["attr2"]["value"] = "tr"
         self.assert_called_with(r2.callback, Update(value=expected))
 
+    def test_intermediate_deltas_squashed(self):
+        # set some data
+        self.block["attr"] = Dummy()
+        self.block.attr["value"] = 32
+        r1 = Subscribe(path=["b"], delta=True)
+        r1.set_callback(Mock())
+        self.handle_subscribe(r1)
+        r1.callback.reset_mock()
+        # set the same thing several times and replace its parent
+        with self.o.changes_squashed:
+            self.block.attr["value"] = 33
+            self.o.add_squashed_change(["b", "attr", "value"], 33)
+            self.block.attr["value"] = 34
+            self.o.add_squashed_change(["b", "attr", "value"], 34)
+            self.block["attr2"] = Dummy()
+            self.o.add_squashed_change(["b", "attr2"], self.block.attr2)
+            self.block.attr["value"] = 35
+            self.o.add_squashed_change(["b", "attr", "value"], 35)
+        self.assert_called_with(r1.callback, Delta(
+            changes=[[["attr2"], {}], [["attr", "value"], 35]]))
+
+    def change_attr(self, value):
+        with self.o.changes_squashed:
+            self.block.attr["value"] = value
+            self.o.add_squashed_change(["b", "attr", "value"], value)
+
+    def test_rate_limited_deltas(self):
+        self.block["attr"] = Dummy()
+        self.block.attr["value"] = 32
+        callback = Mock()
+        r1 = Subscribe(path=["b"], delta=True, rate=5)
+        r1.set_callback(callback)
+        self.handle_subscribe(r1)
+        # First one is sent straight away
+        self.assert_called_with(callback, Delta(
+            changes=[[[], dict(attr=dict(value=32))]]))
+        callback.reset_mock()
+        # The next ones are held back until the interval is up, and squashed
+        self.change_attr(33)
+        self.change_attr(34)
+        assert callback.call_count == 0
+        sleep(0.45)
+        self.assert_called_with(callback, Delta(
+            changes=[[["attr", "value"], 34]]))
+        callback.reset_mock()
+        # The interval is up, so the next one is sent straight away, but not
+        # the one after
+        self.change_attr(35)
+        self.change_attr(36)
+        self.assert_called_with(callback, Delta(
+            changes=[[["attr", "value"], 35]]))
+        callback.reset_mock()
+        # Unsubscribe sends anything held back before the Return
+        unsub = Unsubscribe()
+        unsub.set_callback(callback)
+        self.handle_unsubscribe(unsub)
+        assert [c[0][0].to_dict() for c in callback.call_args_list] == [
+            Delta(changes=[[["attr", "value"], 36]]).to_dict(),
+            Return().to_dict()]
+        # And nothing comes later
+        sleep(0.3)
+        assert callback.call_count == 2
+
+    def test_rate_limited_updates(self):
+        self.block["attr"] = Dummy()
+        self.block.attr["value"] = 32
+        callback = Mock()
+        r1 = Subscribe(path=["b", "attr", "value"], rate=5)
+        r1.set_callback(callback)
+        self.handle_subscribe(r1)
+        self.assert_called_with(callback, Update(value=32))
+        callback.reset_mock()
+        for i in range(10):
+            self.change_attr(i)
+        assert callback.call_count == 0
+        sleep(0.45)
+        # Only the latest is sent
+        self.assert_called_with(callback, Update(value=9))
+        callback.reset_mock()
+        # If we wait for the interval then the next one is sent straight away
+        self.change_attr(10)
+        self.assert_called_with(callback, Update(value=10))
+
+    def test_changes_serialized_once(self):
+        self.block["attr"] = Dummy()
+        self.block.attr["value"] = 32
+        # subscribe to the same attr in different ways at different levels
+        requests = [
+            Subscribe(path=["b"], delta=True),
+            Subscribe(path=["b", "attr"], delta=True),
+            Subscribe(path=["b", "attr"], delta=False),
+            Subscribe(path=["b", "attr"], delta=False)]
+        for request in requests:
+            request.set_callback(Mock())
+            self.handle_subscribe(request)
+            request.callback.reset_mock()
+        # replace the attr and count how many times it is serialized
+        attr = Dummy()
+        attr["value"] = 33
+        attr.to_dict = Mock(return_value=dict(value=33))
+        self.block["attr"] = attr
+        with self.o.changes_squashed:
+            self.o.add_squashed_change(["b", "attr"], attr)
+        assert attr.to_dict.call_count == 1
+        self.assert_called_with(requests[0].callback, Delta(
+            changes=[[["attr"], dict(value=33)]]))
+        self.assert_called_with(requests[1].callback, Delta(
+            changes=[[[], dict(value=33)]]))
+        self.assert_called_with(requests[2].callback, Update(
+            value=dict(value=33)))
+        self.assert_called_with(requests[3].callback, Update(
+            value=dict(value=33)))
+
+
+class TestSquashChanges(unittest.TestCase):
+
+    def test_same_path(self):
+        changes = [[["a", "value"], 1], [["b", "value"], 2],
+                   [["a", "value"], 3]]
+        assert squash_changes(changes) == [
+            [["b", "value"], 2], [["a", "value"], 3]]
+
+    def test_parent_overwrites_child(self):
+        changes = [[["a", "value"], 1], [["a", "alarm"], 2], [["a"], 3],
+                   [["a", "timeStamp"], 4]]
+        assert squash_changes(changes) == [[["a"], 3], [["a", "timeStamp"], 4]]
+
+    def test_delete_overwrites_change(self):
+        changes = [[["a", "value"], 1], [["a"]], [["b"], 2]]
+        assert squash_changes(changes) == [[["a"]], [["b"], 2]]
+
+    def test_root_overwrites_everything(self):
+        changes = [[["a", "value"], 1], [["b"], 2], [[], 3]]
+        assert squash_changes(changes) == [[[], 3]]
+
+    def test_sibling_prefix_not_squashed(self):
+        changes = [[["ab"], 1], [["a"], 2]]
+        assert squash_changes(changes) == changes
@@ -65,3 +65,11 @@ class TestProcess(unittest.TestCase):
         assert c.published == ["mri", "mri2"]
         self.o.add_controller(UnpublishableController("mri3"))
         assert c.published == ["mri", "mri2"]
+
+    def test_spawn_request(self):
+        s = self.o.spawn_request(lambda a, b: a + b, 1, b=2)
+        assert s.get(timeout=1) == 3
+        metrics = self.o.request_metrics()
+        assert metrics["processed"] == 1
+        assert metrics["workers"] == 1
+        assert metrics["busy"] == 0
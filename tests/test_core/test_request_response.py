@@ -3,8 +3,9 @@ import os
 from mock import MagicMock, ANY
 
 from malcolm.compat import OrderedDict
-from malcolm.core import json_decode
-from malcolm.core.request import Request, Get, Post, Subscribe, Unsubscribe, Put
+from malcolm.core import json_decode, deserialize_object
+from malcolm.core.request import Request, Get, Post, Subscribe, Unsubscribe, \
+    Put, PutMany
 from malcolm.core.response import Return, Error, Update, Delta, Response
 
 
@@ -89,6 +90,29 @@ class TestPut(unittest.TestCase):
         assert get_doc_json("put_hdf_file_path") == self.o.to_dict()
 
 
+class TestPutMany(unittest.TestCase):
+
+    def setUp(self):
+        self.callback = MagicMock()
+        self.path = ["BL18I:XSPRESS3:HDF"]
+        self.values = OrderedDict()
+        self.values["filePath"] = "/path/to/file.h5"
+        self.values["numCapture"] = 100
+        self.o = PutMany(36, self.path, self.values)
+        self.o.set_callback(self.callback)
+
+    def test_init(self):
+        assert self.o.typeid == "malcolm:core/PutMany:1.0"
+        assert self.o.id == 36
+        assert self.o.callback == self.callback
+        assert self.path == self.o.path
+        assert self.values == self.o.values
+        assert list(self.o.values) == ["filePath", "numCapture"]
+
+    def test_doc(self):
+        assert get_doc_json("put_many_hdf_file_path") == self.o.to_dict()
+
+
 class TestPost(unittest.TestCase):
 
     def setUp(self):
@@ -148,6 +172,16 @@ class TestSubscribe(unittest.TestCase):
     def test_doc(self):
         assert get_doc_json("subscribe_xspress3") == self.o.to_dict()
 
+    def test_rate_left_out_when_zero(self):
+        d = self.o.to_dict()
+        assert "rate" not in d
+        assert deserialize_object(d).rate == 0
+
+    def test_doc_rate(self):
+        o = Subscribe(20, ["BL18I:XSPRESS3", "arrayCounter", "value"], rate=10)
+        assert get_doc_json("subscribe_xspress3_array_counter_rate") == \
+            o.to_dict()
+
 
 class TestUnsubscribe(unittest.TestCase):
 
@@ -1,12 +1,19 @@
 from collections import OrderedDict
+import json
 import unittest
 
 import numpy as np
+from mock import patch
+from enum import Enum
 from annotypes import Anno, Array, Mapping, Union, Sequence, Any
 
+from malcolm.core import serializable
 from malcolm.core.serializable import Serializable, deserialize_object, \
-    json_encode, serialize_object
-from malcolm.core.models import StringMeta
+    json_encode, serialize_object, json_encode_message, set_json_backend, \
+    register_json_backend, JSON_BACKENDS
+from malcolm.core.models import StringMeta, NumberArrayMeta, ChoiceMeta
+from malcolm.core.response import Delta, Error
+from malcolm.core.table import Table
 
 
 with Anno("A Boo"):
@@ -93,3 +100,99 @@ class TestSerialization(unittest.TestCase):
     def test_exception_serialize(self):
         s = json_encode(serialize_object({"message": ValueError("Bad result")}))
         assert s == '{"message": "ValueError: Bad result"}'
+
+
+with Anno("A Column"):
+    AColumn = Array[float]
+
+
+class DummyEnum(Enum):
+    FOO = "foo"
+    BAR = "bar"
+
+
+class DummyTable(Table):
+    def __init__(self, column):
+        # type: (AColumn) -> None
+        self.column = AColumn(column)
+
+
+class TestJsonEncodeMessage(unittest.TestCase):
+
+    def setUp(self):
+        self.dumps = serializable._json_dumps
+
+    def tearDown(self):
+        serializable._json_dumps = self.dumps
+
+    def check_all_backends(self, o, expected):
+        for name in JSON_BACKENDS:
+            set_json_backend(name)
+            assert json.loads(json_encode_message(o)) == expected, name
+
+    def test_numpy_array(self):
+        s1 = DummySerializable(3, {}, np.array([3, 4]))
+        self.check_all_backends(s1, dict(
+            typeid="foo:1.0", boo=3, bar={}, NOT_CAMEL=[3, 4]))
+
+    def test_non_contiguous_numpy_array(self):
+        self.check_all_backends(
+            dict(a=np.arange(6, dtype=np.uint16)[::2]), dict(a=[0, 2, 4]))
+
+    def test_numpy_scalars(self):
+        self.check_all_backends(
+            [np.int32(3), np.float32(1.5), np.bool_(True), np.uint64(2)],
+            [3, 1.5, True, 2])
+
+    def test_attribute_model(self):
+        attr = NumberArrayMeta("float64").create_attribute_model([1.5, 2.5])
+        self.check_all_backends(attr, json.loads(json_encode(attr)))
+
+    def test_enum(self):
+        self.check_all_backends(dict(a=DummyEnum.BAR), dict(a="bar"))
+
+    def test_table(self):
+        t = DummyTable(np.array([1.5, 2.5]))
+        self.check_all_backends(
+            Delta(id=3, changes=[[["value"], t]]), dict(
+                typeid="malcolm:core/Delta:1.0", id=3, changes=[[["value"], dict(
+                    typeid="malcolm:core/Table:1.0", column=[1.5, 2.5])]]))
+
+    def test_exception(self):
+        self.check_all_backends(
+            Error(id=1, message=ValueError("Bad result")), dict(
+                typeid="malcolm:core/Error:1.0", id=1,
+                message="ValueError: Bad result"))
+
+    def test_big_int(self):
+        self.check_all_backends(dict(a=2 ** 70), dict(a=2 ** 70))
+
+    def test_register_backend(self):
+        register_json_backend("dummy", lambda o: "null")
+        try:
+            set_json_backend("dummy")
+            assert json_encode_message(dict(a=1)) == "null"
+        finally:
+            JSON_BACKENDS.pop("dummy")
+
+    def test_bad_backend(self):
+        with self.assertRaises(ValueError):
+            set_json_backend("not_a_backend")
+
+    def test_json_backend(self):
+        set_json_backend("json")
+        # Compact, and keeps NaN distinct from null
+        assert json_encode_message(dict(a=[1, float("nan")], b=None)) == \
+            '{"a":[1,NaN],"b":null}'
+
+    def test_bad_backend_from_environ(self):
+        with patch.object(serializable.log, "warning") as warning:
+            serializable._set_json_backend_from_environ(
+                dict(PYMALCOLM_JSON_BACKEND="not_a_backend"))
+        warning.assert_called_once()
+        assert serializable._json_dumps is self.dumps
+
+    def test_backend_from_environ(self):
+        serializable._set_json_backend_from_environ(
+            dict(PYMALCOLM_JSON_BACKEND="json"))
+        assert serializable._json_dumps is JSON_BACKENDS["json"]
@@ -1,7 +1,7 @@
 import unittest
 
-from malcolm.core import Queue, Spawned
-from malcolm.core.errors import UnexpectedError
+from malcolm.core import Queue, Spawned, WorkerPool, RLock
+from malcolm.core.errors import UnexpectedError, TimeoutError
 from multiprocessing.pool import ThreadPool
 
 
@@ -39,3 +39,105 @@ class TestSpawned(unittest.TestCase):
         assert self.q.get(1) == UnexpectedError
         with self.assertRaises(UnexpectedError):
             s.get()
+
+    def test_wait_after_finished(self):
+        s = self.do_spawn()
+        assert self.q.get(1) == 20
+        assert s.ready() is True
+        s.wait(0)
+        assert s.get(0) == 20
+
+    def test_spawn_inline(self):
+        s = Spawned(do_div, (40, 2, self.q), {}, inline=True)
+        assert s.ready() is True
+        assert s.get(0) == 20
+        assert self.q.get(0) == 20
+
+
+class TestRLock(unittest.TestCase):
+
+    def setUp(self):
+        self.o = RLock()
+
+    def test_in_use(self):
+        assert not self.o.in_use()
+        with self.o:
+            assert self.o.in_use()
+            with self.o:
+                assert self.o.in_use()
+            assert self.o.in_use()
+        assert not self.o.in_use()
+
+    def test_in_use_while_waiting(self):
+        self.o.acquire()
+        s = Spawned(self.o.acquire, (), {})
+        with self.assertRaises(TimeoutError):
+            s.wait(0.05)
+        self.o.release()
+        assert self.o.in_use()
+        s.wait(1)
+        assert self.o.in_use()
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.o = WorkerPool(size=2)
+        self.q = Queue()
+
+    def tearDown(self):
+        self.o.stop()
+
+    def test_fifo_order(self):
+        spawned = [Spawned(self.q.put, (i,), {}, self.o) for i in range(10)]
+        for s in spawned:
+            s.wait(1)
+        assert [self.q.get(0) for _ in range(10)] == list(range(10))
+        assert self.o.in_flight() == []
+        metrics = self.o.metrics()
+        assert metrics["processed"] == 10
+        assert metrics["max_queue_depth"] == 10
+        assert metrics["queue_depth"] == 0
+        assert metrics["busy"] == 0
+        # Only size workers are started
+        assert metrics["workers"] == 2
+        assert 0 <= metrics["mean_wait"] <= metrics["max_wait"]
+        assert 0 <= metrics["mean_latency"] <= metrics["max_latency"]
+        self.o.metrics(reset=True)
+        assert self.o.metrics()["processed"] == 0
+
+    def test_blocked_worker_doesnt_stop_others(self):
+        blocker = Queue()
+        blocked = Spawned(blocker.get, (1,), {}, self.o)
+        s = Spawned(self.q.put, ("done",), {}, self.o)
+        s.wait(1)
+        assert self.q.get(0) == "done"
+        assert not blocked.ready()
+        assert self.o.in_flight() == [blocked]
+        assert self.o.metrics()["busy"] == 1
+        blocker.put("unblock")
+        assert blocked.get(1) == "unblock"
+
+    def test_reuses_workers(self):
+        Spawned(self.q.put, (1,), {}, self.o).wait(1)
+        assert self.o.metrics()["workers"] == 1
+        Spawned(self.q.put, (2,), {}, self.o).wait(1)
+        assert self.o.metrics()["workers"] == 1
+
+    def test_error(self):
+        s = Spawned(do_div, (1, 0, self.q), {}, self.o)
+        with self.assertRaises(ZeroDivisionError):
+            s.get(1)
+
+    def test_blocked_workers_get_help(self):
+        # The first functions wait for the last one, so would deadlock if
+        # there were only size workers
+        queues = [Queue() for _ in range(5)]
+
+        def put_all():
+            for i, q in enumerate(queues):
+                q.put(i)
+
+        spawned = [Spawned(q.get, (1,), {}, self.o) for q in queues]
+        Spawned(put_all, (), {}, self.o).wait(1)
+        assert [s.get(1) for s in spawned] == [0, 1, 2, 3, 4]
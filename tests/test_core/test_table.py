@@ -58,3 +58,50 @@ class TestTable(unittest.TestCase):
     def test_not_equal(self):
         t2 = MyTable(AA(["x", "y", "z"]), AB(numpy.arange(3) + 1)).to_dict()
         numpy.testing.assert_equal(self.t.to_dict(), t2)
+
+    def test_from_rows_numeric_columns_are_numpy(self):
+        x = MyTable.from_rows([["x", 1], ["y", 2]])
+        assert isinstance(x.b.seq, numpy.ndarray)
+        assert isinstance(x.a.seq, list)
+
+    def test_from_rows_empty(self):
+        x = MyTable.from_rows([])
+        assert list(x.rows()) == []
+        assert len(x.a) == len(x.b) == 0
+
+    def test_from_array(self):
+        x = MyTable.from_array(numpy.array([["x", 1], ["y", 2], ["z", 3]]))
+        assert x.to_dict() == self.serialized
+        assert x.b.seq.dtype == int
+
+    def test_from_array_wrong_shape(self):
+        with self.assertRaises(AssertionError):
+            MyTable.from_array(numpy.arange(3))
+
+    def test_getitem_slice(self):
+        t = self.t[1:]
+        assert isinstance(t, MyTable)
+        assert list(t.rows()) == [["y", 2], ["z", 3]]
+
+    def test_append_extend(self):
+        self.t.append(["w", 4])
+        self.t.extend([["v", 5], ["u", 6]])
+        assert list(self.t.a) == ["x", "y", "z", "w", "v", "u"]
+        assert list(self.t.b) == [1, 2, 3, 4, 5, 6]
+        assert self.t[5] == ["u", 6]
+
+    def test_column_lengths_checked_after_set(self):
+        assert self.t[0] == ["x", 1]
+        self.t.b = AB([1, 2])
+        with self.assertRaises(AssertionError):
+            self.t[0]
+
+    def test_rows_large(self):
+        n = 10000
+        x = MyTable(AA(["x"] * n), AB(numpy.arange(n)))
+        rows = list(x.rows())
+        assert len(rows) == n
+        assert rows[-1] == ["x", n - 1]
+        assert type(rows[-1][1]) == int
+        y = MyTable.from_rows(rows)
+        numpy.testing.assert_equal(y.b.seq, x.b.seq)
@@ -1,7 +1,7 @@
 import unittest
 
 from annotypes import Anno, add_call_types
-from mock import Mock
+from mock import Mock, MagicMock
 
 from malcolm.core import Attribute, StringMeta, BlockModel, Process, \
     MethodModel, Part, Controller
@@ -46,8 +46,8 @@ class TestBlock(unittest.TestCase):
         self.data = BlockModel()
         self.data.set_endpoint_data("attr", StringMeta().create_attribute_model())
         self.data.set_endpoint_data("method", MethodModel())
-        self.data.set_notifier_path(Mock(), ["block"])
-        self.controller = Mock()
+        self.data.set_notifier_path(MagicMock(), ["block"])
+        self.controller = Mock(_view_subclasses={})
         self.context = Mock()
         self.o = make_view(self.controller, self.context, self.data)
 
@@ -58,16 +58,41 @@ class TestBlock(unittest.TestCase):
 
     def test_put_attribute_values(self):
         self.o.put_attribute_values(dict(attr=43))
-        self.context.put_async.assert_called_once_with(
-            ["block", "attr", "value"], 43)
+        self.context.put_many_async.assert_called_once_with(
+            ["block"], dict(attr=43))
         self.context.wait_all_futures.assert_called_once_with(
-            [self.context.put_async.return_value],
+            [self.context.put_many_async.return_value],
             timeout=None, event_timeout=None)
 
     def test_async_call(self):
         self.o.method_async(a=3)
         self.o.method.post_async.assert_called_once_with(a=3)
 
+    def test_view_class_reused(self):
+        o2 = make_view(self.controller, Mock(), self.data)
+        assert type(o2) is type(self.o)
+        assert o2._context is not self.o._context
+
+    def test_view_class_changes_with_fields(self):
+        self.data.set_endpoint_data(
+            "attr2", StringMeta().create_attribute_model())
+        o2 = make_view(self.controller, self.context, self.data)
+        assert type(o2) is not type(self.o)
+        assert hasattr(o2, "attr2")
+        assert not hasattr(type(self.o), "attr2")
+        # Replacing an Attribute with a Method adds an _async method
+        self.data.set_endpoint_data("attr", MethodModel())
+        o3 = make_view(self.controller, self.context, self.data)
+        assert hasattr(o3, "attr_async")
+        assert not hasattr(type(o2), "attr_async")
+        # Only the subclass for the current structure is kept
+        assert list(self.controller._view_subclasses.values()) == [type(o3)]
+
+    def test_view_class_per_controller(self):
+        controller = Mock(_view_subclasses={})
+        o2 = make_view(controller, self.context, self.data)
+        assert type(o2) is not type(self.o)
+
 
 with Anno("A Param"):
     AParam = str
@@ -112,7 +137,7 @@ class TestView(unittest.TestCase):
     def setUp(self):
         self.data = BlockMeta()
         self.data.set_notifier_path(Mock(), ["block", "meta"])
-        self.controller = Mock()
+        self.controller = Mock(_view_subclasses={})
         self.context = Mock()
         self.o = make_view(self.controller, self.context, self.data)
 
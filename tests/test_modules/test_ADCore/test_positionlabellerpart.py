@@ -1,10 +1,14 @@
-from mock import MagicMock, call
+from xml.etree import cElementTree as ET
+
+from mock import MagicMock, call, patch
 
 from scanpointgenerator import LineGenerator, CompoundGenerator
 
 from malcolm.core import Context, Process, Future
 from malcolm.modules.ADCore.blocks import position_labeller_block
 from malcolm.modules.ADCore.parts import PositionLabellerPart
+from malcolm.modules.ADCore.parts.positionlabellerpart import XML_MAX_SIZE
+from malcolm.modules.ADCore.util import generator_indexes
 from malcolm.testutil import ChildTestCase
 
 
@@ -74,6 +78,8 @@ class TestPositionLabellerPart(ChildTestCase):
         ys = LineGenerator("y", "mm", 0.0, 0.1, 2)
         self.o.generator = CompoundGenerator([ys, xs], [], [])
         self.o.generator.prepare()
+        # Loaded 2 positions last time
+        self.o.load_ahead = 2
         self.o.load_more_positions(current_index, child)
         expected_xml = """<?xml version="1.0" ?>
 <pos_layout>
@@ -89,3 +95,62 @@ class TestPositionLabellerPart(ChildTestCase):
 </pos_layout>""".replace("\n", "")
         assert child.mock_calls == [call.xml.put_value(expected_xml)]
         assert self.o.end_index == 6
+
+    def assert_positions_match(self, xml, generator, start_index):
+        positions = ET.fromstring(xml).find("positions")
+        for i, position_el in enumerate(positions, start_index):
+            point = generator.get_point(i)
+            expected = dict(FilePluginClose="%d" % (i == generator.size - 1))
+            for j, value in enumerate(point.indexes):
+                expected["d%d" % j] = str(value)
+            assert position_el.attrib == expected
+        return len(positions)
+
+    def test_generator_indexes(self):
+        zs = LineGenerator("z", "mm", 0.0, 1.0, 3)
+        ys = LineGenerator("y", "mm", 0.0, 0.1, 4, alternate=True)
+        xs = LineGenerator("x", "mm", 0.0, 0.5, 5, alternate=True)
+        generator = CompoundGenerator([zs, ys, xs], [], [])
+        generator.prepare()
+        indexes = generator_indexes(generator, 3, generator.size)
+        assert indexes.shape == (generator.size - 3, 3)
+        for i, row in enumerate(indexes.tolist(), 3):
+            assert row == generator.get_point(i).indexes
+
+    def test_generator_indexes_slow(self):
+        ys = LineGenerator("y", "mm", 0.0, 0.1, 4, alternate=True)
+        xs = LineGenerator("x", "mm", 0.0, 0.5, 5, alternate=True)
+        generator = CompoundGenerator([ys, xs], [], [])
+        generator.prepare()
+        expected = generator_indexes(generator, 2, 12)
+        with patch("malcolm.modules.scanning.util."
+                   "generator_dimension_indexes", return_value=None):
+            indexes = generator_indexes(generator, 2, 12)
+        assert indexes.tolist() == expected.tolist()
+
+    def test_configure_fills_xml(self):
+        xs = LineGenerator("x", "mm", 0.0, 0.5, 300, alternate=True)
+        ys = LineGenerator("y", "mm", 0.0, 0.1, 100)
+        generator = CompoundGenerator([ys, xs], [], [])
+        generator.prepare()
+        self.o.configure(self.context, 0, generator.size, generator)
+        self.o.start_future.result(timeout=1)
+        xml = self.child.handled_requests.mock_calls[3][1][1]
+        # As many positions as will fit
+        assert XML_MAX_SIZE - 60 < len(xml) < XML_MAX_SIZE
+        assert self.assert_positions_match(xml, generator, 0) == \
+            self.o.end_index == self.o.load_ahead
+        # And the rest are ready to go
+        next_xml, next_end_index = self.o.next_xml
+        assert next_end_index == generator.size
+        assert self.assert_positions_match(
+            next_xml, generator, self.o.end_index) == \
+            generator.size - self.o.end_index
+        # Which we load when the plugin has less than we sent last time
+        child = MagicMock()
+        self.o.load_more_positions(self.o.load_ahead, child)
+        assert child.mock_calls == []
+        self.o.load_more_positions(self.o.load_ahead - 1, child)
+        assert child.mock_calls == [call.xml.put_value(next_xml)]
+        assert self.o.end_index == generator.size
+        assert self.o.next_xml is None
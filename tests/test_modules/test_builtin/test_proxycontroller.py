@@ -1,8 +1,10 @@
 import unittest
-from mock import MagicMock
+from mock import MagicMock, patch
+
+import cothread
 
 from malcolm.modules.builtin.controllers import ProxyController
-from malcolm.core import Process
+from malcolm.core import Process, AlarmSeverity
 
 
 class TestProxyController(unittest.TestCase):
@@ -19,3 +21,68 @@ class TestProxyController(unittest.TestCase):
         assert self.o.mri == "mri"
         assert self.o.comms == "comms"
         assert self.o.client_comms is None
+        assert self.o.lazy is False
+
+
+@patch("malcolm.modules.builtin.controllers.proxycontroller."
+       "wait_for_stateful_block_init")
+class TestLazyProxyController(unittest.TestCase):
+
+    def setUp(self):
+        self.process = Process("proc")
+        self.comms = MagicMock()
+        # Not added with add_controller() so it isn't hooked
+        self.process._controllers["comms"] = self.comms
+        self.o = ProxyController(mri="mri", comms="comms", lazy=True)
+        self.process.add_controller(self.o)
+
+    def tearDown(self):
+        self.process.stop(timeout=1)
+
+    def test_start_does_not_wait(self, wait):
+        wait.side_effect = lambda context, mri: cothread.Sleep(0.1)
+        self.process.start()
+        assert self.o.health.value == "Connecting"
+        self.comms.sync_proxies.assert_not_called()
+        self.o.block_view()
+        self.comms.sync_proxies.assert_called_once_with(
+            {"mri": self.o._block})
+        # The background sync did it, so it's not done again
+        self.o.block_view()
+        self.comms.sync_proxies.assert_called_once_with(
+            {"mri": self.o._block})
+        self.comms.sync_proxy.assert_not_called()
+
+    def test_start_batches_syncs(self, wait):
+        o2 = ProxyController(mri="mri2", comms="comms", lazy=True)
+        self.process.add_controller(o2)
+        self.process.start()
+        self.o.block_view()
+        o2.block_view()
+        self.comms.sync_proxies.assert_called_once_with(
+            {"mri": self.o._block, "mri2": o2._block})
+
+    def test_batched_sync_fails(self, wait):
+        self.comms.sync_proxies.side_effect = ValueError("Bad")
+        o2 = ProxyController(mri="mri2", comms="comms", lazy=True)
+        self.process.add_controller(o2)
+        self.process.start()
+        # Let the background syncs run, o2 needs a second go to be woken
+        cothread.Yield()
+        cothread.Yield()
+        assert self.o.health.value == "Not connected: Bad"
+        assert o2.health.value == "Not connected: Bad"
+
+    def test_background_sync_fails(self, wait):
+        wait.side_effect = ValueError("Bad")
+        self.process.start()
+        # Let the background sync run
+        cothread.Yield()
+        assert self.o.health.value == "Not connected: Bad"
+        assert self.o.health.alarm.severity == AlarmSeverity.UNDEFINED_ALARM
+        # Accessing the block tries again
+        with self.assertRaises(ValueError):
+            self.o.block_view()
+        wait.side_effect = None
+        self.o.block_view()
+        self.comms.sync_proxy.assert_called_once_with("mri", self.o._block)
@@ -2,6 +2,8 @@ import unittest
 from mock import patch, ANY
 
 import numpy as np
+from cothread.cadef import ECA_TIMEOUT
+from cothread.catools import ca_nothing
 
 from malcolm.core import AlarmSeverity, Process, Widget
 from malcolm.modules.builtin.controllers import StatefulController
@@ -39,7 +41,7 @@ class TestCAParts(unittest.TestCase):
         assert b.attrname.meta.writeable
         catools.caget.assert_called_once_with(
             ["pv2", 'pv'], datatype=catools.DBR_LONG,
-            format=catools.FORMAT_CTRL)
+            format=catools.FORMAT_CTRL, throw=False)
         catools.caget.reset_mock()
 
         class Update(int):
@@ -73,7 +75,7 @@ class TestCAParts(unittest.TestCase):
         assert b.cattr.alarm.severity == AlarmSeverity.MINOR_ALARM
         catools.caget.assert_called_once_with(
             ["pvr"], datatype=catools.DBR_CHAR_STR,
-            format=catools.FORMAT_CTRL)
+            format=catools.FORMAT_CTRL, throw=False)
 
     def test_cachoice(self, catools):
         from malcolm.modules.ca.parts import CAChoicePart
@@ -91,7 +93,7 @@ class TestCAParts(unittest.TestCase):
         assert b.attrname.meta.writeable
         catools.caget.assert_called_once_with(
             ["rbv", 'pv'], datatype=catools.DBR_ENUM,
-            format=catools.FORMAT_CTRL)
+            format=catools.FORMAT_CTRL, throw=False)
         catools.caget.reset_mock()
 
         class Update(int):
@@ -138,7 +140,7 @@ class TestCAParts(unittest.TestCase):
         assert b.attrname.meta.writeable
         catools.caget.assert_called_once_with(
             ["pv"], datatype=catools.DBR_DOUBLE,
-            format=catools.FORMAT_CTRL)
+            format=catools.FORMAT_CTRL, throw=False)
         catools.caget.reset_mock()
 
         class Update(np.ndarray):
@@ -171,7 +173,7 @@ class TestCAParts(unittest.TestCase):
         assert not b.attrname.meta.writeable
         catools.caget.assert_called_once_with(
             ['pv'], datatype=catools.DBR_DOUBLE,
-            format=catools.FORMAT_CTRL)
+            format=catools.FORMAT_CTRL, throw=False)
 
         l = []
         b.attrname.subscribe_value(l.append)
@@ -180,9 +182,10 @@ class TestCAParts(unittest.TestCase):
 
         catools.camonitor.assert_called_once()
         callback = catools.camonitor.call_args[0][1]
-        callback(Initial(8.7))
-        callback(Initial(8.8))
-        assert b.attrname.value == 8.8
+        callback(Initial(8.7), 0)
+        callback(Initial(8.8), 0)
+        # The second update is held back until min_delta is up
+        assert b.attrname.value == 8.7
 
         # TODO: why does this seg fault on travis VMs when cothread is
         # stack sharing?
@@ -207,7 +210,7 @@ class TestCAParts(unittest.TestCase):
         assert b.attrname.meta.writeable
         catools.caget.assert_called_once_with(
             ["pv"], datatype=catools.DBR_LONG,
-            format=catools.FORMAT_CTRL)
+            format=catools.FORMAT_CTRL, throw=False)
         catools.caget.reset_mock()
 
         class Update(np.ndarray):
@@ -243,7 +246,7 @@ class TestCAParts(unittest.TestCase):
         assert b.attrname.meta.writeable
         catools.caget.assert_called_once_with(
             ['pv'], datatype=catools.DBR_LONG,
-            format=catools.FORMAT_CTRL)
+            format=catools.FORMAT_CTRL, throw=False)
 
     def test_castring(self, catools):
         from malcolm.modules.ca.parts import CAStringPart
@@ -260,7 +263,7 @@ class TestCAParts(unittest.TestCase):
         assert not b.attrname.meta.writeable
         catools.caget.assert_called_once_with(
             ['pv'], datatype=catools.DBR_STRING,
-            format=catools.FORMAT_CTRL)
+            format=catools.FORMAT_CTRL, throw=False)
 
     def test_init_no_pv_no_rbv(self, catools):
         from malcolm.modules.ca.parts import CABooleanPart
@@ -269,3 +272,78 @@ class TestCAParts(unittest.TestCase):
         with self.assertRaises(ValueError):
             CABooleanPart(name="attrname", description="desc")
 
+
+    def test_pooled_connect(self, catools):
+        from malcolm.modules.ca.parts import CADoublePart, CALongPart
+
+        class Initial(float):
+            ok = True
+            severity = 0
+
+        def caget(pvs, **kwargs):
+            # This is what caget(throw=False) gives for a pv that fails
+            return [ca_nothing(pv, ECA_TIMEOUT) if pv == "bad" else Initial(i)
+                    for i, pv in enumerate(pvs)]
+
+        catools.caget.side_effect = caget
+        c = StatefulController("mri")
+        for name, rbv in (("a", "pva"), ("b", "pvb"), ("c", "bad")):
+            c.add_part(CADoublePart(name=name, description="", rbv=rbv))
+        c.add_part(CALongPart(name="d", description="", rbv="pvd"))
+        self.process.add_controller(c)
+        b = self.process.block_view("mri")
+        # One caget and camonitor for each datatype
+        assert catools.caget.call_count == 2
+        catools.caget.assert_any_call(
+            ["pva", "pvb", "bad"], datatype=catools.DBR_DOUBLE,
+            format=catools.FORMAT_CTRL, throw=False)
+        catools.caget.assert_any_call(
+            ["pvd"], datatype=catools.DBR_LONG,
+            format=catools.FORMAT_CTRL, throw=False)
+        assert catools.camonitor.call_count == 2
+        catools.camonitor.assert_any_call(
+            ["pva", "pvb"], ANY, datatype=catools.DBR_DOUBLE,
+            format=catools.FORMAT_TIME, notify_disconnect=True)
+        # The one that failed to connect only faults its own part
+        assert b.a.value == 0
+        assert b.b.value == 1
+        assert b.d.value == 0
+        assert b.state.value == "Fault"
+        assert b.health.value == \
+            "bad: User specified timeout on IO operation expired"
+        # Monitor updates go to the right attribute
+        callback = catools.camonitor.call_args_list[0][0][1]
+        if catools.camonitor.call_args_list[0][0][0] != ["pva", "pvb"]:
+            callback = catools.camonitor.call_args_list[1][0][1]
+        callback(Initial(3.5), 1)
+        assert b.b.value == 3.5
+        assert b.a.value == 0
+
+    def test_connect_per_controller(self, catools):
+        from malcolm.modules.ca.parts import CADoublePart
+
+        class Initial(float):
+            ok = True
+            severity = 0
+
+        catools.caget.side_effect = lambda pvs, **kwargs: [
+            Initial(i) for i, _ in enumerate(pvs)]
+        process = Process("proc2")
+        for mri in ("mri1", "mri2"):
+            c = StatefulController(mri)
+            c.add_part(CADoublePart(name="a", description="", rbv=mri + "a"))
+            c.add_part(CADoublePart(name="b", description="", rbv=mri + "b"))
+            process.add_controller(c)
+        process.start()
+        try:
+            # Each controller's attributes are connected separately, so one
+            # can't be held up by the other
+            assert catools.caget.call_count == 2
+            catools.caget.assert_any_call(
+                ["mri1a", "mri1b"], datatype=catools.DBR_DOUBLE,
+                format=catools.FORMAT_CTRL, throw=False)
+            catools.caget.assert_any_call(
+                ["mri2a", "mri2b"], datatype=catools.DBR_DOUBLE,
+                format=catools.FORMAT_CTRL, throw=False)
+        finally:
+            process.stop(timeout=2)
@@ -0,0 +1,50 @@
+import unittest
+
+from malcolm.core import NumberMeta, sleep
+from malcolm.modules.ca.util import CAAttribute
+
+
+class Value(float):
+    ok = True
+    severity = 0
+
+
+class TestCAAttributeThrottle(unittest.TestCase):
+    def setUp(self):
+        self.o = CAAttribute(
+            NumberMeta("float64"), datatype=None, rbv="pv", min_delta=0.1)
+
+    def test_first_update_is_immediate(self):
+        self.o._monitor_callback(Value(1))
+        assert self.o.attr.value == 1
+        assert self.o._flush_timer is None
+
+    def test_keeps_latest_pending(self):
+        for i in range(5):
+            self.o._monitor_callback(Value(i))
+        # First applied, second pending, the rest replaced it
+        assert self.o.attr.value == 0
+        assert self.o.conflated == 3
+        sleep(0.15)
+        assert self.o.attr.value == 4
+        assert self.o._flush_timer is None
+        # Still within min_delta of the flush
+        self.o._monitor_callback(Value(5))
+        assert self.o.attr.value == 4
+        sleep(0.15)
+        assert self.o.attr.value == 5
+
+    def test_disconnect_drops_pending(self):
+        self.o._monitor_callback(Value(1))
+        self.o._monitor_callback(Value(2))
+        self.o.disconnect()
+        sleep(0.15)
+        assert self.o.attr.value == 1
+        assert self.o._pending is None
+
+    def test_no_min_delta(self):
+        self.o.min_delta = 0
+        self.o._monitor_callback(Value(1))
+        self.o._monitor_callback(Value(2))
+        assert self.o.attr.value == 2
+        assert self.o.conflated == 0
@@ -1,7 +1,11 @@
 from collections import OrderedDict
+import os
+import timeit
 import unittest
 from mock import Mock
 
+import numpy as np
+
 from malcolm.core import Table, BooleanArrayMeta, NumberArrayMeta, TableMeta, \
     ChoiceArrayMeta
 from malcolm.modules.pandablocks.pandablocksclient import TableFieldData
@@ -65,6 +69,118 @@ class PandABoxTablePartTest(unittest.TestCase):
         assert list(table.triggerMask) == [True, False, False]
         assert list(table.timePhA) == [4294967295, 1, 0]
 
+    def test_list_from_table_too_big(self):
+        # Make it directly as from_rows would cast to uint8
+        table = self.meta.table_cls(
+            nrepeats=[32, 256], switch=["b", "b"], triggerMask=[True, False],
+            timePhA=[4294967295, 1])
+        with self.assertRaises(AssertionError) as cm:
+            self.o.list_from_table(table)
+        assert str(cm.exception) == "Expected nrepeats[1] < 256, got 256"
+
+    def test_list_from_table_bad_label(self):
+        table = self.meta.table_cls.from_rows([[32, "B", True, 1]])
+        with self.assertRaises(ValueError):
+            self.o.list_from_table(table)
+
+
+def loop_list_from_table(field_data, table, nconsume):
+    # The original row by row implementation, used as a reference
+    int_values = []
+    for row in table.rows():
+        int_value = 0
+        for name, value in zip(table.call_types, row):
+            if field_data[name].labels:
+                field_value = field_data[name].labels.index(value)
+            else:
+                field_value = int(value)
+            int_value |= field_value << field_data[name].bits_lo
+        for i in range(nconsume):
+            int_values.append(int_value & (2 ** 32 - 1))
+            int_value = int_value >> 32
+    return int_values
+
+
+def loop_table_from_list(field_data, int_values, nconsume):
+    # The original row by row implementation, used as a reference
+    rows = []
+    for i in range(int(len(int_values) / nconsume)):
+        int_value = 0
+        for c in range(nconsume):
+            int_value += int(int_values[i * nconsume + c]) << (32 * c)
+        row = []
+        for name, f in field_data.items():
+            mask = 2 ** (f.bits_hi + 1) - 1
+            field_value = (int_value & mask) >> f.bits_lo
+            if f.labels:
+                row.append(f.labels[field_value])
+            else:
+                row.append(field_value)
+        rows.append(row)
+    return rows
+
+
+class PandABoxTablePartBenchmarkTest(unittest.TestCase):
+    nrows = 4096
+
+    def setUp(self):
+        self.client = Mock()
+        fields = OrderedDict()
+        fields["REPEATS"] = TableFieldData(15, 0, "Num Repeats", None)
+        fields["TRIGGER"] = TableFieldData(19, 16, "Choices", [
+            "Immediate", "BITA=0", "BITA=1", "BITB=0", "BITB=1"])
+        # These straddle word boundaries
+        fields["STRADDLE"] = TableFieldData(43, 20, "Straddle", None)
+        fields["OUTA1"] = TableFieldData(44, 44, "Out A1", None)
+        fields["WIDE"] = TableFieldData(112, 49, "Wide", None)
+        fields["TIME2"] = TableFieldData(159, 128, "Time 2", None)
+        self.client.get_table_fields.return_value = fields
+        self.meta = TableMeta("Seq table", writeable=True)
+        self.o = PandABlocksTablePart(
+            self.client, self.meta,
+            block_name="SEQ1", field_name="TABLE")
+        rs = np.random.RandomState(42)
+        self.table = self.meta.validate(dict(
+            repeats=rs.randint(2 ** 16, size=self.nrows).astype(np.uint16),
+            trigger=[fields["TRIGGER"].labels[i]
+                     for i in rs.randint(5, size=self.nrows)],
+            straddle=rs.randint(2 ** 24, size=self.nrows).astype(np.uint32),
+            outa1=rs.randint(2, size=self.nrows).astype(bool),
+            wide=rs.randint(2 ** 63, size=self.nrows, dtype=np.uint64) * 2 + 1,
+            time2=rs.randint(2 ** 32, size=self.nrows, dtype=np.uint64).astype(
+                np.uint32),
+        ))
+
+    def test_matches_loop(self):
+        field_data = self.o.field_data
+        nconsume = self.o._calc_nconsume()
+        expected = loop_list_from_table(field_data, self.table, nconsume)
+        int_values = self.o.list_from_table(self.table)
+        assert int_values == expected
+        str_values = [str(x) for x in int_values]
+        expected = loop_table_from_list(field_data, str_values, nconsume)
+        table = self.o.table_from_list(str_values)
+        assert [list(row) for row in table.rows()] == expected
+
+    @unittest.skipUnless(os.environ.get("PYMALCOLM_BENCHMARK"),
+                         "set PYMALCOLM_BENCHMARK=1 to run benchmarks")
+    def test_benchmark(self):
+        field_data = self.o.field_data
+        nconsume = self.o._calc_nconsume()
+        str_values = [str(x) for x in self.o.list_from_table(self.table)]
+        timings = [
+            ("list_from_table", lambda: self.o.list_from_table(self.table)),
+            ("loop_list_from_table", lambda: loop_list_from_table(
+                field_data, self.table, nconsume)),
+            ("table_from_list", lambda: self.o.table_from_list(str_values)),
+            ("loop_table_from_list", lambda: loop_table_from_list(
+                field_data, str_values, nconsume)),
+        ]
+        print("\n%d rows:" % self.nrows)
+        for name, func in timings:
+            t = min(timeit.repeat(func, number=1, repeat=5))
+            print("%25s: %.2fms" % (name, t * 1000))
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
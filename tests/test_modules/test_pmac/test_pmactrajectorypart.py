@@ -1,5 +1,10 @@
+import json
+import os
+from collections import OrderedDict
+
 from mock import Mock, call, patch
 
+import numpy as np
 from scanpointgenerator import LineGenerator, CompoundGenerator
 import pytest
 
@@ -9,6 +14,11 @@ from malcolm.modules.pmac.infos import MotorInfo, ControllerInfo, CSInfo
 from malcolm.modules.pmac.blocks import pmac_trajectory_block, cs_block
 from malcolm.testutil import ChildTestCase
 
+# Gaps made one at a time by MotorInfo.make_velocity_profile() before the gap
+# calculations were batched
+GAP_PROFILES = os.path.join(
+    os.path.dirname(__file__), "fixtures", "gap_profiles.json")
+
 
 class TestPMACTrajectoryPart(ChildTestCase):
     def setUp(self):
@@ -29,10 +39,12 @@ class TestPMACTrajectoryPart(ChildTestCase):
     def test_init(self):
         registrar = Mock()
         self.o.setup(registrar)
-        registrar.add_attribute_model.assert_called_once_with(
-            "minTurnaround", self.o.min_turnaround,
-            self.o.min_turnaround.set_value
-        )
+        assert registrar.add_attribute_model.mock_calls == [
+            call("minTurnaround", self.o.min_turnaround,
+                 self.o.min_turnaround.set_value),
+            call("lookahead", self.o.lookahead, self.o.lookahead.set_value),
+            call("bufferHeadroom", self.o.buffer_headroom),
+        ]
 
     def test_bad_units(self):
         with self.assertRaises(AssertionError) as cm:
@@ -193,6 +205,46 @@ class TestPMACTrajectoryPart(ChildTestCase):
         assert len(self.o.completed_steps_lookup) == 9
         assert len(self.o.profile["time_array"]) == 1
 
+    @patch("malcolm.modules.pmac.parts.pmactrajectorypart.PROFILE_POINTS", 4)
+    @patch("malcolm.modules.pmac.parts.pmactrajectorypart.INTERPOLATE_INTERVAL",
+           0.2)
+    def test_run_calculates_ahead(self):
+        # Pretend to respond on demand values before they are actually set
+        self.set_attributes(self.cs, demandA=-0.1375, demandB=0.0)
+        self.do_configure(axes_to_scan=["x", "y"], x_pos=0.0, y_pos=0.2)
+        assert len(self.o.completed_steps_lookup) == 5
+        assert self.o.buffer_headroom.value == 4
+        # Pretend we have scanned all the points we will calculate
+        self.set_attributes(self.child, pointsScanned=9)
+        self.child.handled_requests.reset_mock()
+        with patch.object(self.o, "update_step"):
+            self.o.run(self.context)
+        # The next batch has been calculated, but not sent
+        assert self.child.handled_requests.mock_calls == [
+            call.post('executeProfile')]
+        assert len(self.o.batches) == 1
+        assert len(self.o.completed_steps_lookup) == 9
+        # So update_step sends it
+        self.child.handled_requests.reset_mock()
+        self.o.registrar = Mock()
+        self.o.update_step(3, self.context.block_view("PMAC:TRAJ"))
+        assert self.child.handled_requests.mock_calls == [
+            call.put('pointsToBuild', 4),
+            call.put('positionsA', pytest.approx([
+                0.375, 0.5, 0.625, 0.6375])),
+            call.put('positionsB', pytest.approx([
+                0.0, 0.0, 0.0, 0.05])),
+            call.put('timeArray', pytest.approx([
+                500000, 500000, 500000, 200000])),
+            call.put('userPrograms', pytest.approx([
+                1, 4, 2, 8])),
+            call.put('velocityMode', pytest.approx([
+                0, 0, 1, 0])),
+            call.post('appendProfile')]
+        assert len(self.o.batches) == 0
+        assert len(self.o.completed_steps_lookup) == 9
+        assert self.o.buffer_headroom.value == 5
+
     def test_run(self):
         self.o.run(self.context)
         assert self.child.handled_requests.mock_calls == [
@@ -323,3 +375,105 @@ class TestPMACTrajectoryPart(ChildTestCase):
         assert self.o.completed_steps_lookup == (
             [3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 6, 6])
 
+
+    def test_time_ticks_carry_rounding(self):
+        child = Mock()
+        self.o.axis_mapping = {}
+        self.o.write_profile_points(
+            child, [0.0000015] * 4 + [0.0000014], [0] * 5, [0] * 5, {})
+        attr_dict = child.put_attribute_values.call_args[0][0]
+        assert list(attr_dict["timeArray"]) == [1, 2, 1, 2, 1]
+
+    def build_whole_profile(self, generator, steps):
+        # Calculate and write all the batches of a scan
+        child = Mock()
+        self.o.generator = generator
+        part_info = self.make_part_info()
+        self.o.axis_mapping = dict(
+            x=part_info["xpart"][0], y=part_info["ypart"][0])
+        self.o.steps_up_to = steps
+        self.o.completed_steps_lookup = []
+        self.o.profile = self.o.empty_profile()
+        self.o.calculate_generator_profile(0, do_run_up=True)
+        self.o.profile = self.o.write_profile_points(child, **self.o.profile)
+        while self.o.more_to_calculate():
+            child.put_attribute_values(self.o.calculate_batch())
+        ret = {}
+        for c in child.put_attribute_values.mock_calls:
+            attr_dict = c[1][0]
+            for k, v in attr_dict.items():
+                if k != "pointsToBuild":
+                    ret[k] = np.concatenate((ret.get(k, []), v))
+        return ret
+
+    def test_batches_match_single_build(self):
+        xs = LineGenerator("x", "mm", 0.0, 0.5, 50, alternate=True)
+        ys = LineGenerator("y", "mm", 0.0, 0.1, 20)
+        generator = CompoundGenerator([ys, xs], [], [], 0.05)
+        generator.prepare()
+        expected = self.build_whole_profile(generator, 1000)
+        expected_lookup = self.o.completed_steps_lookup
+        # 50 points in each row, 100 profile points for each row plus a gap
+        assert len(expected["timeArray"]) > 2000
+        assert expected_lookup[-1] == 1000
+        for profile_points in (7, 100, 1001):
+            with patch("malcolm.modules.pmac.parts.pmactrajectorypart."
+                       "PROFILE_POINTS", profile_points):
+                actual = self.build_whole_profile(generator, 1000)
+            assert self.o.completed_steps_lookup == expected_lookup
+            assert sorted(actual) == sorted(expected)
+            for k, v in expected.items():
+                if k == "timeArray":
+                    # Rounding is carried within a batch, not between them
+                    assert np.abs(actual[k] - v).max() <= 1
+                    assert abs(actual[k].sum() - v.sum()) <= \
+                        len(v) / profile_points
+                else:
+                    assert np.array_equal(actual[k], v), k
+
+    def test_make_gaps_matches_fixture(self):
+        with open(GAP_PROFILES) as f:
+            cases = json.load(f)
+        # Batch up the cases that can share the same motor setup
+        groups = OrderedDict()
+        for case in cases:
+            key = json.dumps(
+                [case["motors"], case["min_turnaround"]], sort_keys=True)
+            groups.setdefault(key, []).append(case)
+        for group in groups.values():
+            self.o.axis_mapping = {}
+            for axis_name, cs_axis in (("x", "A"), ("y", "B")):
+                motor = group[0]["motors"][axis_name]
+                self.o.axis_mapping[axis_name] = MotorInfo(
+                    cs_axis=cs_axis,
+                    cs_port="CS1",
+                    acceleration=motor["acceleration"],
+                    resolution=0.001,
+                    offset=0.0,
+                    max_velocity=motor["max_velocity"],
+                    current_position=0.0,
+                    scannable=axis_name,
+                    velocity_settle=motor["velocity_settle"],
+                    units="mm")
+            self.o.min_turnaround.set_value(group[0]["min_turnaround"])
+
+            def batch(name):
+                return {k: np.array([c[name][k] for c in group])
+                        for k in ("x", "y")}
+
+            counts, time_array, velocity_mode, user_programs, trajectory = \
+                self.o.make_gaps(
+                    batch("start_positions"), batch("start_velocities"),
+                    batch("end_positions"), batch("end_velocities"))
+            assert counts.tolist() == [len(c["time_array"]) for c in group]
+            ends = np.cumsum(counts)
+            for case, start, end in zip(group, ends - counts, ends):
+                assert time_array[start:end] == pytest.approx(
+                    case["time_array"], rel=1e-8)
+                assert velocity_mode[start:end].tolist() == \
+                    case["velocity_mode"]
+                assert user_programs[start:end].tolist() == \
+                    case["user_programs"]
+                for k in ("x", "y"):
+                    assert trajectory[k][start:end] == pytest.approx(
+                        case["trajectory"][k], abs=1e-8)
@@ -0,0 +1,161 @@
+import unittest
+
+import numpy as np
+import pytest
+from mock import MagicMock, patch
+from scanpointgenerator import LineGenerator, CompoundGenerator, \
+    CircularROI, ROIExcluder, RandomOffsetMutator
+
+from malcolm.modules.pmac.infos import MotorInfo
+from malcolm.modules.pmac.util import generator_points, \
+    make_velocity_profiles, velocity_profile_distances
+
+
+class TestGeneratorPoints(unittest.TestCase):
+    def assert_matches_get_point(self, generator, axes):
+        generator.prepare()
+        start, end = 1, generator.size - 1
+        lower, positions, upper = generator_points(
+            generator, start, end, axes)
+        for i in range(start, end):
+            point = generator.get_point(i)
+            for axis in axes:
+                assert lower[axis][i - start] == point.lower[axis]
+                assert positions[axis][i - start] == point.positions[axis]
+                assert upper[axis][i - start] == point.upper[axis]
+
+    def test_snake(self):
+        zs = LineGenerator("z", "mm", 0, 1, 3)
+        ys = LineGenerator("y", "mm", 0, 1, 4, alternate=True)
+        xs = LineGenerator("x", "mm", 0, 1, 5, alternate=True)
+        generator = CompoundGenerator([zs, ys, xs], [], [], 0.1)
+        self.assert_matches_get_point(generator, ["x", "y", "z"])
+
+    def test_not_continuous(self):
+        ys = LineGenerator("y", "mm", 0, 1, 4)
+        xs = LineGenerator("x", "mm", 0, 1, 5, alternate=True)
+        generator = CompoundGenerator([ys, xs], [], [], 0.1, continuous=False)
+        self.assert_matches_get_point(generator, ["x", "y"])
+
+    def test_excluder(self):
+        zs = LineGenerator("z", "mm", 0, 1, 3)
+        ys = LineGenerator("y", "mm", 0, 1, 10, alternate=True)
+        xs = LineGenerator("x", "mm", 0, 1, 10, alternate=True)
+        excluder = ROIExcluder([CircularROI([0.5, 0.5], 0.4)], ["x", "y"])
+        generator = CompoundGenerator([zs, ys, xs], [excluder], [], 0.1)
+        self.assert_matches_get_point(generator, ["x", "y"])
+
+    def test_mutator(self):
+        ys = LineGenerator("y", "mm", 0, 1, 4)
+        xs = LineGenerator("x", "mm", 0, 1, 5)
+        mutator = RandomOffsetMutator(1, ["x"], dict(x=0.1))
+        generator = CompoundGenerator([ys, xs], [], [mutator], 0.1)
+        self.assert_matches_get_point(generator, ["x", "y"])
+
+    def test_no_private_attributes(self):
+        # Like a scanpointgenerator that has neither get_points() nor the
+        # private attributes we use
+        generator = MagicMock(spec=["mutators"])
+        generator.mutators = []
+        with patch("malcolm.modules.pmac.util._generator_points_slow") as slow:
+            ret = generator_points(generator, 0, 20, ["x"])
+        slow.assert_called_once_with(generator, 0, 20, ["x"])
+        assert ret is slow.return_value
+
+    def test_get_points(self):
+        generator = MagicMock()
+        points = generator.get_points.return_value
+        points.lower = dict(x=[0.5, 1.5], y=[1, 1])
+        points.positions = dict(x=[1, 2], y=[1, 1])
+        points.upper = dict(x=[1.5, 2.5], y=[1, 1])
+        lower, positions, upper = generator_points(generator, 3, 5, ["x"])
+        generator.get_points.assert_called_once_with(3, 5)
+        assert list(lower) == list(positions) == list(upper) == ["x"]
+        assert np.array_equal(lower["x"], [0.5, 1.5])
+        assert np.array_equal(positions["x"], [1, 2])
+        assert np.array_equal(upper["x"], [1.5, 2.5])
+
+    def test_get_points_single_point(self):
+        generator = MagicMock()
+        point = generator.get_point.return_value
+        point.lower = dict(x=1.5)
+        point.positions = dict(x=1.0)
+        point.upper = dict(x=0.5)
+        lower, positions, upper = generator_points(generator, 3, 4, ["x"])
+        # get_points() gets single points in reversed rows wrong
+        generator.get_points.assert_not_called()
+        generator.get_point.assert_called_once_with(3)
+        assert lower["x"].tolist() == [1.5]
+        assert upper["x"].tolist() == [0.5]
+
+
+class TestMakeVelocityProfiles(unittest.TestCase):
+    def setUp(self):
+        self.o = MotorInfo(
+            cs_axis="X",
+            cs_port="BRICK1CS2",
+            acceleration=2.0,  # mm/s/s
+            resolution=0.001,
+            offset=0.0,
+            max_velocity=1,
+            current_position=32.0,
+            scannable="t1x",
+            velocity_settle=0.0,
+            units="mm"
+        )
+
+    def assert_matches_motor_info(self, v1s, v2s, distances, min_times):
+        time_array, velocity_array = make_velocity_profiles(
+            [self.o], v1s[:, None], v2s[:, None], distances[:, None],
+            min_times[:, None])
+        assert time_array.shape == (len(v1s), 1, 5)
+        for i, args in enumerate(zip(v1s, v2s, distances, min_times)):
+            times, velocities = self.o.make_velocity_profile(*args)
+            # Same total time
+            assert time_array[i, 0, -1] == pytest.approx(times[-1])
+            # Same velocity at every point of the MotorInfo profile
+            assert np.interp(times, time_array[i, 0], velocity_array[i, 0]) \
+                == pytest.approx(velocities, abs=1e-9)
+            # Which means the distance travelled is the same too
+            assert velocity_profile_distances(
+                time_array[i], velocity_array[i], np.array([times[-1]])) \
+                == pytest.approx(np.trapz(velocities, times))
+
+    def test_matches_motor_info(self):
+        rng = np.random.RandomState(0)
+        n = 200
+        self.assert_matches_motor_info(
+            v1s=rng.uniform(-0.9, 0.9, n),
+            v2s=rng.uniform(-0.9, 0.9, n),
+            distances=rng.uniform(-2, 2, n),
+            min_times=rng.choice([0, 0.002, 0.5, 2.0], n))
+
+    def test_matches_motor_info_turnarounds(self):
+        v1s = np.array([0.1, -0.1, 0.5, 0.5, 0.0, 0.0, 0.0, 0.9])
+        v2s = np.array([-0.1, 0.1, -0.5, 0.5, 0.0, 0.0, 0.0, -0.9])
+        distances = np.array([0.0, 0.0, 0.1, -1.0, 0.0, 0.5, 3.0, 0.01])
+        self.assert_matches_motor_info(
+            v1s, v2s, distances, np.array([0, 0, 0, 0.1, 0, 0, 0, 0.5]))
+
+    def test_settle(self):
+        self.o.velocity_settle = 0.1
+        rng = np.random.RandomState(1)
+        n = 50
+        self.assert_matches_motor_info(
+            v1s=rng.uniform(-0.9, 0.9, n),
+            v2s=rng.uniform(-0.9, 0.9, n),
+            distances=rng.uniform(-2, 2, n),
+            min_times=rng.choice([0, 0.5], n))
+
+    def test_distances_across_short_segments(self):
+        # Ramp down, a short segment at constant velocity, then ramp up
+        time_array = np.array([[0.0, 0.1, 0.11, 0.2, 0.2]])
+        velocity_array = np.array([[1.0, 0.0, 0.0, 0.9, 0.9]])
+        times = np.array([0.05, 0.105, 0.12, 0.2])
+        actual = velocity_profile_distances(
+            time_array.repeat(4, axis=0), velocity_array.repeat(4, axis=0),
+            times)
+        # Jumping from the first segment to the third is the same as
+        # stepping through them
+        assert actual == pytest.approx(
+            [0.0375, 0.05, 0.05 + 0.01 * 0.01 * 10 / 2, 0.05 + 0.09 * 0.9 / 2])
@@ -6,16 +6,21 @@ from __future__ import print_function
 import difflib
 import unittest
 
+import cothread
+from mock import MagicMock, patch
+
 from p4p.nt.scalar import ntfloat
 from p4p.client.thread import TimeoutError
 from p4p import Value, Type
 from p4p.client.raw import RemoteError
 
 
-from malcolm.core import Process, Queue
+from malcolm.core import Process, Queue, Return, Unsubscribe, Error
 from malcolm.modules.demo.blocks import hello_block, counter_block
 from malcolm.modules.pva.blocks import pva_server_block
 from malcolm.modules.pva.controllers.pvaconvert import EMPTY
+from malcolm.modules.pva.controllers.pvaservercomms import BlockHandler, \
+    BlockSubscription
 
 
 # Set to true if running against old server
@@ -582,6 +587,22 @@ class TestPVAServer(unittest.TestCase):
         result = self.ctxt.rpc("TESTHELLO.greet", args)
         self.assertEqual(dict(result.items()), {"return": "Hello me"})
 
+    def testRpcConcurrent(self):
+        results = []
+
+        def greet(name, sleep):
+            args = Value(Type([("name", "s"), ("sleep", "d")]),
+                         dict(name=name, sleep=sleep))
+            result = self.ctxt.rpc("TESTHELLO.greet", args)
+            results.append(result["return"])
+
+        slow = cothread.Spawn(greet, "slow", 0.5)
+        fast = cothread.Spawn(greet, "fast", 0)
+        fast.Wait(timeout=0.4)
+        self.assertEqual(results, ["Hello fast"])
+        slow.Wait(timeout=1)
+        self.assertEqual(results, ["Hello fast", "Hello slow"])
+
     # Equivalent to:
     #    eget -z -s "TESTHELLO.greet" -a name=me
     def testRpcError(self):
@@ -596,3 +617,103 @@ class TestPVAServer(unittest.TestCase):
                 self.ctxt.rpc("TESTHELLO.error", EMPTY)
             self.assertEqual(str(cm.exception),
                              "RuntimeError: You called method error()")
+
+
+class TestBlockHandler(unittest.TestCase):
+    def setUp(self):
+        self.process = Process("proc")
+        self.hello = hello_block(mri="TESTHELLO")[-1]
+        self.process.add_controller(self.hello)
+        self.process.start()
+        self.addCleanup(self.process.stop, timeout=2)
+        self.controller = MagicMock(mri="TESTHELLO")
+        self.controller.block_view.side_effect = self.hello.block_view
+        self.o = BlockHandler(
+            self.controller, BlockSubscription(self.controller), "greet")
+
+    def do_rpc(self):
+        op = MagicMock()
+        op.value.return_value = Value(Type([("name", "s")]), dict(name="me"))
+        self.o.rpc(None, op)
+        return op
+
+    def test_rpc_does_not_wait(self):
+        op = self.do_rpc()
+        op.done.assert_not_called()
+        self.controller.handle_request.return_value.get.assert_not_called()
+        post = self.controller.handle_request.call_args[0][0]
+        post.callback(Return(id=post.id, value="Hello me"))
+        op.done.assert_called_once()
+        assert op.done.call_args[0][0]["return"] == "Hello me"
+
+    def test_rpc_bad_return(self):
+        op = self.do_rpc()
+        post = self.controller.handle_request.call_args[0][0]
+        with patch("malcolm.modules.pva.controllers.pvaservercomms."
+                   "convert_dict_to_value", side_effect=ValueError("Bad")):
+            post.callback(Return(id=post.id, value="Hello me"))
+        op.done.assert_called_once_with(error="ValueError: Bad")
+
+    def test_method_tags_cached(self):
+        self.do_rpc()
+        self.do_rpc()
+        self.controller.block_view.assert_called_once_with()
+
+
+class TestBlockSubscription(unittest.TestCase):
+    def setUp(self):
+        self.process = Process("proc")
+        self.counter = counter_block(mri="TESTCOUNTER")[-1]
+        self.process.add_controller(self.counter)
+        self.process.start()
+        self.addCleanup(self.process.stop, timeout=2)
+        self.o = BlockSubscription(self.counter)
+        self.block = MagicMock(field=None)
+        self.field = MagicMock(field="counter")
+
+    def last_delta(self, handler):
+        return handler.handle.call_args[0][0].changes
+
+    def test_one_subscribe_shared(self):
+        self.counter.handle_request = MagicMock(
+            wraps=self.counter.handle_request)
+        self.o.add(self.block)
+        self.o.add(self.field)
+        assert self.counter.handle_request.call_count == 1
+        subscribe = self.counter.handle_request.call_args[0][0]
+        assert subscribe.path == ["TESTCOUNTER"]
+        assert list(self.last_delta(self.block)[0][1]) == [
+            "typeid", "meta", "health", "counter", "zero", "increment"]
+        ((path, counter),) = self.last_delta(self.field)
+        assert path == []
+        assert counter["typeid"] == "epics:nt/NTScalar:1.0"
+        assert counter["value"] == 0.0
+        self.o.remove(self.block)
+        assert self.counter.handle_request.call_count == 1
+        self.o.remove(self.field)
+        assert self.counter.handle_request.call_count == 2
+        unsubscribe = self.counter.handle_request.call_args[0][0]
+        assert isinstance(unsubscribe, Unsubscribe)
+        assert self.o.structure is None
+
+    def test_changes_split_by_field(self):
+        other = MagicMock(field="health")
+        for handler in (self.block, self.field, other):
+            self.o.add(handler)
+            handler.reset_mock()
+        self.counter.block_view().counter.put_value(5)
+        assert [c[0] for c in self.last_delta(self.block)] == [
+            ["counter", "value"], ["counter", "timeStamp"]]
+        assert self.last_delta(self.field)[0] == [["value"], 5.0]
+        other.handle.assert_not_called()
+        # A new handler gets the latest value
+        late = MagicMock(field="counter")
+        self.o.add(late)
+        assert self.last_delta(late)[0][1]["value"] == 5.0
+
+    def test_missing_field(self):
+        missing = MagicMock(field="missing")
+        self.o.add(self.block)
+        self.o.add(missing)
+        error = missing.handle.call_args[0][0]
+        assert isinstance(error, Error)
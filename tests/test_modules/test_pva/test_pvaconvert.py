@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+from mock import patch
+
+from malcolm.core import StringMeta, NumberMeta, NumberArrayMeta, TableMeta, \
+    serialize_object
+from malcolm.modules.builtin.util import LayoutTable
+from malcolm.modules.pva.controllers.pvaconvert import convert_dict_to_value, \
+    make_type, get_path, update_path, convert_to_type_tuple_value
+
+
+class TestPvaConvert(unittest.TestCase):
+    def test_type_reused(self):
+        attr = StringMeta("desc").create_attribute_model("foo")
+        v1 = convert_dict_to_value(attr.to_dict())
+        attr.set_value("bar")
+        with patch(
+                "malcolm.modules.pva.controllers.pvaconvert.Type") as mock_type:
+            v2 = convert_dict_to_value(attr.to_dict())
+        mock_type.assert_not_called()
+        assert v1.value == "foo"
+        assert v2.value == "bar"
+
+    def test_type_changes_with_spec(self):
+        t1 = make_type([("value", "s")], "malcolm:core/NTScalar:1.0")
+        t2 = make_type([("value", "d")], "malcolm:core/NTScalar:1.0")
+        t3 = make_type([("value", "s")], "structure")
+        assert t1 is not t2
+        assert t1 is not t3
+        assert make_type([("value", "s")], "malcolm:core/NTScalar:1.0") is t1
+
+    def test_get_path_shares_storage(self):
+        attr = NumberMeta("int32").create_attribute_model(3)
+        v = convert_dict_to_value(dict(counter=attr.to_dict()))
+        v.unmark()
+        counter = get_path(v, ["counter"])
+        counter["value"] = 4
+        assert v.counter.value == 4
+        assert v.changedSet() == {"counter.value"}
+        update_path(v, ["counter", "alarm", "message"], "Bad")
+        assert v.counter.alarm.message == "Bad"
+
+    def test_number_array_uses_meta_dtype(self):
+        attr = NumberArrayMeta("int16").create_attribute_model()
+        d = serialize_object(attr.to_dict())
+        d["value"] = [1, 2, 3]
+        spec, value_for_set = convert_to_type_tuple_value(d)
+        assert dict(spec[2])["value"] == "ah"
+        assert value_for_set["value"].dtype == np.int16
+        v = convert_dict_to_value(d)
+        assert v.value.tolist() == [1, 2, 3]
+
+    def test_number_array_not_copied(self):
+        value = np.arange(10, dtype=np.uint32)
+        attr = NumberArrayMeta("uint32").create_attribute_model(value)
+        _, value_for_set = convert_to_type_tuple_value(
+            serialize_object(attr.to_dict()))
+        assert value_for_set["value"] is value
+
+    def test_table_columns_use_meta_dtype(self):
+        meta = TableMeta.from_table(LayoutTable, "desc")
+        attr = meta.create_attribute_model()
+        d = serialize_object(attr.to_dict())
+        d["value"]["x"] = [1, 2]
+        d["value"]["y"] = [3, 4]
+        d["value"]["name"] = ["a", "b"]
+        d["value"]["mri"] = ["c", "d"]
+        d["value"]["visible"] = [True, False]
+        spec, value_for_set = convert_to_type_tuple_value(d)
+        value_spec = dict(dict(spec[2])["value"][2])
+        assert value_spec["x"] == "ad"
+        assert value_spec["y"] == "ad"
+        assert value_for_set["value"]["x"].dtype == np.float64
+        v = convert_dict_to_value(d)
+        assert v.value.x.tolist() == [1.0, 2.0]
+        assert v.value.name == ["a", "b"]
@@ -1,16 +1,20 @@
 import unittest
 import json
+import time
 
+from tornado.httpclient import HTTPRequest
 from tornado.websocket import websocket_connect
 from tornado import gen
 import cothread
 
 from malcolm.compat import OrderedDict
-from malcolm.core import Process, Queue, ResponseError, Post, json_encode
+from malcolm.core import Process, Queue, ResponseError, Post, json_encode, \
+    BlockModel, StringMeta, BadValueError
 from malcolm.modules.builtin.blocks import proxy_block
 from malcolm.modules.demo.blocks import hello_block, counter_block
 from malcolm.modules.web.blocks import web_server_block, websocket_client_block
-from malcolm.modules.web.util import IOLoopHelper
+from malcolm.modules.web.controllers import WebsocketClientComms
+from malcolm.modules.web.util import IOLoopHelper, BINARY_SUBPROTOCOL
 from sys import version_info
 
 
@@ -284,3 +288,104 @@ class TestSystemWSCommsServerAndClient(unittest.TestCase):
         assert block2.counter.value == 0
         assert self.process2.block_view("client").remoteBlocks.value == [
             "hello", "counter", "server"]
+
+    def test_sync_proxies(self):
+        comms = self.process2.get_controller("client")
+        blocks = dict(hello=BlockModel(), counter=BlockModel())
+        for block in blocks.values():
+            block.set_endpoint_data(
+                "health", StringMeta().create_attribute_model())
+        comms.sync_proxies(blocks)
+        assert blocks["hello"].meta.fields == ["health", "greet", "error"]
+        assert blocks["counter"].counter.value == 0
+
+    def test_put_attribute_values_with_malcolm_client(self):
+        block1 = self.process.block_view("counter")
+        block2 = self.process2.block_view("counter")
+        block2.put_attribute_values(dict(counter=32))
+        assert block1.counter.value == 32
+        block2.when_value_matches("counter", 32, timeout=1)
+
+
+class TestSystemWSCommsBinary(unittest.TestCase):
+    socket = 8890
+
+    def setUp(self):
+        self.process = Process("proc")
+        for controller in \
+                hello_block(mri="hello") \
+                + counter_block(mri="counter") \
+                + web_server_block(mri="server", port=self.socket):
+            self.process.add_controller(controller)
+        self.result = Queue()
+        self.process.start()
+
+    def tearDown(self):
+        self.process.stop(timeout=1)
+
+    @gen.coroutine
+    def negotiate(self, subprotocol):
+        request = HTTPRequest(
+            "ws://localhost:%s/ws" % self.socket,
+            headers={"Sec-WebSocket-Protocol": subprotocol})
+        conn = yield websocket_connect(request)
+        msg = Post(id=0, path=["hello", "greet"], parameters=dict(name="me"))
+        conn.write_message(json_encode(msg))
+        resp = yield conn.read_message()
+        protocol = conn.headers.get("Sec-WebSocket-Protocol")
+        cothread.Callback(self.result.put, (protocol, json.loads(resp)))
+        conn.close()
+
+    def test_subprotocol_negotiated(self):
+        IOLoopHelper.call(self.negotiate, BINARY_SUBPROTOCOL)
+        protocol, resp = self.result.get(timeout=2)
+        assert protocol == BINARY_SUBPROTOCOL
+        assert resp == dict(
+            typeid="malcolm:core/Return:1.0", id=0, value="Hello me")
+
+    def test_unknown_subprotocol_ignored(self):
+        IOLoopHelper.call(self.negotiate, "something-else")
+        protocol, resp = self.result.get(timeout=2)
+        assert protocol is None
+        assert resp == dict(
+            typeid="malcolm:core/Return:1.0", id=0, value="Hello me")
+
+    def test_binary_malcolm_client(self):
+        process2 = Process("proc2")
+        process2.add_controller(WebsocketClientComms(
+            mri="client", port=self.socket, binary=True))
+        for controller in proxy_block(mri="counter", comms="client"):
+            process2.add_controller(controller)
+        process2.start()
+        try:
+            assert process2.get_controller("client")._binary_accepted
+            block2 = process2.block_view("counter")
+            assert block2.counter.value == 0
+            block2.increment()
+            assert block2.counter.value == 1
+        finally:
+            process2.stop(timeout=1)
+
+
+class TestSystemWSCommsNoServer(unittest.TestCase):
+    socket = 8895
+
+    def setUp(self):
+        self.process = Process("proc")
+        for controller in \
+                websocket_client_block(mri="client", port=self.socket) \
+                + proxy_block(mri="hello", comms="client", lazy=True):
+            self.process.add_controller(controller)
+
+    def tearDown(self):
+        self.process.stop(timeout=1)
+
+    def test_lazy_proxy_starts_without_server(self):
+        start = time.time()
+        self.process.start()
+        assert time.time() - start < 1
+        assert self.process.block_view("client").state.value == "Fault"
+        with self.assertRaises(BadValueError):
+            self.process.block_view("hello")
+        health = self.process.get_controller("hello").health.value
+        assert health.startswith("Not connected")
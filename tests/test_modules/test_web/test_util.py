@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+from annotypes import Array
+
+from malcolm.core import Return
+from malcolm.modules.web.util import json_encode_binary, json_decode_binary, \
+    BINARY_ARRAY_TYPEID
+
+
+class TestBinaryJson(unittest.TestCase):
+    def test_round_trip(self):
+        value = np.arange(1000, dtype=np.float64)
+        s, buffers = json_encode_binary(Return(id=3, value=value))
+        assert len(buffers) == 1
+        assert buffers[0] == value.tobytes()
+        assert BINARY_ARRAY_TYPEID in s
+        d = json_decode_binary(s, buffers)
+        assert d["typeid"] == "malcolm:core/Return:1.0"
+        assert d["id"] == 3
+        assert d["value"].dtype == np.float64
+        assert np.array_equal(d["value"], value)
+
+    def test_small_array_inline(self):
+        value = np.arange(4, dtype=np.int32)
+        s, buffers = json_encode_binary(Return(id=3, value=value))
+        assert buffers == []
+        d = json_decode_binary(s, buffers)
+        assert d["value"] == [0, 1, 2, 3]
+
+    def test_strings_inline(self):
+        value = np.array(["a" * 100] * 100)
+        s, buffers = json_encode_binary(dict(value=value))
+        assert buffers == []
+        assert json_decode_binary(s, buffers)["value"] == ["a" * 100] * 100
+
+    def test_non_contiguous_array(self):
+        value = np.arange(2000, dtype=np.uint16)[::2]
+        s, buffers = json_encode_binary(
+            dict(value=Array[np.uint16](value)), min_nbytes=0)
+        d = json_decode_binary(s, buffers)
+        assert np.array_equal(d["value"], value)
+
+    def test_several_arrays(self):
+        a = np.ones(10, dtype=np.int8)
+        b = np.zeros(10, dtype=np.float32)
+        s, buffers = json_encode_binary(dict(a=a, b=b), min_nbytes=0)
+        assert len(buffers) == 2
+        d = json_decode_binary(s, buffers)
+        assert d["a"].dtype == np.int8
+        assert np.array_equal(d["a"], a)
+        assert d["b"].dtype == np.float32
+        assert np.array_equal(d["b"], b)
+
+    def test_bad_json(self):
+        with self.assertRaises(ValueError):
+            json_decode_binary("not json", [])
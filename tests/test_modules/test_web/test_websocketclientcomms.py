@@ -1,7 +1,9 @@
 import unittest
 
+from mock import MagicMock, patch
+
 from malcolm.modules.web.controllers import WebsocketClientComms
-from malcolm.core import Process
+from malcolm.core import Process, Put, Return, Error, json_encode
 
 
 class TestWebsocketClientComms(unittest.TestCase):
@@ -15,3 +17,43 @@ class TestWebsocketClientComms(unittest.TestCase):
         assert self.o.port == 8008
         assert self.o.connect_timeout == 10.0
         assert self.o.mri == "mri"
+        assert self.o.binary is False
+
+    @patch("malcolm.modules.web.controllers.websocketclientcomms.IOLoopHelper")
+    def test_requests_sent_in_batches(self, helper):
+        self.o._conn = MagicMock()
+        self.o._queue_request(Put(path=["b", "a", "value"], value=1))
+        self.o._queue_request(Put(path=["b", "c", "value"], value=2))
+        helper.call.assert_called_once_with(self.o._send_requests)
+        self.o._send_requests()
+        assert self.o._conn.write_message.call_count == 2
+        assert list(self.o._request_lookup) == [1, 2]
+        assert self.o._send_queue == []
+
+    @patch("malcolm.modules.web.controllers.websocketclientcomms.cothread")
+    def test_responses_dispatched_in_batches(self, mock_cothread):
+        callback = MagicMock()
+        for i in (1, 2):
+            request = Put(id=i, path=["b", "a", "value"])
+            request.set_callback(callback)
+            self.o._request_lookup[i] = request
+            self.o.on_message(json_encode(Return(id=i, value=i)))
+        mock_cothread.Callback.assert_called_once_with(
+            self.o._dispatch_responses)
+        self.o._dispatch_responses()
+        assert [c[0][0].to_dict() for c in callback.call_args_list] == [
+            Return(id=1, value=1).to_dict(), Return(id=2, value=2).to_dict()]
+        assert self.o._request_lookup == {}
+
+    @patch("malcolm.modules.web.controllers.websocketclientcomms.cothread")
+    @patch("malcolm.modules.web.controllers.websocketclientcomms.IOLoopHelper")
+    def test_send_when_disconnected(self, helper, mock_cothread):
+        callback = MagicMock()
+        request = Put(path=["b", "a", "value"], value=1)
+        request.set_callback(callback)
+        self.o._queue_request(request)
+        self.o._send_requests()
+        self.o._dispatch_responses()
+        response = callback.call_args[0][0]
+        assert isinstance(response, Error)
+        assert str(response.message) == "Server disconnected"
@@ -0,0 +1,140 @@
+import unittest
+
+from mock import MagicMock
+from tornado.concurrent import Future
+
+from malcolm.core import Delta, Update, Return, Error, Unsubscribe
+from malcolm.modules.web.parts import WebsocketServerPart
+from malcolm.modules.web.parts.websocketserverpart import MalcWebSocketHandler
+from malcolm.modules.web.util import OverflowPolicy
+
+
+class TestMalcWebSocketHandler(unittest.TestCase):
+    def setUp(self):
+        self.clients = set()
+        self.futures = []
+        self.messages = []
+        self.o = self.make_handler(2, OverflowPolicy.DROP)
+
+    def make_handler(self, high_water_mark, overflow):
+        o = MalcWebSocketHandler.__new__(MalcWebSocketHandler)
+        o.initialize(MagicMock(), clients=self.clients,
+                     high_water_mark=high_water_mark, overflow=overflow)
+        o.name = "client"
+        o.write_message = self.write_message
+        o.close = MagicMock()
+        return o
+
+    def write_message(self, message, binary=False):
+        self.messages.append(message)
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def test_writes_straight_away_if_not_busy(self):
+        self.o._on_response(Return(id=1, value=2))
+        self.futures[0].set_result(None)
+        self.o._on_response(Return(id=2, value=3))
+        assert len(self.messages) == 2
+        assert not self.o._outbox
+
+    def test_deltas_conflated_while_busy(self):
+        self.o._on_response(Delta(id=1, changes=[[["a"], 1]]))
+        self.o._on_response(Delta(id=1, changes=[[["a"], 2]]))
+        self.o._on_response(Delta(id=1, changes=[[["b"], 3]]))
+        self.o._on_response(Update(id=2, value=4))
+        self.o._on_response(Update(id=2, value=5))
+        assert len(self.messages) == 1
+        assert len(self.o._outbox) == 2
+        assert self.o._conflated == 2
+        assert self.o.metrics(0)[:4] == ("client", 2, 2, 0)
+        self.futures[0].set_result(None)
+        assert len(self.messages) == 2
+        assert '"changes":[[["a"],2],[["b"],3]]' in self.messages[1]
+        self.futures[1].set_result(None)
+        assert len(self.messages) == 3
+        assert '"value":5' in self.messages[2]
+        assert not self.o._outbox
+        assert self.o._writing
+        self.futures[2].set_result(None)
+        assert not self.o._writing
+
+    def test_drop_never_drops_returns(self):
+        self.o._on_response(Return(id=0, value=0))
+        self.o._on_response(Update(id=1, value=1))
+        self.o._on_response(Return(id=2, value=2))
+        self.o._on_response(Error(id=3, message="bad"))
+        # Still merged into the already waiting Update
+        self.o._on_response(Update(id=1, value=5))
+        assert len(self.o._outbox) == 3
+        assert self.o._dropped == 0
+        assert self.o._conflated == 1
+        self.o.close.assert_not_called()
+
+    def test_drop_ends_subscription(self):
+        self.o._id_to_mri[3] = "mri"
+        self.o._on_response(Return(id=0, value=0))
+        self.o._on_response(Return(id=1, value=1))
+        self.o._on_response(Return(id=2, value=2))
+        self.o._on_response(Delta(id=3, changes=[[["a"], 1]]))
+        assert self.o._dropped == 1
+        assert 3 not in self.o._id_to_mri
+        # The client gets an Error instead of a gap in the Deltas
+        _, error = list(self.o._outbox.values())[-1]
+        self.assertIsInstance(error, Error)
+        assert error.id == 3
+        # And we unsubscribe
+        info = self.o._registrar.report.call_args[0][0]
+        self.assertIsInstance(info.request, Unsubscribe)
+        assert info.request.id == 3
+        assert info.mri == "mri"
+        # Anything else for the subscription is ignored until the Return
+        self.o._on_response(Delta(id=3, changes=[[["a"], 2]]))
+        self.o._on_response(Return(id=3))
+        assert len(self.o._outbox) == 3
+        assert not self.o._ended
+        for i in range(3):
+            self.futures[i].set_result(None)
+        assert len(self.messages) == 4
+        assert '"typeid":"malcolm:core/Error:1.0","id":3' in self.messages[3]
+
+    def test_disconnect(self):
+        o = self.make_handler(1, OverflowPolicy.DISCONNECT)
+        o._on_response(Update(id=1, value=1))
+        o._on_response(Update(id=2, value=2))
+        o._on_response(Update(id=3, value=3))
+        o.close.assert_called_once_with()
+        assert not o._outbox
+
+    def test_closed_while_busy(self):
+        self.o._on_response(Update(id=1, value=1))
+        self.o._on_response(Update(id=2, value=2))
+        self.futures[0].set_exception(IOError("closed"))
+        assert len(self.messages) == 1
+        assert not self.o._outbox
+
+
+class TestWebsocketServerPart(unittest.TestCase):
+    def setUp(self):
+        self.o = WebsocketServerPart(high_water_mark=10, overflow="drop")
+        self.registrar = MagicMock()
+        self.o.setup(self.registrar)
+
+    def test_init(self):
+        assert self.o.high_water_mark == 10
+        assert self.o.overflow == OverflowPolicy.DROP
+        self.registrar.add_attribute_model.assert_called_once_with(
+            "wsClients", self.o.clients)
+        assert list(self.o.clients.meta.elements) == [
+            "client", "queued", "conflated", "dropped", "lag"]
+
+    def test_update_clients(self):
+        client = MagicMock()
+        client.metrics.return_value = ("1.2.3.4:5678", 3, 2, 1, 0.5)
+        self.o._clients.add(client)
+        self.o.update_clients()
+        value = self.o.clients.value
+        assert list(value.rows()) == [["1.2.3.4:5678", 3, 2, 1, 0.5]]
+        self.o._clients.clear()
+        self.o.update_clients()
+        assert list(self.o.clients.value.rows()) == []